@@ -0,0 +1,224 @@
+import hashlib
+import os
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from borsdata_client import MAX_SPLIT_LOOKBACK_DAYS
+from price_store import DEFAULT_PRICE_STORE_PATH, PriceStore
+from technical import PricePanel
+
+DEFAULT_ADJUSTED_PATH = os.path.join(os.path.dirname(DEFAULT_PRICE_STORE_PATH), "adjusted")
+PRICE_COLUMNS = ("o", "h", "l", "c")
+
+
+def _to_days(values: Iterable[str]) -> np.ndarray:
+    return np.array([v[:10] for v in values], dtype="datetime64[D]")
+
+
+def split_factor(ratio: str) -> float:
+    # Ratios are "new:old" shares, so a 2:1 split halves the prices before it: factor 0.5
+    new, old = (float(part) for part in ratio.split(":"))
+    return old / new
+
+
+def _by_instrument(ins_ids: np.ndarray, dates: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, ...]:
+    order = np.lexsort((dates, ins_ids))
+    ins_ids, dates, values = ins_ids[order], dates[order], values[order]
+    # Same instrument and date twice (e.g. a split seen both upstream and in the sync store) counts once
+    keep = np.ones(len(ins_ids), dtype=bool)
+    keep[1:] = (ins_ids[1:] != ins_ids[:-1]) | (dates[1:] != dates[:-1])
+    return ins_ids[keep], dates[keep], values[keep]
+
+
+# Split and dividend events for a universe as flat arrays sorted by (instrument, date): the split
+# price factor or the dividend per share on each split date or ex-date.
+class CorporateActions:
+    def __init__(self, split_ids: np.ndarray, split_dates: np.ndarray, split_factors: np.ndarray,
+                 dividend_ids: np.ndarray, dividend_dates: np.ndarray, dividend_amounts: np.ndarray):
+        self.splits = _by_instrument(split_ids, split_dates, split_factors)
+        self.dividends = _by_instrument(dividend_ids, dividend_dates, dividend_amounts)
+
+    @classmethod
+    def from_responses(cls, splits: List[Dict[str, Any]],
+                       dividends: Dict[int, Dict[str, Any]]) -> "CorporateActions":
+        # splits: stockSplitList rows; dividends: get_dividend_calendar_batch results
+        splits = [s for s in splits if s.get("splitDate") and s.get("ratio")]
+        rows = [(ins_id, v["excludingDate"], v["amountPaid"]) for ins_id, item in dividends.items()
+                if not item.get("error") for v in item.get("values") or []
+                if v.get("excludingDate") and v.get("amountPaid")]
+        return cls(np.array([s["instrumentId"] for s in splits], dtype=np.int64),
+                   _to_days(s["splitDate"] for s in splits),
+                   np.array([split_factor(s["ratio"]) for s in splits], dtype=np.float64),
+                   np.array([r[0] for r in rows], dtype=np.int64), _to_days(r[1] for r in rows),
+                   np.array([r[2] for r in rows], dtype=np.float64))
+
+    @classmethod
+    def load(cls, client, ins_ids: Iterable[int], store=None) -> "CorporateActions":
+        # One StockSplits call for the universe and one dividend calendar call per MAX_BATCH_SIZE
+        # instruments. The endpoint only reaches back a year, so a SyncStore's splits table, which
+        # keeps every split it has seen, supplies the older ones.
+        ins_ids = list(ins_ids)
+        since = str(date.today() - timedelta(days=MAX_SPLIT_LOOKBACK_DAYS))
+        splits = client.get_stock_splits(since).get("stockSplitList") or []
+        if store is not None:
+            splits = splits + [{"instrumentId": ins_id, "splitDate": split_date, "ratio": ratio}
+                               for ins_id, split_date, ratio in store.query(
+                                   "SELECT ins_id, split_date, ratio FROM splits")]
+        wanted = set(ins_ids)
+        return cls.from_responses([s for s in splits if s.get("instrumentId") in wanted],
+                                  client.get_dividend_calendar_batch(ins_ids))
+
+    def events(self, ins_id: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        result = {}
+        for kind, (ids, dates, values) in (("splits", self.splits), ("dividends", self.dividends)):
+            lo, hi = np.searchsorted(ids, ins_id, side="left"), np.searchsorted(ids, ins_id, side="right")
+            result[kind] = dates[lo:hi], values[lo:hi]
+        return result
+
+    def fingerprint(self, ins_id: int, through: np.datetime64) -> str:
+        # Changes when an event on or before `through` is added or restated, later ones are not applied yet
+        digest = hashlib.sha1()
+        for kind, (dates, values) in sorted(self.events(ins_id).items()):
+            n = int(np.searchsorted(dates, through, side="right"))
+            digest.update(kind.encode())
+            digest.update(dates[:n].tobytes())
+            digest.update(values[:n].tobytes())
+        return digest.hexdigest()
+
+
+def _forward_filled(values: np.ndarray) -> np.ndarray:
+    rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+
+def _scatter(dates: np.ndarray, ins_ids: np.ndarray, event_ids: np.ndarray,
+             event_dates: np.ndarray, event_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Row before each event (the last one it restates) and the column of its instrument. Events
+    # before the first date or after the last one change nothing in this window.
+    cols = np.minimum(np.searchsorted(ins_ids, event_ids), max(len(ins_ids) - 1, 0))
+    rows = np.searchsorted(dates, event_dates, side="left") - 1
+    valid = (ins_ids[cols] == event_ids) & (rows >= 0) & (rows < len(dates) - 1) if len(ins_ids) else \
+        np.zeros(len(event_ids), dtype=bool)
+    return rows[valid], cols[valid], event_values[valid]
+
+
+def adjustment_factors(dates: np.ndarray, ins_ids: np.ndarray, close: np.ndarray, actions: CorporateActions,
+                       dividends: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Cumulative backward factors for (day x instrument) closes on a sorted date axis, columns
+    # following the sorted ins_ids. Each event puts its step on the row before it, and one reverse
+    # cumulative product down the days turns the steps into the product of every later event.
+    # Returns the price factors for every column, and the columns with splits in the window with
+    # their volume factors; other volumes stay as they are.
+    steps = np.ones(close.shape)
+    rows, cols, factors = _scatter(dates, ins_ids, *actions.splits)
+    np.multiply.at(steps, (rows, cols), factors)
+    split_cols, positions = np.unique(cols, return_inverse=True)
+    volume_steps = np.ones((len(dates), len(split_cols)))
+    np.multiply.at(volume_steps, (rows, positions), 1 / factors)
+
+    if dividends:
+        rows, cols, amounts = _scatter(dates, ins_ids, *actions.dividends)
+        # Marked down by the dividend's share of the last close before the ex-date
+        before = close[rows, cols]
+        missing = np.isnan(before)
+        if missing.any():
+            before[missing] = _forward_filled(close[:, cols[missing]])[rows[missing], np.arange(missing.sum())]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            factors = 1 - amounts / before
+        ok = (factors > 0) & (factors < 1)
+        np.multiply.at(steps, (rows[ok], cols[ok]), factors[ok])
+
+    for values in (steps, volume_steps):
+        backward = values[::-1]
+        np.multiply.accumulate(backward, axis=0, out=backward)
+    return steps, split_cols, volume_steps
+
+
+def _adjust_volume(volume: np.ndarray, split_cols: np.ndarray, factors: np.ndarray) -> np.ndarray:
+    volume = np.array(volume)
+    volume[:, split_cols] = np.rint(volume[:, split_cols] * factors)
+    return volume
+
+
+def adjust_panel(panel: PricePanel, actions: CorporateActions, dividends: bool = True) -> PricePanel:
+    price, split_cols, volume = adjustment_factors(panel.dates, panel.ins_ids, panel.close, actions, dividends)
+    price *= panel.close
+    return PricePanel(panel.dates, panel.ins_ids, price, _adjust_volume(panel.volume, split_cols, volume))
+
+
+def adjust_columns(ins_id: int, columns: Dict[str, np.ndarray], actions: CorporateActions,
+                   dividends: bool = True) -> Dict[str, np.ndarray]:
+    # One instrument's OHLCV columns (PriceStore.load) as a single-column panel
+    price, split_cols, volume = adjustment_factors(columns["d"], np.array([ins_id], dtype=np.int64),
+                                                   columns["c"][:, None], actions, dividends)
+    adjusted = {"d": np.array(columns["d"])}
+    for name in PRICE_COLUMNS:
+        adjusted[name] = columns[name] * price[:, 0]
+    adjusted["v"] = _adjust_volume(columns["v"][:, None], split_cols, volume)[:, 0]
+    return adjusted
+
+
+# Adjusted series for the instruments of a PriceStore, kept as <root>/<insId>.npz with the
+# fingerprint of the events they include. Reads recompute only when an event was added; when the
+# store merely grew, the new rows are appended as they are, since no applied event lies after them.
+class AdjustedPrices:
+    def __init__(self, store: PriceStore, actions: CorporateActions, root: str = DEFAULT_ADJUSTED_PATH,
+                 dividends: bool = True):
+        self.store = store
+        self.actions = actions
+        self.root = root
+        self.dividends = dividends
+        os.makedirs(root, exist_ok=True)
+        self._series: Dict[int, Tuple[str, Dict[str, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+        self.recomputed = 0
+
+    def _path(self, ins_id: int) -> str:
+        return os.path.join(self.root, f"{ins_id}.npz")
+
+    def _cached(self, ins_id: int) -> Optional[Tuple[str, Dict[str, np.ndarray]]]:
+        if ins_id in self._series:
+            return self._series[ins_id]
+        try:
+            with np.load(self._path(ins_id)) as data:
+                return str(data["fingerprint"]), {name: data[name] for name in ("d",) + PRICE_COLUMNS + ("v",)}
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def _save(self, ins_id: int, fingerprint: str, columns: Dict[str, np.ndarray]):
+        # Written under a temporary name and renamed, so readers never see half a file
+        tmp = self._path(ins_id) + ".tmp.npz"
+        np.savez(tmp, fingerprint=np.array(fingerprint), **columns)
+        os.replace(tmp, self._path(ins_id))
+
+    def load(self, ins_id: int) -> Dict[str, np.ndarray]:
+        raw = self.store.load(ins_id)
+        if not len(raw["d"]):
+            return {name: np.array(col) for name, col in raw.items()}
+        fingerprint = self.actions.fingerprint(ins_id, raw["d"][-1])
+        cached = self._cached(ins_id)
+        if cached is not None and cached[0] == fingerprint:
+            columns = cached[1]
+            n = len(columns["d"])
+            if n == len(raw["d"]) and columns["d"][-1] == raw["d"][-1]:
+                self._series[ins_id] = cached
+                return columns
+            if n < len(raw["d"]) and raw["d"][n - 1] == columns["d"][-1]:
+                columns = {name: np.concatenate([col, raw[name][n:]]) for name, col in columns.items()}
+                return self._store(ins_id, fingerprint, columns)
+        self.recomputed += 1
+        return self._store(ins_id, fingerprint, adjust_columns(ins_id, raw, self.actions, self.dividends))
+
+    def _store(self, ins_id: int, fingerprint: str, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            self._series[ins_id] = (fingerprint, columns)
+        self._save(ins_id, fingerprint, columns)
+        return columns
+
+    def panel(self, ins_ids: Optional[Iterable[int]] = None, start: Optional[str] = None) -> PricePanel:
+        ins_ids = self.store.instruments() if ins_ids is None else ins_ids
+        return PricePanel.from_columns({ins_id: self.load(ins_id) for ins_id in ins_ids}, start=start)
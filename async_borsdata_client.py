@@ -0,0 +1,195 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import aiohttp
+import requests
+
+import config
+from borsdata_client import BorsdataClient, RETRY_STATUSES, batch_params, merge_batches, parse_retry_after
+from rate_limiter import RateLimiter, DEFAULT_MAX_CALLS, DEFAULT_PERIOD
+from memo_cache import MemoCache
+from metrics import Metrics
+from records import decode_json
+from response_cache import ResponseCache, make_key
+
+
+# Failures raise the same requests exceptions as BorsdataClient, so callers handle both clients alike
+def _http_error(response: aiohttp.ClientResponse, content: bytes) -> requests.HTTPError:
+    result = requests.Response()
+    result.status_code = response.status
+    result.reason = response.reason
+    result.url = str(response.url)
+    result.headers.update(response.headers)
+    result._content = content
+    return requests.HTTPError(f"{response.status} {'Client' if response.status < 500 else 'Server'} Error: "
+                              f"{response.reason} for url: {result.url}", response=result)
+
+
+def _connection_error(error: Exception) -> requests.RequestException:
+    if isinstance(error, asyncio.TimeoutError):
+        return requests.Timeout(str(error) or "Request timed out")
+    return requests.ConnectionError(str(error))
+
+
+# Every endpoint method is inherited from BorsdataClient and returns an awaitable here,
+# since _get and _get_batched are coroutines:
+#
+#     async with AsyncBorsdataClient() as client:
+#         markets, sectors = await asyncio.gather(client.get_markets(), client.get_sectors())
+class AsyncBorsdataClient(BorsdataClient):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ResponseCache] = None,
+                 invalidation_interval: float = 15 * 60, session: Optional[aiohttp.ClientSession] = None,
+                 pool_size: int = 20, concurrency: int = 10, rate_limiter: Optional[RateLimiter] = None,
+                 max_calls: int = DEFAULT_MAX_CALLS, period: float = DEFAULT_PERIOD,
+                 max_retries: int = 5, backoff_factor: float = 0.5, max_backoff: float = 60.0,
+                 timeout: float = 30, memo: Optional[MemoCache] = None,
+                 base_url: Optional[str] = None, metrics: Optional[Metrics] = None):
+        self.api_key = api_key or config.API_KEY
+        if not self.api_key:
+            raise ValueError("API key is required. Set it in .env file or pass it to the constructor.")
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
+        self.cache = cache
+        self.memo = memo or MemoCache()
+        self.metrics = metrics or Metrics()
+        self.invalidation_interval = invalidation_interval
+        self._invalidation_lock = asyncio.Lock()
+        self._refreshing_watermarks = False
+
+        self.session = session
+        self._owns_session = session is None
+        self.pool_size = pool_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = rate_limiter or RateLimiter(max_calls, period)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._owns_session = True
+        return self.session
+
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with AsyncBorsdataClient.")
+
+    async def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        params = dict(params or {})
+        loaded = False
+
+        def load():
+            nonlocal loaded
+            loaded = True
+            return self._load(endpoint, params)
+
+        data = await self.memo.get_or_fetch_async(make_key(endpoint, params), load, ttl=self.memo.ttl_for(endpoint))
+        self.metrics.record_cache(endpoint, "memo", not loaded)
+        return data
+
+    async def _load(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self.cache is None or self.cache.ttl_for(endpoint) <= 0:
+            return await self._fetch(endpoint, params)
+
+        await self._refresh_cache_watermarks()
+        data = self.cache.get(endpoint, params)
+        self.metrics.record_cache(endpoint, "response", data is not None)
+        if data is None:
+            data = await self._fetch(endpoint, params)
+            self.cache.set(endpoint, params, data)
+        return data
+
+    async def _fetch(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._decode(endpoint, await self._read(endpoint, params), decode_json)
+
+    async def _fetch_decoded(self, endpoint: str, params: Dict[str, Any], decoder: Callable[[Any], Any]) -> Any:
+        # The body is read as bytes and decoded straight into records, skipping the nested dicts
+        return self._decode(endpoint, await self._read(endpoint, params), decoder)
+
+    def _decode(self, endpoint: str, content: bytes, decoder: Callable[[Any], Any]) -> Any:
+        start = time.perf_counter()
+        data = decoder(content)
+        self.metrics.record_decode(endpoint, time.perf_counter() - start)
+        return data
+
+    async def _read(self, endpoint: str, params: Dict[str, Any]) -> bytes:
+        url = f"{self.base_url}/{endpoint}"
+        params = {k: str(v) for k, v in dict(params, authKey=self.api_key).items()}
+        session = await self._get_session()
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                wait = self.rate_limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                start = time.perf_counter()
+                try:
+                    async with session.get(url, params=params) as response:
+                        if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                            self.metrics.record_request(endpoint, time.perf_counter() - start, response.status)
+                            self.metrics.record_retry(endpoint, response.status)
+                            delay = parse_retry_after(response.headers.get("Retry-After"))
+                            if delay is None:
+                                delay = self._backoff(attempt)
+                            if response.status == 429:
+                                self.rate_limiter.block_for(delay)
+                            else:
+                                await asyncio.sleep(delay)
+                            attempt += 1
+                            continue
+                        content = await response.read()
+                        # Bytes on the wire where aiohttp reports them, else the decompressed size
+                        self.metrics.record_request(endpoint, time.perf_counter() - start, response.status,
+                                                    getattr(response.content, "total_raw_bytes", len(content)))
+                        if response.status >= 400:
+                            error = _http_error(response, content)
+                            self.metrics.record_error(endpoint, error)
+                            raise error
+                        return content
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    self.metrics.record_request(endpoint, time.perf_counter() - start, type(e).__name__)
+                    if attempt >= self.max_retries:
+                        error = _connection_error(e)
+                        self.metrics.record_error(endpoint, error)
+                        raise error from e
+                    self.metrics.record_retry(endpoint, type(e).__name__)
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+
+    async def _refresh_cache_watermarks(self, force: bool = False):
+        async with self._invalidation_lock:
+            if not self._watermarks_due(force):
+                return
+        try:
+            instruments_updated, kpis_updated = await asyncio.gather(
+                self._fetch("instruments/updated", {}), self._fetch("instruments/kpis/updated", {}))
+            async with self._invalidation_lock:
+                self._apply_watermarks(instruments_updated, kpis_updated)
+        finally:
+            self._refreshing_watermarks = False
+
+    async def _get_batched(self, endpoint: str, inst_ids: Iterable[int], list_key: str,
+                           params: Optional[Dict[str, Any]] = None,
+                           id_key: str = "instrument") -> Dict[int, Dict[str, Any]]:
+        responses = await asyncio.gather(*(self._get(endpoint, params=p) for p in batch_params(inst_ids, params)))
+        return merge_batches(responses, list_key, id_key)
+
+    async def gather_map(self, func, items: Iterable[Any]) -> Dict[Any, Any]:
+        # Fans a per-item coroutine out over items, e.g.
+        #     await client.gather_map(lambda i: client.get_kpi_history(i, 2, "year", "mean"), ids)
+        items = list(items)
+        results = await asyncio.gather(*(func(item) for item in items))
+        return dict(zip(items, results))
@@ -0,0 +1,269 @@
+import csv
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from borsdata_client import MAX_BATCH_SIZE
+from fundamentals import Fundamentals
+from instrument_index import InstrumentIndex
+from kpi_engine import PE_KPI_ID, KpiMatrix
+from metrics import traced
+from valuation import DEFAULT_DISCOUNT_RATE, implied_growth
+
+# Optional Parquet output
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Instruments fetched, computed and written per round, so results stream out and memory stays flat
+CHUNK_SIZE = 10 * MAX_BATCH_SIZE
+CHARTS_PER_JOB = 25
+WINDOWS = (3, 5)
+
+COLUMNS = ["insId", "name", "ticker", "isin", "pe", "pe_avg_3", "pe_avg_5", "pe_vs_avg_3", "pe_vs_avg_5",
+           "implied_growth", "gross_margin", "gross_margin_avg_3", "gross_margin_avg_5",
+           "gross_margin_vs_avg_3", "gross_margin_vs_avg_5"]
+
+
+def read_watchlist(path: str) -> List[str]:
+    # One ticker, ISIN or instrument id per line; blank lines and '#' comments are skipped
+    with open(path, encoding="utf-8") as f:
+        keys = [line.split("#", 1)[0].strip() for line in f]
+    return [key for key in keys if key]
+
+
+def resolve_watchlist(index: InstrumentIndex, keys: Sequence[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    instruments, unresolved, seen = [], [], set()
+    for key in keys:
+        inst = index.resolve(key)
+        if inst is None:
+            unresolved.append(key)
+        elif inst["insId"] not in seen:
+            seen.add(inst["insId"])
+            instruments.append(inst)
+    return instruments, unresolved
+
+
+def _aligned(matrix: KpiMatrix, ins_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # Per-instrument values of a matrix (sorted by id) in the order of ins_ids, NaN where absent
+    result = np.full(len(ins_ids), np.nan)
+    if not len(matrix):
+        return result
+    rows = np.minimum(np.searchsorted(matrix.ins_ids, ins_ids), len(matrix) - 1)
+    found = matrix.ins_ids[rows] == ins_ids
+    result[found] = values[rows[found]]
+    return result
+
+
+def load_chunk(client, ins_ids: List[int]) -> Tuple[KpiMatrix, KpiMatrix]:
+    # P/E histories and annual reports over the instList endpoints, fetched concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pe = executor.submit(KpiMatrix.load, client, PE_KPI_ID, ins_ids)
+        gross_margin = Fundamentals.load(client, ins_ids)["year"].kpi("gross_margin")
+        return pe.result(), gross_margin
+
+
+def compare_chunk(instruments: List[Dict[str, Any]], pe: KpiMatrix, gross_margin: KpiMatrix) -> Dict[str, Any]:
+    # The numbers print_pe_comparison and print_gross_margin_comparison show, for the whole chunk at once:
+    # P/E vs its averages in percent, gross margin vs its averages in percentage points
+    ins_ids = np.array([inst["insId"] for inst in instruments], dtype=np.int64)
+    columns: Dict[str, Any] = {
+        "insId": ins_ids,
+        "name": [inst["name"] for inst in instruments],
+        "ticker": [inst["ticker"] for inst in instruments],
+        "isin": [inst["isin"] for inst in instruments],
+        "pe": _aligned(pe, ins_ids, pe.current()),
+        "gross_margin": _aligned(gross_margin, ins_ids, gross_margin.current()),
+    }
+    for n in WINDOWS:
+        columns[f"pe_avg_{n}"] = _aligned(pe, ins_ids, pe.mean(n))
+        columns[f"pe_vs_avg_{n}"] = _aligned(pe, ins_ids, pe.deviation(n))
+        columns[f"gross_margin_avg_{n}"] = _aligned(gross_margin, ins_ids, gross_margin.mean(n))
+        columns[f"gross_margin_vs_avg_{n}"] = _aligned(gross_margin, ins_ids, gross_margin.difference(n))
+    columns["implied_growth"] = implied_growth(columns["pe"], DEFAULT_DISCOUNT_RATE)
+    return {name: columns[name] for name in COLUMNS}
+
+
+class CsvWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, columns: Dict[str, Any]):
+        def cell(value):
+            if isinstance(value, (float, np.floating)):
+                return "" if np.isnan(value) else round(float(value), 6)
+            return value
+        self._writer.writerows(zip(*([cell(v) for v in columns[name]] for name in COLUMNS)))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path: str):
+        if pyarrow is None:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow), or write to a .csv file")
+        self.path = path
+        self._writer = None
+
+    def write(self, columns: Dict[str, Any]):
+        table = pyarrow.table({name: columns[name] for name in COLUMNS})
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path: str):
+    return ParquetWriter(path) if path.lower().endswith(".parquet") else CsvWriter(path)
+
+
+# Headless charts, rendered in worker processes. Like gui.ChartPanel, each worker builds the three
+# charts once: the P/E vs growth curve family is drawn a single time into a cached background, and
+# per stock only the history axes and the P/E marker are drawn over it before the buffer is saved.
+_charts = None
+
+
+def _create_charts():
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
+
+    from valuation import curve_family
+
+    fig = Figure(figsize=(18, 5), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    pe_ax, gm_ax, growth_ax = fig.subplots(1, 3)
+    pe_line, = pe_ax.plot([], [], marker='o')
+    pe_ax.set(title='P/E Ratio Over Time', xlabel='Year', ylabel='P/E Ratio')
+    pe_ax.grid(True)
+    gm_line, = gm_ax.plot([], [], marker='o')
+    gm_ax.set(title='Gross Margin Over Time', xlabel='Year', ylabel='Gross Margin (%)')
+    gm_ax.grid(True)
+
+    x, curves = curve_family()
+    for r, y in curves.items():
+        growth_ax.plot(x, y, label=f'Discount rate: {r:.2%}')
+    growth_ax.set(xlabel='Growth Rate', ylabel='P/E Ratio', xlim=(0.8, 2), ylim=(0, 100))
+    # The current P/E line is animated and drawn per stock, a static stand-in keeps its legend entry
+    growth_ax.legend(handles=growth_ax.get_legend_handles_labels()[0] +
+                     [Line2D([], [], color='k', linestyle='--', label='Current P/E')], fontsize=8)
+    growth_ax.grid(True)
+    growth_ax.set_title(' ')
+    fig.tight_layout()
+
+    # Animated artists are left out of the full draw that becomes the background
+    pe_hline = growth_ax.axhline(y=0, color='k', linestyle='--', animated=True)
+    annotation = growth_ax.annotate('', xy=(1, 0), xytext=(0.85, 5), animated=True,
+                                    arrowprops=dict(facecolor='black', shrink=0.05))
+    for artist in (pe_ax, gm_ax, growth_ax.title):
+        artist.set_animated(True)
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    return canvas, background, (pe_ax, pe_line), (gm_ax, gm_line), (growth_ax, pe_hline, annotation)
+
+
+def _render_charts(jobs: List[Dict[str, Any]]) -> int:
+    from matplotlib.image import imsave
+
+    global _charts
+    if _charts is None:
+        _charts = _create_charts()
+    canvas, background, pe, gm, (growth_ax, pe_hline, annotation) = _charts
+
+    for job in jobs:
+        canvas.restore_region(background)
+        for (ax, line), years, values in ((pe, job["pe_years"], job["pe_values"]),
+                                          (gm, job["gm_years"], job["gm_values"])):
+            line.set_data(years, values)
+            ax.relim()
+            ax.autoscale_view()
+            canvas.figure.draw_artist(ax)
+
+        growth_ax.title.set_text(f"P/E Ratio vs Growth Rate for {job['name']}")
+        growth_ax.draw_artist(growth_ax.title)
+        current_pe, growth = job["current_pe"], job["implied_growth"]
+        if not np.isnan(current_pe):
+            pe_hline.set_ydata([current_pe, current_pe])
+            growth_ax.draw_artist(pe_hline)
+            if not np.isnan(growth):
+                annotation.set_text(f'Current P/E: {current_pe:.2f}\nImplied Growth: {growth:.2%}')
+                annotation.xy = (1 + growth, current_pe)
+                annotation.set_position((0.85, current_pe + 5))
+                growth_ax.draw_artist(annotation)
+        # Fast zlib level: encoding at the default level costs about as much as drawing
+        imsave(job["path"], np.asarray(canvas.buffer_rgba()), pil_kwargs={"compress_level": 1})
+    return len(jobs)
+
+
+def _chart_filename(inst: Dict[str, Any]) -> str:
+    return f"{inst['insId']}_{re.sub(r'[^A-Za-z0-9._-]+', '_', inst['ticker'] or '')}.png"
+
+
+def chart_jobs(instruments: List[Dict[str, Any]], pe: KpiMatrix, gross_margin: KpiMatrix,
+               columns: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    jobs = []
+    for i, inst in enumerate(instruments):
+        job = {"path": os.path.join(directory, _chart_filename(inst)), "name": inst["name"],
+               "current_pe": float(columns["pe"][i]), "implied_growth": float(columns["implied_growth"][i])}
+        for prefix, matrix in (("pe", pe), ("gm", gross_margin)):
+            years, values = np.empty(0), np.empty(0)
+            if len(matrix) and inst["insId"] in matrix.ins_ids:
+                row = matrix.row(inst["insId"])
+                present = ~np.isnan(matrix.values[row])
+                years, values = matrix.years[row][present].astype(float), matrix.values[row][present]
+            job[f"{prefix}_years"], job[f"{prefix}_values"] = years, values
+        jobs.append(job)
+    return jobs
+
+
+@traced
+def run_batch(client, index: InstrumentIndex, watchlist: str, output: str, charts_dir: Optional[str] = None,
+              chunk_size: int = CHUNK_SIZE, chart_workers: Optional[int] = None,
+              progress: Optional[Callable[[str], None]] = print) -> Dict[str, Any]:
+    progress = progress or (lambda message: None)
+    start = time.time()
+    instruments, unresolved = resolve_watchlist(index, read_watchlist(watchlist))
+    for key in unresolved:
+        progress(f"Not found: {key}")
+
+    executor = None
+    if charts_dir:
+        os.makedirs(charts_dir, exist_ok=True)
+        # spawn: the parent holds a connection pool and worker threads that must not be forked
+        executor = ProcessPoolExecutor(max_workers=chart_workers, mp_context=multiprocessing.get_context("spawn"))
+    charts = []
+    writer = open_writer(output)
+    try:
+        for offset in range(0, len(instruments), chunk_size):
+            chunk = instruments[offset:offset + chunk_size]
+            pe, gross_margin = load_chunk(client, [inst["insId"] for inst in chunk])
+            columns = compare_chunk(chunk, pe, gross_margin)
+            writer.write(columns)
+            if executor is not None:
+                jobs = chart_jobs(chunk, pe, gross_margin, columns, charts_dir)
+                charts += [executor.submit(_render_charts, jobs[i:i + CHARTS_PER_JOB])
+                           for i in range(0, len(jobs), CHARTS_PER_JOB)]
+            progress(f"[{offset + len(chunk)}/{len(instruments)}] {time.time() - start:.0f}s")
+        if charts:
+            wait(charts)
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    rendered = sum(f.result() for f in charts)
+    return {"instruments": len(instruments), "unresolved": unresolved, "charts": rendered,
+            "seconds": time.time() - start}
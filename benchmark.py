@@ -0,0 +1,224 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import statistics
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import matplotlib
+
+matplotlib.use("Agg")  # display_stock_info plots; keep it headless
+
+import numpy as np
+
+import main
+from borsdata_client import BorsdataClient, MAX_BATCH_SIZE
+from instrument_index import InstrumentIndex
+from kpi_engine import GROSS_MARGIN_KPI_ID, PE_KPI_ID, KpiMatrix
+from mock_server import MockBorsdata, MockServer, SyntheticMarket
+from rate_limiter import DEFAULT_MAX_CALLS, DEFAULT_PERIOD, RateLimiter
+from screener import Screener
+from valuation import implied_growth
+
+# Everything runs against mock_server.py, never the live API. Results are keyed "<universe>/<benchmark>"
+# and hold timings in seconds, so two runs can be compared with --baseline.
+#
+#     python benchmark.py --universe 500 2000 --json results.json
+#     python benchmark.py --universe 500 2000 --baseline results.json
+
+
+def summarize(durations: List[float], **extra: Any) -> Dict[str, Any]:
+    ordered = sorted(durations)
+    return dict(seconds=statistics.median(ordered), p95=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                min=ordered[0], runs=len(ordered), **extra)
+
+
+def timed(func: Callable[[], Any], repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def make_client(server: MockServer, **kwargs) -> BorsdataClient:
+    # No response cache and no client-side quota: the numbers are client and decode overhead
+    return BorsdataClient(api_key="benchmark", base_url=server.base_url, cache=None,
+                          rate_limiter=RateLimiter(1_000_000, 1.0), **kwargs)
+
+
+def bench_endpoints(server: MockServer, ins_ids: List[int], repeat: int) -> Dict[str, Dict[str, Any]]:
+    # Raw request + decode per endpoint, bypassing the memo so every call goes over the wire
+    batch = ",".join(map(str, ins_ids[:MAX_BATCH_SIZE]))
+    endpoints = {
+        "instruments": ("instruments", {}),
+        "stockprices": (f"instruments/{ins_ids[0]}/stockprices", {}),
+        "stockprices_batch": ("instruments/stockprices", {"instList": batch}),
+        "stockprices_last": ("instruments/stockprices/last", {}),
+        "kpi_history": (f"instruments/{ins_ids[0]}/kpis/{PE_KPI_ID}/year/mean/history", {}),
+        "kpi_history_batch": (f"instruments/kpis/{PE_KPI_ID}/year/mean/history", {"instList": batch}),
+        "kpi_screener": (f"instruments/kpis/{PE_KPI_ID}/last/latest", {}),
+        "reports_batch": ("instruments/reports", {"instList": batch}),
+    }
+    results = {}
+    with make_client(server) as client:
+        for name, (endpoint, params) in endpoints.items():
+            client._fetch(endpoint, params)  # warm the server's payload cache
+            size = len(client._request(endpoint, params).content)
+            results[f"endpoint/{name}"] = summarize(timed(lambda: client._fetch(endpoint, params), repeat), bytes=size)
+    return results
+
+
+def bench_throughput(server: MockServer, ins_ids: List[int], workers: int) -> Dict[str, Dict[str, Any]]:
+    # Many independent single-instrument calls from a thread pool, like a naive bulk job
+    with make_client(server, pool_size=workers) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda ins_id: client.get_kpi_history(ins_id, PE_KPI_ID, "year", "mean"), ins_ids))
+        elapsed = time.perf_counter() - start
+    calls = len(ins_ids)
+    return {"throughput/kpi_history": summarize([elapsed], calls=calls, calls_per_second=calls / elapsed)}
+
+
+def bench_display_stock_info(server: MockServer, ins_ids: List[int], repeat: int) -> Dict[str, Dict[str, Any]]:
+    import matplotlib.pyplot as plt
+
+    def run(client, instrument):
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # plt.show() on the Agg backend
+            main.display_stock_info(client, instrument)
+        plt.close("all")
+
+    with make_client(server) as client:
+        instruments = {i["insId"]: i for i in client.get_instruments()["instruments"]}
+        targets = [instruments[ins_id] for ins_id in ins_ids[:repeat]]
+        cold = []
+        for instrument in targets:
+            client.memo.clear()
+            cold += timed(lambda: run(client, instrument), 1)
+        warm = timed(lambda: run(client, targets[0]), repeat)
+    return {"display_stock_info/cold": summarize(cold), "display_stock_info/warm": summarize(warm)}
+
+
+def bench_analysis(server: MockServer, repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    with make_client(server) as client:
+        instruments = client.get_instruments()["instruments"]
+        ins_ids = [i["insId"] for i in instruments]
+
+        results["analysis/index_build"] = summarize(timed(lambda: InstrumentIndex(instruments), repeat))
+        index = InstrumentIndex(instruments)
+        terms = ["a", "no", "tech", "berg", "invest", "sol 1"]
+        results["analysis/index_search"] = summarize(
+            timed(lambda: [index.search(t, limit=20) for t in terms], repeat), searches=len(terms))
+
+        def load_matrix():
+            client.memo.clear()
+            return KpiMatrix.load(client, GROSS_MARGIN_KPI_ID, ins_ids)
+
+        results["analysis/kpi_matrix_load"] = summarize(timed(load_matrix, repeat))
+        matrix = load_matrix()
+        results["analysis/kpi_matrix_summary"] = summarize(timed(lambda: matrix.summary(), repeat))
+
+        screener = Screener(client)
+        screener.add_implied_growth()
+        results["analysis/screener_refresh"] = summarize(timed(lambda: screener.refresh(force=True), repeat))
+        results["analysis/screener_screen"] = summarize(timed(
+            lambda: screener.screen("pe < 15 and gross_margin > 30", sort_by="pe", limit=50), repeat))
+
+        pe = screener.columns["pe"]
+        results["analysis/implied_growth"] = summarize(timed(lambda: implied_growth(pe), repeat))
+    return results
+
+
+def quota_plan(universe: int) -> Dict[str, Dict[str, Any]]:
+    # Calls and minimum wall time for one full-universe pass under the API quota, before running it for real
+    rate = DEFAULT_MAX_CALLS / DEFAULT_PERIOD
+    batches = math.ceil(universe / MAX_BATCH_SIZE)
+    jobs = {"prices_batched": batches, "kpi_history_batched": batches, "reports_batched": batches,
+            "kpi_history_single": universe}
+    return {f"quota/{name}": {"calls": calls, "seconds": calls / rate} for name, calls in jobs.items()}
+
+
+def run_universe(universe: int, args) -> Dict[str, Dict[str, Any]]:
+    market = SyntheticMarket(universe=universe, history_years=args.history_years, seed=args.seed)
+    api = MockBorsdata(market, latency=args.latency, error_rate=args.error_rate, retry_after=0.05)
+    results = {}
+    with MockServer(api) as server:
+        ins_ids = [i["insId"] for i in market.instruments]
+        sample = ins_ids[::max(1, len(ins_ids) // 200)][:200]
+        results.update(bench_endpoints(server, ins_ids, args.repeat))
+        results.update(bench_throughput(server, sample, args.workers))
+        results.update(bench_display_stock_info(server, ins_ids, args.repeat))
+        results.update(bench_analysis(server, args.repeat))
+    results.update(quota_plan(universe))
+    results["server/requests"] = {"calls": api.stats["requests"], "throttled": api.stats["status_429"]}
+    return {f"{universe}/{name}": result for name, result in results.items()}
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    # Benchmarks that got slower than the baseline by more than the tolerance (quota plans are not timings)
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key, {}).get("seconds")
+        if before is None or "/quota/" in key or "seconds" not in result or "runs" not in result:
+            continue
+        if result["seconds"] > before * (1 + tolerance):
+            regressions.append(f"{key}: {before * 1000:.1f} ms -> {result['seconds'] * 1000:.1f} ms")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    for key, result in results.items():
+        if "runs" in result:
+            line = f"{result['seconds'] * 1000:10.2f} ms  p95 {result['p95'] * 1000:9.2f} ms"
+        elif "seconds" in result:
+            line = f"{result['calls']:>7} calls, >= {result['seconds']:.1f} s under the quota"
+        else:
+            line = ", ".join(f"{k}={v}" for k, v in result.items())
+        extra = {k: v for k, v in result.items() if k in ("bytes", "calls_per_second")}
+        if extra:
+            line += "  " + ", ".join(f"{k}={v:.0f}" for k, v in extra.items())
+        print(f"{key:<45} {line}")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Benchmark the client and analysis code against the mock server")
+    parser.add_argument("--universe", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--history-years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated network latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    args = parser.parse_args()
+
+    np.seterr(all="ignore")
+    results = {}
+    for universe in args.universe:
+        results.update(run_universe(universe, args))
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
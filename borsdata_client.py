@@ -1,26 +1,247 @@
-import os
-from typing import List, Optional, Any, Dict
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterable, List, Optional, Any, Dict
 import requests
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import RateLimiter, DEFAULT_MAX_CALLS, DEFAULT_PERIOD
+import config
+import records
+from memo_cache import MemoCache
+from metrics import Metrics
+from records import decode_json
+from response_cache import ResponseCache, kpi_dependent, make_key
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# The instList array endpoints accept at most 50 instruments per call
+MAX_BATCH_SIZE = 50
+# The StockSplits endpoint looks back one year at most
+MAX_SPLIT_LOOKBACK_DAYS = 365
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def batch_params(inst_ids: Iterable[int], params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    ids = list(dict.fromkeys(inst_ids))
+    return [dict(params or {}, instList=",".join(map(str, ids[i:i + MAX_BATCH_SIZE])))
+            for i in range(0, len(ids), MAX_BATCH_SIZE)]
+
+
+def merge_batches(responses: Iterable[Dict[str, Any]], list_key: str,
+                  id_key: str = "instrument") -> Dict[int, Dict[str, Any]]:
+    merged = {}
+    for response in responses:
+        for item in response.get(list_key) or []:
+            merged[item[id_key]] = item
+    return merged
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-# Load environment variables
-load_dotenv()
 
 class BorsdataClient:
-    BASE_URL = "https://apiservice.borsdata.se/v1"
+    BASE_URL = config.BASE_URL
     
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key or os.getenv("BORSDATA_API_KEY")
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ResponseCache] = None,
+                 invalidation_interval: float = 15 * 60, session: Optional[requests.Session] = None,
+                 pool_size: int = 10, rate_limiter: Optional[RateLimiter] = None,
+                 max_calls: int = DEFAULT_MAX_CALLS, period: float = DEFAULT_PERIOD,
+                 max_retries: int = 5, backoff_factor: float = 0.5, max_backoff: float = 60.0,
+                 timeout: float = 30, max_workers: int = 8, memo: Optional[MemoCache] = None,
+                 base_url: Optional[str] = None, metrics: Optional[Metrics] = None):
+        self.api_key = api_key or config.API_KEY
         if not self.api_key:
             raise ValueError("API key is required. Set it in .env file or pass it to the constructor.")
-    
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
+        self.cache = cache
+        self.memo = memo or MemoCache()
+        self.metrics = metrics or Metrics()
+        self.invalidation_interval = invalidation_interval
+        self._invalidation_lock = threading.Lock()
+        self._refreshing_watermarks = False
+
+        self.session = session or create_session(pool_size)
+        self.rate_limiter = rate_limiter or RateLimiter(max_calls, period)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def _get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        url = f"{self.BASE_URL}/{endpoint}"
-        params = params or {}
-        params["authKey"] = self.api_key
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        return response.json()
+        params = dict(params or {})
+        loaded = False
+
+        def load():
+            nonlocal loaded
+            loaded = True
+            return self._load(endpoint, params)
+
+        data = self.memo.get_or_fetch(make_key(endpoint, params), load, ttl=self.memo.ttl_for(endpoint))
+        self.metrics.record_cache(endpoint, "memo", not loaded)
+        return data
+
+    def _load(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self.cache is None or self.cache.ttl_for(endpoint) <= 0:
+            return self._fetch(endpoint, params)
+
+        self._refresh_cache_watermarks()
+        data = self.cache.get(endpoint, params)
+        self.metrics.record_cache(endpoint, "response", data is not None)
+        if data is None:
+            data = self._fetch(endpoint, params)
+            self.cache.set(endpoint, params, data)
+        return data
+
+    def _fetch(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        content = self._request(endpoint, params).content
+        start = time.perf_counter()
+        data = decode_json(content)
+        self.metrics.record_decode(endpoint, time.perf_counter() - start)
+        return data
+
+    def _fetch_decoded(self, endpoint: str, params: Dict[str, Any], decoder: Callable[[Any], Any]) -> Any:
+        # Opt-in path that bypasses the caches: the body is streamed into the decoder
+        # (see records.py) instead of being materialized as nested dicts first
+        response = self._request(endpoint, params, stream=True)
+        try:
+            response.raw.decode_content = True
+            start = time.perf_counter()
+            data = decoder(response.raw)
+            # Streaming: the read is part of the decode
+            self.metrics.record_decode(endpoint, time.perf_counter() - start)
+            self.metrics.record_bytes(endpoint, response.raw.tell())
+            return data
+        finally:
+            response.close()
+
+    def _request(self, endpoint: str, params: Dict[str, Any], stream: bool = False) -> requests.Response:
+        url = f"{self.base_url}/{endpoint}"
+        params = dict(params, authKey=self.api_key)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.record_request(endpoint, time.perf_counter() - start, type(e).__name__)
+                if attempt >= self.max_retries:
+                    self.metrics.record_error(endpoint, e)
+                    raise
+                self.metrics.record_retry(endpoint, type(e).__name__)
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            # Bytes on the wire (compressed); streamed bodies are counted once they are read
+            self.metrics.record_request(endpoint, time.perf_counter() - start, response.status_code,
+                                        0 if stream else response.raw.tell())
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                self.metrics.record_retry(endpoint, response.status_code)
+                delay = parse_retry_after(response.headers.get("Retry-After"))
+                if delay is None:
+                    delay = self._backoff(attempt)
+                if response.status_code == 429:
+                    self.rate_limiter.block_for(delay)
+                else:
+                    time.sleep(delay)
+                response.close()
+                attempt += 1
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                self.metrics.record_error(endpoint, e)
+                raise
+            return response
+
+    def _get_batched(self, endpoint: str, inst_ids: Iterable[int], list_key: str,
+                     params: Optional[Dict[str, Any]] = None, id_key: str = "instrument") -> Dict[int, Dict[str, Any]]:
+        # Splits the ids into MAX_BATCH_SIZE chunks, fetches them concurrently and merges by instrument id
+        chunk_params = batch_params(inst_ids, params)
+        if not chunk_params:
+            return {}
+
+        # Worker threads run in a copy of the caller's context so the calls keep its trace
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunk_params))) as executor:
+            responses = list(executor.map(lambda p: context.copy().run(self._get, endpoint, p), chunk_params))
+        return merge_batches(responses, list_key, id_key)
+
+    def _backoff(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def _watermarks_due(self, force: bool) -> bool:
+        # Callers hold the invalidation lock. One refresh at a time: while it is in flight, other
+        # readers keep using the cache as they did just before the interval ran out.
+        if self._refreshing_watermarks:
+            return False
+        checked_at = float(self.cache.get_state("watermarks_checked_at") or 0)
+        self._refreshing_watermarks = force or time.time() - checked_at >= self.invalidation_interval
+        return self._refreshing_watermarks
+
+    def _apply_watermarks(self, instruments_updated: Dict[str, Any], kpis_updated: Dict[str, Any]):
+        # Callers hold the invalidation lock
+        removed = self.cache.apply_instruments_updated(instruments_updated)
+        removed += self.cache.apply_kpis_updated(kpis_updated)
+        if removed:
+            self.memo.clear()
+        self.cache.set_state("watermarks_checked_at", str(time.time()))
+
+    def _refresh_cache_watermarks(self, force: bool = False):
+        # Drop cached entries whose instrument, reports or KPI calculation changed upstream.
+        # The check time is persisted so a restart within the interval costs no extra calls.
+        # The two requests are made outside the lock, which only guards the check and the update.
+        with self._invalidation_lock:
+            if not self._watermarks_due(force):
+                return
+        try:
+            instruments_updated = self._fetch("instruments/updated", {})
+            kpis_updated = self._fetch("instruments/kpis/updated", {})
+            with self._invalidation_lock:
+                self._apply_watermarks(instruments_updated, kpis_updated)
+        finally:
+            self._refreshing_watermarks = False
+
+    def invalidate_kpis(self, kpis_updated: Dict[str, Any]):
+        # For callers that saw kpisCalcUpdated move before the periodic check did: drops the KPI
+        # payloads calculated before it from both caches, so the next reads refetch them
+        if self.cache is not None:
+            self.cache.apply_kpis_updated(kpis_updated)
+        self.memo.discard(lambda key: kpi_dependent(key.split("?")[0]))
 
     # Instrument Meta endpoints
     def get_branches(self) -> Dict[str, Any]:
@@ -42,9 +263,21 @@ class BorsdataClient:
     def get_instruments(self) -> Dict[str, Any]:
         return self._get("instruments")
 
+    def get_instruments_records(self) -> List[records.Instrument]:
+        return self._fetch_decoded("instruments", {}, records.decode_instruments)
+
+    def get_instruments_global_records(self) -> List[records.Instrument]:
+        return self._fetch_decoded("instruments/global", {}, records.decode_instruments)
+
+    def get_instruments_global(self) -> Dict[str, Any]:
+        return self._get("instruments/global")
+
     def get_instruments_updated(self) -> Dict[str, Any]:
         return self._get("instruments/updated")
 
+    def get_kpis_updated(self) -> Dict[str, Any]:
+        return self._get("instruments/kpis/updated")
+
     def get_instrument_description(self, inst_list: List[int]) -> Dict[str, Any]:
         return self._get("instruments/description", params={"instList": ",".join(map(str, inst_list))})
 
@@ -52,6 +285,17 @@ class BorsdataClient:
     def get_reports(self, inst_id: int, report_type: str) -> Dict[str, Any]:
         return self._get(f"instruments/{inst_id}/reports/{report_type}")
 
+    def get_reports_batch(self, inst_ids: Iterable[int], max_year_count: Optional[int] = None,
+                          max_r12q_count: Optional[int] = None, original: Optional[bool] = None) -> Dict[int, Dict[str, Any]]:
+        params = {}
+        if max_year_count is not None:
+            params["maxYearCount"] = max_year_count
+        if max_r12q_count is not None:
+            params["maxR12QCount"] = max_r12q_count
+        if original is not None:
+            params["original"] = int(original)
+        return self._get_batched("instruments/reports", inst_ids, "reportList", params)
+
     def get_reports_metadata(self) -> Dict[str, Any]:
         return self._get("instruments/reports/metadata")
 
@@ -59,9 +303,31 @@ class BorsdataClient:
     def get_kpi_history(self, inst_id: int, kpi_id: int, report_type: str, price_type: str) -> Dict[str, Any]:
         return self._get(f"instruments/{inst_id}/kpis/{kpi_id}/{report_type}/{price_type}/history")
 
+    def get_kpi_history_batch(self, inst_ids: Iterable[int], kpi_id: int, report_type: str, price_type: str,
+                              max_count: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        params = {"maxCount": max_count} if max_count is not None else {}
+        return self._get_batched(f"instruments/kpis/{kpi_id}/{report_type}/{price_type}/history",
+                                 inst_ids, "kpisList", params)
+
+    def get_kpi_history_array(self, inst_id: int, kpi_id: int, report_type: str, price_type: str):
+        return self._fetch_decoded(f"instruments/{inst_id}/kpis/{kpi_id}/{report_type}/{price_type}/history", {},
+                                   records.decode_kpi_history)
+
     def get_kpi_summary(self, inst_id: int, report_type: str) -> Dict[str, Any]:
         return self._get(f"instruments/{inst_id}/kpis/{report_type}/summary")
 
+    def get_kpi_metadata_records(self) -> List[records.KpiMetadata]:
+        return self._fetch_decoded("instruments/kpis/metadata", {}, records.decode_kpi_metadata)
+
+    def get_kpi_screener(self, kpi_id: int, calc_group: str, calc: str) -> Dict[str, Any]:
+        return self._get(f"instruments/kpis/{kpi_id}/{calc_group}/{calc}")
+
+    def get_kpi_screener_global(self, kpi_id: int, calc_group: str, calc: str) -> Dict[str, Any]:
+        return self._get(f"instruments/global/kpis/{kpi_id}/{calc_group}/{calc}")
+
+    def get_kpi_screener_instrument(self, inst_id: int, kpi_id: int, calc_group: str, calc: str) -> Dict[str, Any]:
+        return self._get(f"instruments/{inst_id}/kpis/{kpi_id}/{calc_group}/{calc}")
+
     def get_kpi_metadata(self) -> Dict[str, Any]:
         return self._get("instruments/kpis/metadata")
 
@@ -74,12 +340,35 @@ class BorsdataClient:
             params["to"] = to_date
         return self._get(f"instruments/{inst_id}/stockprices", params=params)
 
+    def get_stock_prices_array(self, inst_id: int, from_date: Optional[str] = None, to_date: Optional[str] = None):
+        # Structured array with fields d, o, h, l, c, v (records.PRICE_DTYPE)
+        params = {}
+        if from_date:
+            params["from"] = from_date
+        if to_date:
+            params["to"] = to_date
+        return self._fetch_decoded(f"instruments/{inst_id}/stockprices", params, records.decode_stock_prices)
+
+    def get_stock_prices_batch(self, inst_ids: Iterable[int], from_date: Optional[str] = None,
+                               to_date: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+        params = {}
+        if from_date:
+            params["from"] = from_date
+        if to_date:
+            params["to"] = to_date
+        return self._get_batched("instruments/stockprices", inst_ids, "stockPricesArrayList", params)
+
     def get_stock_prices_last(self) -> Dict[str, Any]:
         return self._get("instruments/stockprices/last")
 
-        
+    def get_stock_prices_date(self, date: str) -> Dict[str, Any]:
+        return self._get("instruments/stockprices/date", params={"date": date})
 
-    # Existing methods...
+    # StockSplits endpoints
+    def get_stock_splits(self, from_date: Optional[str] = None) -> Dict[str, Any]:
+        # The API returns at most MAX_SPLIT_LOOKBACK_DAYS of splits
+        params = {"from": from_date} if from_date else {}
+        return self._get("instruments/StockSplits", params=params)
 
     # New methods for analysis scripts
     def get_insider_data(self, inst_id: int) -> Dict[str, Any]:
@@ -91,6 +380,10 @@ class BorsdataClient:
     def get_dividend_data(self, inst_id: int) -> Dict[str, Any]:
         return self._get(f"instruments/{inst_id}/dividends")
 
+    def get_dividend_calendar_batch(self, inst_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        # Ex-dates and amounts per share, keyed by insId rather than instrument
+        return self._get_batched("instruments/dividend/calendar", inst_ids, "list", id_key="insId")
+
     def get_buyback_data(self, inst_id: int) -> Dict[str, Any]:
         return self._get(f"instruments/{inst_id}/buybacks")
 
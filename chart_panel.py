@@ -0,0 +1,118 @@
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from valuation import curve_family
+
+GROWTH_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', '#F06292']
+
+
+def style_chart(fig, ax, title):
+    ax.set_facecolor('#FFFFFF')
+    fig.patch.set_facecolor('#F0F0F0')
+    ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
+    ax.tick_params(axis='both', which='major', labelsize=10)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    fig.tight_layout()
+
+
+# The three stock charts, created once. A new selection only swaps line data and redraws,
+# so no figures or Tk widgets are created per lookup. The P/E vs growth chart keeps its
+# curve family in a cached background and blits only the per-stock artists on top of it.
+class ChartPanel:
+    def __init__(self, master):
+        self.pe_fig, self.pe_ax, self.pe_canvas = self._create_figure(master)
+        self.pe_line, = self.pe_ax.plot([], [], marker='o')
+        self.pe_ax.set_xlabel('Year')
+        self.pe_ax.set_ylabel('P/E Ratio')
+        self.pe_ax.grid(True)
+        style_chart(self.pe_fig, self.pe_ax, "P/E Ratio Comparison")
+
+        self.gm_fig, self.gm_ax, self.gm_canvas = self._create_figure(master)
+        self.gm_line, = self.gm_ax.plot([], [], marker='o')
+        self.gm_ax.set_xlabel('Year')
+        self.gm_ax.set_ylabel('Gross Margin (%)')
+        self.gm_ax.grid(True)
+        style_chart(self.gm_fig, self.gm_ax, "Gross Margin Comparison")
+
+        self.growth_fig, self.growth_ax, self.growth_canvas = self._create_figure(master)
+        self._create_growth_chart()
+
+        for canvas in (self.pe_canvas, self.gm_canvas, self.growth_canvas):
+            canvas.get_tk_widget().pack(pady=(0, 20), padx=10)
+            canvas.draw()
+
+    def _create_figure(self, master):
+        fig = Figure(figsize=(8, 5), dpi=100)
+        ax = fig.subplots()
+        canvas = FigureCanvasTkAgg(fig, master=master)
+        return fig, ax, canvas
+
+    def _create_growth_chart(self):
+        ax = self.growth_ax
+        x, curves = curve_family()
+        for (r, y), color in zip(curves.items(), GROWTH_COLORS):
+            ax.plot(x, y, color=color, label=f'Discount rate: {r:.2%}', linewidth=2)
+
+        # Per-stock artists are animated: left out of full redraws and blitted over the cached background
+        self.pe_hline = ax.axhline(y=0, color='red', linestyle='--', linewidth=2, animated=True, visible=False)
+        self.growth_annotation = ax.annotate(
+            '', xy=(1, 0), xytext=(0.85, 5), arrowprops=dict(facecolor='black', shrink=0.05),
+            fontsize=10, bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", alpha=0.8),
+            animated=True, visible=False)
+
+        ax.set_xlabel('Growth Rate', fontsize=12)
+        ax.set_ylabel('P/E Ratio', fontsize=12)
+        # The animated line is not drawn with the legend, a static stand-in keeps its entry
+        handles, _ = ax.get_legend_handles_labels()
+        handles.append(Line2D([], [], color='red', linestyle='--', linewidth=2, label='Current P/E'))
+        ax.legend(handles=handles, fontsize=10)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.set_xlim(0.8, 2)
+        ax.set_ylim(0, 100)
+        style_chart(self.growth_fig, ax, "P/E Ratio vs Growth Rate")
+        self.growth_title = ax.title
+        self.growth_title.set_animated(True)
+
+        self.growth_background = None
+        self.growth_canvas.mpl_connect('draw_event', self._on_growth_draw)
+
+    def _on_growth_draw(self, event):
+        # Any full redraw (first show, resize) refreshes the cached background
+        self.growth_background = self.growth_canvas.copy_from_bbox(self.growth_fig.bbox)
+        self._draw_growth_artists()
+
+    def _draw_growth_artists(self):
+        for artist in (self.growth_title, self.pe_hline, self.growth_annotation):
+            self.growth_ax.draw_artist(artist)
+
+    def _update_line(self, canvas, ax, line, years, values):
+        line.set_data(np.asarray(years, dtype=float), np.asarray(values, dtype=float))
+        ax.relim()
+        ax.autoscale_view()
+        canvas.draw_idle()
+
+    def update(self, data):
+        self._update_line(self.pe_canvas, self.pe_ax, self.pe_line, data['pe_years'], data['pe_values'])
+        self._update_line(self.gm_canvas, self.gm_ax, self.gm_line, data['gm_years'], data['gm_values'])
+        self._update_growth(data['name'], data['current_pe'], data['implied_growth'])
+
+    def _update_growth(self, stock_name, current_pe, implied_growth):
+        self.growth_title.set_text(f"P/E Ratio vs Growth Rate for {stock_name}")
+        visible = current_pe is not None
+        self.pe_hline.set_visible(visible)
+        self.growth_annotation.set_visible(visible)
+        if visible:
+            self.pe_hline.set_ydata([current_pe, current_pe])
+            self.growth_annotation.set_text(f'Current P/E: {current_pe:.2f}\nImplied Growth: {implied_growth:.2%}')
+            self.growth_annotation.xy = (1 + implied_growth, current_pe)
+            self.growth_annotation.set_position((0.85, current_pe + 5))
+
+        if self.growth_background is None:
+            self.growth_canvas.draw_idle()
+            return
+        self.growth_canvas.restore_region(self.growth_background)
+        self._draw_growth_artists()
+        self.growth_canvas.blit(self.growth_fig.bbox)
@@ -1,10 +1,9 @@
 import os
 from dotenv import load_dotenv
 
+# The one place configuration is read. Nothing here raises, so importing it stays cheap;
+# BorsdataClient reports a missing key when it is constructed.
 load_dotenv()
 
 API_KEY = os.getenv("BORSDATA_API_KEY")
-BASE_URL = "https://apiservice.borsdata.se/v1"
-
-if not API_KEY:
-    raise ValueError("API key is required. Set BORSDATA_API_KEY in your .env file.")
+BASE_URL = os.getenv("BORSDATA_BASE_URL", "https://apiservice.borsdata.se/v1")
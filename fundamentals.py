@@ -0,0 +1,168 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from kpi_engine import KpiMatrix, _nan_to_none
+
+REPORT_TYPES = ("year", "r12", "quarter")
+_REPORT_KEYS = {"year": "reportsYear", "r12": "reportsR12", "quarter": "reportsQuarter"}
+# Reports between one and the same period a year earlier
+_YEAR_LAG = {"year": 1, "r12": 4, "quarter": 4}
+
+# Report fields kept as arrays, by API key. Looked up lower-cased: matrix["gross_income"].
+FIELDS = (
+    "revenues", "gross_Income", "operating_Income", "profit_Before_Tax", "profit_To_Equity_Holders",
+    "earnings_Per_Share", "number_Of_Shares", "dividend", "current_Assets", "total_Assets", "total_Equity",
+    "current_Liabilities", "net_Debt", "cash_And_Equivalents", "cash_Flow_From_Operating_Activities",
+    "free_Cash_Flow", "stock_Price_Average",
+)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator != 0, numerator / denominator * scale, np.nan)
+
+
+# One report type for many instruments as dense (instrument x report) arrays, NaN where missing,
+# laid out like KpiMatrix: newest report first, with the report's year and period per cell.
+class ReportMatrix:
+    def __init__(self, report_type: str, ins_ids: np.ndarray, years: np.ndarray, periods: np.ndarray,
+                 fields: Dict[str, np.ndarray]):
+        self.report_type = report_type
+        self.ins_ids = ins_ids
+        self.years = years
+        self.periods = periods
+        self.fields = fields
+        self._rows = {int(ins_id): i for i, ins_id in enumerate(ins_ids)}
+
+    @classmethod
+    def from_reports(cls, report_type: str, reports: Dict[int, List[Dict[str, Any]]],
+                     fields: Sequence[str] = FIELDS) -> "ReportMatrix":
+        ins_ids = np.array(sorted(reports), dtype=np.int64)
+        width = max((len(r) for r in reports.values()), default=0)
+        shape = (len(ins_ids), width)
+        years = np.zeros(shape, dtype=np.int32)
+        periods = np.zeros(shape, dtype=np.int32)
+        columns = {field: np.full(shape, np.nan) for field in fields}
+        for row, ins_id in enumerate(ins_ids):
+            rows = reports[int(ins_id)]
+            if not rows:
+                continue
+            n = len(rows)
+            years[row, :n] = [r.get("year") or 0 for r in rows]
+            periods[row, :n] = [r.get("period") or 0 for r in rows]
+            for field, column in columns.items():
+                column[row, :n] = [np.nan if r.get(field) is None else r[field] for r in rows]
+        return cls(report_type, ins_ids, years, periods, {field.lower(): column for field, column in columns.items()})
+
+    def __len__(self) -> int:
+        return len(self.ins_ids)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field.lower()]
+
+    def row(self, ins_id: int) -> int:
+        return self._rows[ins_id]
+
+    def _period_index(self) -> np.ndarray:
+        if self.report_type == "year":
+            return self.years
+        return self.years * 4 + self.periods
+
+    def lagged(self, values: np.ndarray, lag: int) -> np.ndarray:
+        # The value `lag` periods before each report, NaN where that report is missing from the history
+        result = np.full(values.shape, np.nan)
+        index = self._period_index()
+        # Reports run newest first without repeats, so the one `lag` periods back is at most `lag`
+        # positions further on; fewer when reports in between are missing
+        for shift in range(1, min(lag, values.shape[1] - 1) + 1):
+            matches = (index[:, :-shift] - index[:, shift:]) == lag
+            result[:, :-shift] = np.where(matches, values[:, shift:], result[:, :-shift])
+        return result
+
+    def growth(self, field: str, lag: Optional[int] = None) -> np.ndarray:
+        # Change against the report a year earlier (or lag periods earlier), in percent
+        values = self[field]
+        previous = self.lagged(values, _YEAR_LAG[self.report_type] if lag is None else lag)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(previous > 0, (values - previous) / previous * 100, np.nan)
+
+    def ratio(self, name: str) -> np.ndarray:
+        try:
+            return RATIOS[name](self)
+        except KeyError:
+            raise KeyError(f"Unknown ratio: {name}") from None
+
+    def kpi(self, name: str) -> KpiMatrix:
+        # The ratio as a KpiMatrix, for its windowed means, percentiles and rankings
+        return KpiMatrix(self.ins_ids, self.ratio(name), self.years, self.periods)
+
+
+def _market_cap(m: ReportMatrix) -> np.ndarray:
+    return m["stock_price_average"] * m["number_of_shares"]
+
+
+# name -> ratio per report, computed from the report fields. Margins, returns and yields are in
+# percent. Valuation and return ratios compare a price or balance with twelve months of results,
+# so they are meant for year and r12 reports.
+RATIOS: Dict[str, Callable[[ReportMatrix], np.ndarray]] = {
+    "gross_margin": lambda m: _ratio(m["gross_income"], m["revenues"], 100),
+    "operating_margin": lambda m: _ratio(m["operating_income"], m["revenues"], 100),
+    "profit_margin": lambda m: _ratio(m["profit_to_equity_holders"], m["revenues"], 100),
+    "fcf_margin": lambda m: _ratio(m["free_cash_flow"], m["revenues"], 100),
+    "revenue_growth": lambda m: m.growth("revenues"),
+    "eps_growth": lambda m: m.growth("earnings_per_share"),
+    "roe": lambda m: _ratio(m["profit_to_equity_holders"], m["total_equity"], 100),
+    "roa": lambda m: _ratio(m["profit_to_equity_holders"], m["total_assets"], 100),
+    "equity_ratio": lambda m: _ratio(m["total_equity"], m["total_assets"], 100),
+    "current_ratio": lambda m: _ratio(m["current_assets"], m["current_liabilities"]),
+    "net_debt_to_equity": lambda m: _ratio(m["net_debt"], m["total_equity"]),
+    # Negative earnings have no meaningful P/E
+    "pe": lambda m: _ratio(m["stock_price_average"], np.where(m["earnings_per_share"] > 0,
+                                                              m["earnings_per_share"], np.nan)),
+    "ps": lambda m: _ratio(_market_cap(m), m["revenues"]),
+    "pb": lambda m: _ratio(_market_cap(m), m["total_equity"]),
+    "dividend_yield": lambda m: _ratio(m["dividend"], m["stock_price_average"], 100),
+}
+
+
+# All three report types for a set of instruments, from one get_reports_batch call per
+# MAX_BATCH_SIZE instruments. Adding a ratio to RATIOS needs no new API calls.
+class Fundamentals:
+    def __init__(self, matrices: Dict[str, ReportMatrix]):
+        self.matrices = matrices
+
+    @classmethod
+    def from_batch(cls, reports: Dict[int, Dict[str, Any]]) -> "Fundamentals":
+        return cls({report_type: ReportMatrix.from_reports(
+                        report_type, {ins_id: item.get(key) or [] for ins_id, item in reports.items()})
+                    for report_type, key in _REPORT_KEYS.items()})
+
+    @classmethod
+    def load(cls, client, ins_ids: Iterable[int], max_year_count: Optional[int] = None,
+             max_r12q_count: Optional[int] = None) -> "Fundamentals":
+        reports = client.get_reports_batch(ins_ids, max_year_count, max_r12q_count)
+        return cls.from_batch({ins_id: r for ins_id, r in reports.items() if not r.get("error")})
+
+    def __getitem__(self, report_type: str) -> ReportMatrix:
+        return self.matrices[report_type]
+
+    def ratio(self, name: str, report_type: str = "r12") -> KpiMatrix:
+        return self.matrices[report_type].kpi(name)
+
+    def summary(self, names: Sequence[str] = tuple(RATIOS), report_type: str = "r12") -> Dict[str, np.ndarray]:
+        # Latest value of every ratio per instrument
+        matrix = self.matrices[report_type]
+        result = {"insId": matrix.ins_ids}
+        for name in names:
+            result[name] = matrix.kpi(name).current()
+        return result
+
+
+def compare_ratio(client, inst_id: int, name: str, windows: Sequence[int] = (3, 5),
+                  report_type: str = "year") -> Tuple[Optional[float], ...]:
+    # Like kpi_engine.compare_kpi, but derived from the instrument's reports
+    matrix = Fundamentals.load(client, [inst_id])[report_type].kpi(name)
+    if not len(matrix):
+        return (None,) * (len(windows) + 1)
+    return tuple(_nan_to_none(v[0]) for v in [matrix.current()] + [matrix.mean(n) for n in windows])
@@ -1,31 +1,40 @@
+from typing import Optional
+
+import numpy as np
+
 from borsdata_client import BorsdataClient
-import matplotlib.pyplot as plt
+from fundamentals import Fundamentals, compare_ratio
+from instrument_index import get_instrument_index
+from kpi_engine import KpiMatrix
+from metrics import traced
+
+# Gross margin is derived from the annual reports, so the printed and plotted numbers come from
+# the same (memoized) reports call
 
-def get_gross_margin(client: BorsdataClient, inst_id: int) -> float:
-    kpi_id = 28  # Gross Margin KPI ID
-    data = client.get_kpi_history(inst_id, kpi_id, "year", "mean")
-    if data['values']:
-        return data['values'][0]['v']
-    return None
+def get_gross_margin_matrix(client: BorsdataClient, inst_id: int) -> KpiMatrix:
+    return Fundamentals.load(client, [inst_id])["year"].kpi("gross_margin")
 
-def get_gross_margin_average(client: BorsdataClient, inst_id: int, years: int) -> float:
-    kpi_id = 28  # Gross Margin KPI ID
-    data = client.get_kpi_history(inst_id, kpi_id, "year", "mean")
-    values = [v['v'] for v in data['values'][:years] if v['v'] is not None]
-    return sum(values) / len(values) if values else None
+def get_gross_margin(client: BorsdataClient, inst_id: int) -> Optional[float]:
+    current_gm, = compare_ratio(client, inst_id, "gross_margin", windows=())
+    return current_gm
+
+def get_gross_margin_average(client: BorsdataClient, inst_id: int, years: int) -> Optional[float]:
+    _, average = compare_ratio(client, inst_id, "gross_margin", windows=(years,))
+    return average
 
 def compare_gross_margins(client: BorsdataClient, inst_id: int):
-    current_gm = get_gross_margin(client, inst_id)
-    avg_3year = get_gross_margin_average(client, inst_id, 3)
-    avg_5year = get_gross_margin_average(client, inst_id, 5)
+    current_gm, avg_3year, avg_5year = compare_ratio(client, inst_id, "gross_margin", windows=(3, 5))
     return current_gm, avg_3year, avg_5year
 
+def get_gross_margin_history(client: BorsdataClient, inst_id: int):
+    matrix = get_gross_margin_matrix(client, inst_id)
+    if not len(matrix):
+        return [], []
+    present = ~np.isnan(matrix.values[0])
+    return matrix.years[0][present].tolist(), matrix.values[0][present].tolist()
+
 def plot_gross_margin_comparison(client, inst_id, ax):
-    # Fetch the data (you may need to adjust this based on your actual implementation)
-    gross_margin_data = client.get_kpi_history(inst_id, kpi_id=10, report_type='year', price_type='mean')
-    
-    years = [item['y'] for item in gross_margin_data['values']]
-    gross_margin_values = [item['v'] for item in gross_margin_data['values']]
+    years, gross_margin_values = get_gross_margin_history(client, inst_id)
     
     ax.plot(years, gross_margin_values, marker='o')
     ax.set_title('Gross Margin Over Time')
@@ -33,9 +42,11 @@ def plot_gross_margin_comparison(client, inst_id, ax):
     ax.set_ylabel('Gross Margin (%)')
     ax.grid(True)
 
-def print_gross_margin_comparison(client: BorsdataClient, inst_id: int):
+@traced
+def print_gross_margin_comparison(client: BorsdataClient, inst_id: int, instrument_name: Optional[str] = None):
     current_gm, avg_3year, avg_5year = compare_gross_margins(client, inst_id)
-    instrument_name = next((i['name'] for i in client.get_instruments().get('instruments', []) if i['insId'] == inst_id), "Unknown")
+    if instrument_name is None:
+        instrument_name = get_instrument_index(client).name(inst_id)
     
     print(f"\nGross Margin Comparison for {instrument_name} (ID: {inst_id}):")
     print(f"Current Gross Margin: {current_gm:.2f}%" if current_gm else "Current Gross Margin: N/A")
@@ -1,12 +1,18 @@
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, scrolledtext, font
 from borsdata_client import BorsdataClient
+from instrument_index import InstrumentIndex, load_snapshot, refresh_index
+from metrics import traced
+from response_cache import ResponseCache
 import pe_analysis
 import gross_margin_analysis
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
+from valuation import implied_growth
+
+SEARCH_DEBOUNCE_MS = 150
+RESULT_POLL_MS = 16  # ~60 fps
 
 class StockInfoApp(tk.Tk):
     def __init__(self):
@@ -16,8 +22,21 @@ class StockInfoApp(tk.Tk):
         self.geometry("1200x800")
         self.configure(bg='#F0F0F0')  # Light gray background
 
-        self.client = BorsdataClient()
-        self.instruments = self.client.get_instruments().get('instruments', [])
+        self.client = BorsdataClient(cache=ResponseCache())
+        # The saved instrument list makes search usable immediately; the live list replaces it
+        # once the background refresh finishes
+        self.index = load_snapshot(self.client) or InstrumentIndex([])
+        self.results = []
+        self.charts = None
+
+        # Network and analysis work runs on the executor; results come back through the queue,
+        # which is drained on the Tk thread. Each selection gets a token so late results for a
+        # stock the user already moved away from are dropped.
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.result_queue = queue.Queue()
+        self.selection_token = 0
+        self.pending_future = None
+        self.search_job = None
 
         self.style = ttk.Style(self)
         self.style.theme_use('clam')
@@ -25,6 +44,18 @@ class StockInfoApp(tk.Tk):
 
         self.create_widgets()
 
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(RESULT_POLL_MS, self.poll_results)
+        # Matplotlib is only imported once the window is up
+        self.after_idle(self.create_charts)
+        self.submit(self.on_index_loaded, refresh_index, self.client)
+        if not len(self.index):
+            self.info_text.insert(tk.END, "Loading instrument list...\n")
+
+    def on_close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
     def configure_styles(self):
         self.style.configure('TFrame', background='#F0F0F0')
         self.style.configure('TLabel', background='#F0F0F0', foreground='#333333', font=('Helvetica', 10))
@@ -93,38 +124,85 @@ class StockInfoApp(tk.Tk):
         self.canvas.pack(side="left", fill="both", expand=True)
         self.scrollbar.pack(side="right", fill="y")
 
+    def create_charts(self):
+        from chart_panel import ChartPanel
+        self.charts = ChartPanel(self.scrollable_frame)
+
     def search_stocks(self, *args):
+        # Debounced: only the last keystroke within SEARCH_DEBOUNCE_MS triggers a search
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
         search_term = self.search_var.get().lower()
         self.results_list.delete(0, tk.END)
 
-        matches = []
-        for inst in self.instruments:
-            name_match = search_term in inst['name'].lower()
-            ticker_match = search_term in inst['ticker'].lower()
-            if name_match or ticker_match:
-                match_score = 0
-                if name_match:
-                    match_score += len(search_term) / len(inst['name'])
-                if ticker_match:
-                    match_score += len(search_term) / len(inst['ticker'])
-                matches.append((match_score, inst))
-
-        matches.sort(reverse=True, key=lambda x: x[0])
-        matches = [m[1] for m in matches]
-
-        for inst in matches[:20]:  # Show top 20 matches
+        self.results = self.index.search(search_term, limit=20)  # Show top 20 matches
+        for inst in self.results:
             self.results_list.insert(tk.END, f"{inst['name']} ({inst['ticker']})")
 
     def on_select(self, event):
         selection = event.widget.curselection()
         if selection:
-            index = selection[0]
-            data = event.widget.get(index)
-            self.display_stock_info(data)
+            self.display_stock_info(self.results[selection[0]])
 
-    def display_stock_info(self, item):
-        instrument = next(inst for inst in self.instruments if f"{inst['name']} ({inst['ticker']})" == item)
-        
+    def display_stock_info(self, instrument):
+        self.selection_token += 1
+        token = self.selection_token
+        if self.pending_future is not None:
+            self.pending_future.cancel()
+
+        self.info_text.delete('1.0', tk.END)
+        self.info_text.insert(tk.END, f"Loading {instrument['name']} ({instrument['ticker']})...\n")
+
+        self.pending_future = self.submit(lambda future: self.on_stock_loaded(token, future),
+                                          self.load_stock_info, instrument)
+
+    def submit(self, handler, fn, *args):
+        # Runs fn on the executor; handler(future) is called on the Tk thread when it is done
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda future: self.result_queue.put((handler, future)))
+        return future
+
+    def poll_results(self):
+        try:
+            while True:
+                handler, future = self.result_queue.get_nowait()
+                if not future.cancelled():
+                    handler(future)
+        except queue.Empty:
+            pass
+        self.after(RESULT_POLL_MS, self.poll_results)
+
+    def on_index_loaded(self, future):
+        error = future.exception()
+        if error is not None:
+            if not len(self.index):
+                self.info_text.delete('1.0', tk.END)
+                self.info_text.insert(tk.END, f"Failed to load instrument list: {error}\n")
+            return
+        had_index = len(self.index) > 0
+        self.index = future.result()
+        if not had_index:
+            self.info_text.delete('1.0', tk.END)
+        if self.search_var.get():
+            self.run_search()
+
+    def on_stock_loaded(self, token, future):
+        if token != self.selection_token:
+            return
+        error = future.exception()
+        if error is not None:
+            self.info_text.delete('1.0', tk.END)
+            self.info_text.insert(tk.END, f"Failed to load stock information: {error}\n")
+        else:
+            self.show_stock_info(*future.result())
+
+    @traced
+    def load_stock_info(self, instrument):
+        # Runs on a worker thread: no Tk calls in here
         info = f"Information for {instrument['name']} ({instrument['ticker']})\n\n"
         info += f"Instrument ID: {instrument['insId']}\n"
         info += f"ISIN: {instrument['isin']}\n"
@@ -139,81 +217,25 @@ class StockInfoApp(tk.Tk):
         for price in stock_prices.get('stockPricesList', [])[:5]:
             info += f"Date: {price['d']}, Close: {price['c']}, Volume: {price['v']}\n"
 
+        pe_years, pe_values = pe_analysis.get_pe_history(self.client, instrument['insId'])
+        gm_years, gm_values = gross_margin_analysis.get_gross_margin_history(self.client, instrument['insId'])
+        current_pe = pe_values[0] if pe_values else None
+        chart_data = {
+            'name': instrument['name'],
+            'pe_years': pe_years,
+            'pe_values': pe_values,
+            'gm_years': gm_years,
+            'gm_values': gm_values,
+            'current_pe': current_pe,
+            'implied_growth': float(implied_growth(current_pe)) if current_pe is not None else None,
+        }
+        return info, chart_data
+
+    def show_stock_info(self, info, chart_data):
         self.info_text.delete('1.0', tk.END)
         self.info_text.insert(tk.END, info)
-
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        self.create_pe_chart(instrument['insId'])
-        self.create_gross_margin_chart(instrument['insId'])
-        self.create_pe_growth_rate_chart(instrument['insId'], instrument['name'])
-
-        self.canvas.update_idletasks()
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-
-    def create_pe_chart(self, inst_id):
-        fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-        pe_analysis.plot_pe_comparison(self.client, inst_id, ax)
-        self.style_chart(fig, ax, "P/E Ratio Comparison")
-        self.add_chart_to_gui(fig)
-
-    def create_gross_margin_chart(self, inst_id):
-        fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-        gross_margin_analysis.plot_gross_margin_comparison(self.client, inst_id, ax)
-        self.style_chart(fig, ax, "Gross Margin Comparison")
-        self.add_chart_to_gui(fig)
-
-    def create_pe_growth_rate_chart(self, inst_id, stock_name):
-        current_pe = pe_analysis.get_pe_ratio(self.client, inst_id)
-        if current_pe is None:
-            return
-
-        fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-        
-        def calculate_y(X, r):
-            return (X**(1/r) - 1) / np.log(X)
-
-        x = np.linspace(0.8, 2, 1000)
-        growth_rates = [0.05, 0.07, 0.09, 0.11, 0.13, 0.15]
-        colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', '#F06292']
-
-        for r, color in zip(growth_rates, colors):
-            y = calculate_y(x, r)
-            ax.plot(x, y, color=color, label=f'Discount rate: {r:.2%}', linewidth=2)
-
-        ax.axhline(y=current_pe, color='red', linestyle='--', label=f'Current P/E: {current_pe:.2f}', linewidth=2)
-
-        ax.set_xlabel('Growth Rate', fontsize=12)
-        ax.set_ylabel('P/E Ratio', fontsize=12)
-        ax.set_title(f'P/E Ratio vs Growth Rate for {stock_name}', fontsize=14)
-        ax.legend(fontsize=10)
-        ax.grid(True, linestyle='--', alpha=0.7)
-        ax.set_xlim(0.8, 2)
-        ax.set_ylim(0, 100)
-
-        intersect_x = np.interp(current_pe, calculate_y(x, 0.09), x)
-        ax.annotate(f'Current P/E: {current_pe:.2f}\nImplied Growth: {(intersect_x-1):.2%}',
-                    xy=(intersect_x, current_pe), xytext=(0.85, current_pe+5),
-                    arrowprops=dict(facecolor='black', shrink=0.05),
-                    fontsize=10, bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", alpha=0.8))
-
-        self.style_chart(fig, ax, f"P/E Ratio vs Growth Rate for {stock_name}")
-        self.add_chart_to_gui(fig)
-
-    def style_chart(self, fig, ax, title):
-        ax.set_facecolor('#FFFFFF')
-        fig.patch.set_facecolor('#F0F0F0')
-        ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        ax.tick_params(axis='both', which='major', labelsize=10)
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        plt.tight_layout()
-
-    def add_chart_to_gui(self, fig):
-        canvas = FigureCanvasTkAgg(fig, master=self.scrollable_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(pady=(0, 20), padx=10)
+        if self.charts is not None:
+            self.charts.update(chart_data)
 
 def main():
     app = StockInfoApp()
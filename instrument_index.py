@@ -0,0 +1,189 @@
+import heapq
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from records import decode_json
+
+GRAM_SIZE = 3
+DEFAULT_SNAPSHOT_PATH = os.path.expanduser("~/.cache/borsdata/instruments.json")
+
+
+def _grams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# Lookup tables and a substring search over the instrument list, built once.
+# Search ranks exactly like the old linear scan: an instrument matches when the search term is
+# contained in its name or ticker, and scores len(term) / len(field) for each field it matches.
+# Ties keep the order of the instrument list.
+class InstrumentIndex:
+    def __init__(self, instruments: Iterable[Dict[str, Any]]):
+        self.instruments: List[Dict[str, Any]] = []
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        self.by_isin: Dict[str, Dict[str, Any]] = {}
+        self.by_ticker: Dict[str, Dict[str, Any]] = {}
+        self._names: List[str] = []
+        self._tickers: List[str] = []
+        # n-gram -> positions (ascending) of instruments whose name or ticker contains it
+        self._postings: Dict[str, List[int]] = {}
+        # Full rankings for one- and two-letter terms, which match a large part of the universe
+        self._short_rankings: Dict[str, List[Tuple[float, int]]] = {}
+
+        for inst in instruments:
+            if inst["insId"] in self.by_id:
+                continue
+            self._add(inst)
+
+    def _add(self, inst: Dict[str, Any]):
+        pos = len(self.instruments)
+        name = (inst.get("name") or "").lower()
+        ticker = (inst.get("ticker") or "").lower()
+        self.instruments.append(inst)
+        self._names.append(name)
+        self._tickers.append(ticker)
+
+        self.by_id[inst["insId"]] = inst
+        if inst.get("isin"):
+            self.by_isin.setdefault(inst["isin"].upper(), inst)
+        if ticker:
+            self.by_ticker.setdefault(ticker, inst)
+
+        grams = set()
+        for n in range(1, GRAM_SIZE + 1):
+            grams |= _grams(name, n)
+            grams |= _grams(ticker, n)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(pos)
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+    def get(self, ins_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(ins_id)
+
+    def get_by_isin(self, isin: str) -> Optional[Dict[str, Any]]:
+        return self.by_isin.get(isin.strip().upper())
+
+    def get_by_ticker(self, ticker: str) -> Optional[Dict[str, Any]]:
+        return self.by_ticker.get(ticker.strip().lower())
+
+    def name(self, ins_id: int, default: str = "Unknown") -> str:
+        inst = self.by_id.get(ins_id)
+        return inst["name"] if inst else default
+
+    def resolve(self, key: str) -> Optional[Dict[str, Any]]:
+        # Accepts an instrument id, ISIN or ticker
+        key = key.strip()
+        if key.isdigit() and int(key) in self.by_id:
+            return self.by_id[int(key)]
+        return self.get_by_isin(key) or self.get_by_ticker(key)
+
+    def _candidates(self, term: str) -> Iterable[int]:
+        if len(term) <= GRAM_SIZE:
+            return self._postings.get(term, [])
+        # Every substring match contains all of the term's trigrams, so the rarest one bounds the candidates
+        postings = [self._postings.get(gram) for gram in _grams(term, GRAM_SIZE)]
+        if any(p is None for p in postings):
+            return []
+        return min(postings, key=len)
+
+    def search_with_total(self, term: str, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        term = term.lower()
+        if not term:
+            # Everything matches with score 0, so the ranking is the list order
+            end = len(self.instruments) if limit is None else limit
+            return self.instruments[:end], len(self.instruments)
+
+        if len(term) <= 2 and term in self._short_rankings:
+            ranking = self._short_rankings[term]
+            end = len(ranking) if limit is None else limit
+            return [self.instruments[-neg_pos] for _, neg_pos in ranking[:end]], len(ranking)
+
+        scored = []
+        n = len(term)
+        names, tickers = self._names, self._tickers
+        for pos in self._candidates(term):
+            name, ticker = names[pos], tickers[pos]
+            score = 0.0
+            matched = False
+            if term in name:
+                score += n / len(name)
+                matched = True
+            if term in ticker:
+                score += n / len(ticker)
+                matched = True
+            if matched:
+                scored.append((score, -pos))
+        if len(term) <= 2:
+            scored.sort(reverse=True)
+            self._short_rankings[term] = scored
+            top = scored if limit is None else scored[:limit]
+        elif limit is None:
+            top = sorted(scored, reverse=True)
+        else:
+            top = heapq.nlargest(limit, scored)
+        return [self.instruments[-neg_pos] for _, neg_pos in top], len(scored)
+
+    def search(self, term: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.search_with_total(term, limit)[0]
+
+
+def build_index(client, include_global: bool = False) -> InstrumentIndex:
+    instruments = list(client.get_instruments().get("instruments") or [])
+    if include_global:
+        instruments += client.get_instruments_global().get("instruments") or []
+    return InstrumentIndex(instruments)
+
+
+def _install(client, index: InstrumentIndex, include_global: bool):
+    client._instrument_index = index
+    client._instrument_index_global = include_global
+
+
+def get_instrument_index(client, include_global: bool = False) -> InstrumentIndex:
+    # One index per client, rebuilt only when asked for a wider universe
+    index = getattr(client, "_instrument_index", None)
+    if index is None or (include_global and not getattr(client, "_instrument_index_global", False)):
+        index = build_index(client, include_global)
+        _install(client, index, include_global)
+    return index
+
+
+# The instrument list from the last run, kept on disk so startup can show a searchable list
+# without waiting for the API. It is only ever a stand-in until refresh_index has run.
+def save_snapshot(index: InstrumentIndex, include_global: bool = False, path: str = DEFAULT_SNAPSHOT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    instruments = [inst.to_json() if hasattr(inst, "to_json") else inst for inst in index.instruments]
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"saved": time.time(), "global": include_global, "instruments": instruments}, f)
+    os.replace(tmp, path)
+
+
+def load_snapshot(client, path: str = DEFAULT_SNAPSHOT_PATH) -> Optional[InstrumentIndex]:
+    # Installs the snapshot as the client's index unless it already has a live one
+    if getattr(client, "_instrument_index", None) is not None:
+        return client._instrument_index
+    try:
+        with open(path, "rb") as f:
+            snapshot = decode_json(f.read())
+    except (OSError, ValueError):
+        return None
+    index = InstrumentIndex(snapshot.get("instruments") or [])
+    _install(client, index, bool(snapshot.get("global")))
+    return index
+
+
+def refresh_index(client, include_global: bool = False, path: Optional[str] = DEFAULT_SNAPSHOT_PATH) -> InstrumentIndex:
+    # Fetches the current list, swaps it in as the client's index and rewrites the snapshot.
+    # Safe to run on a worker thread; readers pick the new index up on their next lookup.
+    index = build_index(client, include_global)
+    _install(client, index, include_global)
+    if path is not None:
+        try:
+            save_snapshot(index, include_global, path)
+        except OSError:
+            pass
+    return index
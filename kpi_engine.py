@@ -0,0 +1,117 @@
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+PE_KPI_ID = 2
+GROSS_MARGIN_KPI_ID = 28
+
+
+def _nan_to_none(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+# KPI history for many instruments as a dense (instrument x period) matrix, NaN where missing.
+# Each row is ordered like the API returns it, newest report first, so column 0 is the
+# instrument's current value and columns [:n] are its last n reports.
+class KpiMatrix:
+    def __init__(self, ins_ids: np.ndarray, values: np.ndarray, years: np.ndarray, periods: np.ndarray):
+        self.ins_ids = ins_ids
+        self.values = values
+        self.years = years
+        self.periods = periods
+        self._rows = {int(ins_id): i for i, ins_id in enumerate(ins_ids)}
+
+    @classmethod
+    def from_history(cls, histories: Dict[int, Dict[str, Any]]) -> "KpiMatrix":
+        # Accepts both get_kpi_history responses and get_kpi_history_batch items, keyed by instrument id
+        ins_ids = np.array(sorted(histories), dtype=np.int64)
+        width = max((len(h.get("values") or []) for h in histories.values()), default=0)
+        values = np.full((len(ins_ids), width), np.nan)
+        years = np.zeros((len(ins_ids), width), dtype=np.int32)
+        periods = np.zeros((len(ins_ids), width), dtype=np.int32)
+        for row, ins_id in enumerate(ins_ids):
+            history = histories[int(ins_id)].get("values") or []
+            if not history:
+                continue
+            n = len(history)
+            values[row, :n] = [np.nan if h.get("v") is None else h["v"] for h in history]
+            years[row, :n] = [h.get("y", 0) for h in history]
+            periods[row, :n] = [h.get("p", 0) for h in history]
+        return cls(ins_ids, values, years, periods)
+
+    @classmethod
+    def load(cls, client, kpi_id: int, ins_ids: Iterable[int], report_type: str = "year",
+             price_type: str = "mean", max_count: Optional[int] = None) -> "KpiMatrix":
+        histories = client.get_kpi_history_batch(ins_ids, kpi_id, report_type, price_type, max_count=max_count)
+        return cls.from_history({ins_id: h for ins_id, h in histories.items() if not h.get("error")})
+
+    def __len__(self) -> int:
+        return len(self.ins_ids)
+
+    def row(self, ins_id: int) -> int:
+        return self._rows[ins_id]
+
+    def current(self) -> np.ndarray:
+        if self.values.shape[1] == 0:
+            return np.full(len(self), np.nan)
+        return self.values[:, 0]
+
+    def mean(self, n: int) -> np.ndarray:
+        # Mean of the last n reports, ignoring missing values
+        window = self.values[:, :n]
+        present = ~np.isnan(window)
+        count = present.sum(axis=1)
+        total = np.where(present, window, 0.0).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def difference(self, n: int) -> np.ndarray:
+        return self.current() - self.mean(n)
+
+    def deviation(self, n: int) -> np.ndarray:
+        # Current value relative to the n-report mean, in percent
+        mean = self.mean(n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(mean != 0, (self.current() - mean) / mean * 100, np.nan)
+
+    def history_percentile(self, n: Optional[int] = None) -> np.ndarray:
+        # Share of the instrument's own reports (the last n, or all) at or below its current value, in percent
+        window = self.values if n is None else self.values[:, :n]
+        current = self.current()[:, None]
+        present = ~np.isnan(window)
+        count = present.sum(axis=1)
+        at_or_below = (present & (window <= current)).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where((count > 0) & ~np.isnan(current[:, 0]), at_or_below / count * 100, np.nan)
+
+    def rank(self, scores: np.ndarray, ascending: bool = True) -> np.ndarray:
+        # Instrument ids ordered by score, instruments without a score last
+        order = np.argsort(scores if ascending else -scores, kind="stable")
+        order = order[~np.isnan(scores[order])]
+        return self.ins_ids[order]
+
+    def summary(self, windows: Sequence[int] = (3, 5)) -> Dict[str, np.ndarray]:
+        result = {"insId": self.ins_ids, "current": self.current(), "history_percentile": self.history_percentile()}
+        for n in windows:
+            result[f"avg_{n}"] = self.mean(n)
+            result[f"deviation_{n}"] = self.deviation(n)
+        return result
+
+
+def cross_sectional_percentile(scores: np.ndarray) -> np.ndarray:
+    # Percentile rank (0-100] of every score among all instruments that have one
+    result = np.full(len(scores), np.nan)
+    present = ~np.isnan(scores)
+    count = present.sum()
+    if count:
+        ranks = np.argsort(np.argsort(scores[present], kind="stable"), kind="stable") + 1
+        result[present] = ranks / count * 100
+    return result
+
+
+def compare_kpi(client, inst_id: int, kpi_id: int, windows: Sequence[int] = (3, 5),
+                report_type: str = "year", price_type: str = "mean") -> Tuple[Optional[float], ...]:
+    # Current value followed by the mean over each window, None where there is no data
+    history = client.get_kpi_history(inst_id, kpi_id, report_type, price_type)
+    matrix = KpiMatrix.from_history({inst_id: history})
+    return tuple(_nan_to_none(v[0]) for v in [matrix.current()] + [matrix.mean(n) for n in windows])
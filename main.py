@@ -1,6 +1,11 @@
+import argparse
+import threading
 from datetime import datetime, timedelta
 
 from borsdata_client import BorsdataClient
+from instrument_index import get_instrument_index, load_snapshot, refresh_index
+from metrics import traced
+from response_cache import ResponseCache
 import pe_analysis
 import gross_margin_analysis
 
@@ -9,51 +14,39 @@ def print_section(title):
     print(f"{title:^50}")
     print(f"{'=' * 50}\n")
 
-def get_user_choice(instruments):
+def get_user_choice(index):
     while True:
         search_term = input("Enter a stock name or ticker (or 'q' to quit): ").lower()
         if search_term == 'q':
             return None
 
-        matches = []
-        for inst in instruments:
-            name_match = search_term in inst['name'].lower()
-            ticker_match = search_term in inst['ticker'].lower()
-            if name_match or ticker_match:
-                match_score = 0
-                if name_match:
-                    match_score += len(search_term) / len(inst['name'])
-                if ticker_match:
-                    match_score += len(search_term) / len(inst['ticker'])
-                matches.append((match_score, inst))
-
-        matches.sort(reverse=True, key=lambda x: x[0])
-        matches = [m[1] for m in matches]
+        matches, total = index.search_with_total(search_term, limit=10)
 
         if not matches:
             print("No matching stocks found. Please try again.")
             continue
 
         print("\nMatching stocks:")
-        for i, inst in enumerate(matches[:10], 1):  # Show top 10 matches
+        for i, inst in enumerate(matches, 1):  # Show top 10 matches
             print(f"{i}. {inst['name']} ({inst['ticker']})")
 
-        if len(matches) > 10:
-            print(f"... and {len(matches) - 10} more. Please refine your search if needed.")
+        if total > 10:
+            print(f"... and {total - 10} more. Please refine your search if needed.")
 
         choice = input("\nEnter the number of your choice (or 'b' to search again): ")
         if choice.lower() == 'b':
             continue
 
         try:
-            index = int(choice) - 1
-            if 0 <= index < len(matches):
-                return matches[index]
+            choice_index = int(choice) - 1
+            if 0 <= choice_index < len(matches):
+                return matches[choice_index]
             else:
                 print("Invalid choice. Please try again.")
         except ValueError:
             print("Invalid input. Please enter a number.")
 
+@traced
 def display_stock_info(client, instrument):
     print_section(f"Information for {instrument['name']} ({instrument['ticker']})")
 
@@ -74,20 +67,53 @@ def display_stock_info(client, instrument):
 
     # Display P/E Ratio Comparison
     print_section("P/E Ratio Comparison")
-    pe_analysis.print_pe_comparison(client, instrument['insId'])
+    pe_analysis.print_pe_comparison(client, instrument['insId'], instrument['name'])
 
     # Display Gross Margin Comparison
     print_section("Gross Margin Comparison")
-    gross_margin_analysis.print_gross_margin_comparison(client, instrument['insId'])
+    gross_margin_analysis.print_gross_margin_comparison(client, instrument['insId'], instrument['name'])
+
+def refresh_in_background(client):
+    try:
+        refresh_index(client)
+    except Exception:
+        pass  # Keep using the snapshot; the next run tries again
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Look up stocks on Börsdata")
+    parser.add_argument("--batch", metavar="WATCHLIST",
+                        help="run without prompts over a file of tickers, ISINs or instrument ids")
+    parser.add_argument("--output", default="results.csv", help="batch results, .csv or .parquet")
+    parser.add_argument("--charts", metavar="DIR", help="also save one chart per instrument to DIR")
+    parser.add_argument("--chart-workers", type=int, default=None, help="processes rendering charts")
+    return parser.parse_args()
+
+def run_batch_mode(client, args):
+    import batch  # Only needed here, keeps interactive startup fast
+
+    # A fresh instrument list, so new listings in the watchlist resolve
+    index = refresh_index(client)
+    result = batch.run_batch(client, index, args.batch, args.output, charts_dir=args.charts,
+                             chart_workers=args.chart_workers)
+    print(f"Wrote {result['instruments']} instruments to {args.output} in {result['seconds']:.0f}s "
+          f"({len(result['unresolved'])} not found, {result['charts']} charts).")
 
 def main():
-    client = BorsdataClient()
+    args = parse_args()
+    client = BorsdataClient(cache=ResponseCache())
+    if args.batch:
+        run_batch_mode(client, args)
+        return
     
-    # Get instruments
-    instruments = client.get_instruments().get('instruments', [])
+    # Start from the saved instrument list and refresh it in the background; without a
+    # snapshot (first run) the list has to be fetched before the first prompt
+    if load_snapshot(client) is None:
+        refresh_index(client)
+    else:
+        threading.Thread(target=refresh_in_background, args=(client,), daemon=True).start()
 
     while True:
-        chosen_instrument = get_user_choice(instruments)
+        chosen_instrument = get_user_choice(get_instrument_index(client))
         if chosen_instrument is None:
             print("Thank you for using the stock information system. Goodbye!")
             break
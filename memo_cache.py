@@ -0,0 +1,176 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from response_cache import compile_ttls, lookup_ttl
+
+DEFAULT_MEMO_BYTES = 64 * 1024 * 1024
+DEFAULT_MEMO_TTL = 5 * 60
+
+
+def estimate_size(obj: Any) -> int:
+    # Rough deep size of a decoded JSON payload, good enough for a memory budget
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return size
+
+
+# In-process LRU of decoded responses with a memory bound and a TTL. Concurrent requests
+# for a key that is already being fetched wait for that fetch instead of issuing their own.
+# Cached payloads are shared between callers and must be treated as read-only.
+class MemoCache:
+    def __init__(self, max_bytes: int = DEFAULT_MEMO_BYTES, ttl: float = DEFAULT_MEMO_TTL,
+                 ttls: Optional[List[Tuple[str, int]]] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.ttls = compile_ttls(ttls)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._async_inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, endpoint: str) -> float:
+        return min(self.ttl, lookup_ttl(endpoint, self.ttls, self.ttl))
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: str, value: Any, ttl: float):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return fetch()
+
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value, ttl)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    async def get_or_fetch_async(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                                 ttl: Optional[float] = None) -> Any:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return await fetch()
+
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            future = self._async_inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return await asyncio.shield(future)
+
+        try:
+            value = await fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._async_inflight[key]
+            future.set_exception(e)
+            # Nobody may be waiting on the shared future, don't let asyncio warn about it
+            future.exception()
+            raise
+        with self._lock:
+            self._store(key, value, ttl)
+            del self._async_inflight[key]
+        future.set_result(value)
+        return value
+
+    def discard(self, predicate: Callable[[str], bool]) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hit_rate": (self.hits + self.coalesced) / requests if requests else 0.0,
+        }
@@ -0,0 +1,286 @@
+import bisect
+import contextvars
+import functools
+import json
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Log-spaced latency buckets, 2^(1/4) apart from 0.1 ms to about 100 s. Quantiles read from them
+# are within ~10% of the true value while memory per histogram stays fixed.
+_BUCKET_FACTOR = 2 ** 0.25
+BUCKETS = [0.0001 * _BUCKET_FACTOR ** i for i in range(81)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+_ENDPOINT_ID = re.compile(r"^instruments/\d+(?=/|$)")
+_operation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("borsdata_operation", default=None)
+
+
+def endpoint_label(endpoint: str) -> str:
+    # Per-instrument paths share one series: instruments/97/stockprices -> instruments/{id}/stockprices
+    return _ENDPOINT_ID.sub("instruments/{id}", endpoint)
+
+
+def current_operation() -> Optional[str]:
+    return _operation.get()
+
+
+@contextmanager
+def trace(name: str) -> Iterator[str]:
+    # Attributes every API call made inside the block (in this thread or task) to the operation.
+    # Nested traces are joined with '/', e.g. display_stock_info/print_pe_comparison.
+    parent = _operation.get()
+    operation = f"{parent}/{name}" if parent else name
+    token = _operation.set(operation)
+    try:
+        yield operation
+    finally:
+        _operation.reset(token)
+
+
+def traced(func: Callable = None, *, name: Optional[str] = None):
+    # Decorator form of trace(), named after the function unless given a name
+    if func is None:
+        return functools.partial(traced, name=name)
+    label = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with trace(label):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                if i == 0 or i == len(BUCKETS):
+                    return BUCKETS[min(i, len(BUCKETS) - 1)]
+                # Geometric midpoint of the bucket
+                return BUCKETS[i] / _BUCKET_FACTOR ** 0.5
+        return BUCKETS[-1]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        result = {f"p{round(q * 100)}": self.quantile(q) for q in QUANTILES}
+        result["mean"] = self.total / self.count if self.count else None
+        result["count"] = self.count
+        result["sum"] = self.total
+        return result
+
+
+class EndpointStats:
+    def __init__(self):
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.latency = Histogram()
+        self.decode = Histogram()
+        self.bytes = 0
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.errors = 0
+        self.cache: Dict[str, List[int]] = defaultdict(lambda: [0, 0])  # layer -> [hits, misses]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": sum(self.statuses.values()),
+            "statuses": dict(self.statuses),
+            "latency": self.latency.summary(),
+            "decode": self.decode.summary(),
+            "bytes": self.bytes,
+            "retries": dict(self.retries),
+            "throttled": self.retries.get("429", 0),
+            "errors": self.errors,
+            "cache": {layer: {"hits": hits, "misses": misses,
+                              "hit_ratio": hits / (hits + misses) if hits + misses else None}
+                      for layer, (hits, misses) in self.cache.items()},
+        }
+
+
+class OperationStats:
+    __slots__ = ("requests", "seconds", "bytes")
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+
+# Per-endpoint counters for a client, fed from BorsdataClient's request path. Recording takes
+# one lock and a few additions, and callbacks get every event as a dict for custom exporters:
+#
+#     client.metrics.add_callback(lambda event: log.debug(event))
+#     print(client.metrics.to_prometheus())
+class Metrics:
+    def __init__(self):
+        self._endpoints: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self._operations: Dict[str, OperationStats] = defaultdict(OperationStats)
+        self._callbacks: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback: Callable[[Dict[str, Any]], None]):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[Dict[str, Any]], None]):
+        self._callbacks.remove(callback)
+
+    def _emit(self, event: Dict[str, Any]):
+        for callback in self._callbacks:
+            callback(event)
+
+    def record_request(self, endpoint: str, seconds: float, status: Any, nbytes: int = 0):
+        # One HTTP attempt; status is the response code or the exception name for connection failures
+        label = endpoint_label(endpoint)
+        operation = _operation.get()
+        with self._lock:
+            stats = self._endpoints[label]
+            stats.statuses[str(status)] += 1
+            stats.latency.observe(seconds)
+            stats.bytes += nbytes
+            if operation is not None:
+                op = self._operations[operation]
+                op.requests += 1
+                op.seconds += seconds
+                op.bytes += nbytes
+        if self._callbacks:
+            self._emit({"kind": "request", "endpoint": label, "seconds": seconds, "status": status,
+                        "bytes": nbytes, "operation": operation})
+
+    def record_bytes(self, endpoint: str, nbytes: int):
+        # For streamed bodies, whose size is only known after decoding
+        label = endpoint_label(endpoint)
+        operation = _operation.get()
+        with self._lock:
+            self._endpoints[label].bytes += nbytes
+            if operation is not None:
+                self._operations[operation].bytes += nbytes
+
+    def record_retry(self, endpoint: str, reason: Any):
+        label = endpoint_label(endpoint)
+        with self._lock:
+            self._endpoints[label].retries[str(reason)] += 1
+        if self._callbacks:
+            self._emit({"kind": "retry", "endpoint": label, "reason": reason, "operation": _operation.get()})
+
+    def record_error(self, endpoint: str, error: BaseException):
+        label = endpoint_label(endpoint)
+        with self._lock:
+            self._endpoints[label].errors += 1
+        if self._callbacks:
+            self._emit({"kind": "error", "endpoint": label, "error": repr(error), "operation": _operation.get()})
+
+    def record_decode(self, endpoint: str, seconds: float):
+        label = endpoint_label(endpoint)
+        with self._lock:
+            self._endpoints[label].decode.observe(seconds)
+        if self._callbacks:
+            self._emit({"kind": "decode", "endpoint": label, "seconds": seconds, "operation": _operation.get()})
+
+    def record_cache(self, endpoint: str, layer: str, hit: bool):
+        label = endpoint_label(endpoint)
+        with self._lock:
+            self._endpoints[label].cache[layer][0 if hit else 1] += 1
+        if self._callbacks:
+            self._emit({"kind": "cache", "endpoint": label, "layer": layer, "hit": hit,
+                        "operation": _operation.get()})
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._operations.clear()
+
+    # Exporters
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoints": {label: stats.snapshot() for label, stats in sorted(self._endpoints.items())},
+                "operations": {name: {"requests": op.requests, "seconds": op.seconds, "bytes": op.bytes}
+                               for name, op in sorted(self._operations.items())},
+            }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix: str = "borsdata") -> str:
+        snapshot = self.snapshot()
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        def sample(name: str, labels: Dict[str, Any], value: Any):
+            rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{prefix}_{name}{{{rendered}}} {_number(value)}")
+
+        endpoints = snapshot["endpoints"]
+        family("requests_total", "counter", "HTTP requests sent, by endpoint and status.")
+        for label, stats in endpoints.items():
+            for status, count in sorted(stats["statuses"].items()):
+                sample("requests_total", {"endpoint": label, "status": status}, count)
+
+        for metric, key, help_text in (("request_duration_seconds", "latency", "HTTP request latency."),
+                                       ("decode_duration_seconds", "decode", "JSON decode time.")):
+            family(metric, "summary", help_text)
+            for label, stats in endpoints.items():
+                summary = stats[key]
+                if not summary["count"]:
+                    continue
+                for q in QUANTILES:
+                    sample(metric, {"endpoint": label, "quantile": q}, summary[f"p{round(q * 100)}"])
+                lines.append(f'{prefix}_{metric}_sum{{endpoint="{_escape(label)}"}} {_number(summary["sum"])}')
+                lines.append(f'{prefix}_{metric}_count{{endpoint="{_escape(label)}"}} {summary["count"]}')
+
+        family("response_bytes_total", "counter", "Response bytes received, compressed as sent on the wire.")
+        for label, stats in endpoints.items():
+            sample("response_bytes_total", {"endpoint": label}, stats["bytes"])
+
+        family("retries_total", "counter", "Retried requests, by reason (status code or exception).")
+        for label, stats in endpoints.items():
+            for reason, count in sorted(stats["retries"].items()):
+                sample("retries_total", {"endpoint": label, "reason": reason}, count)
+
+        family("errors_total", "counter", "Requests that failed after all retries.")
+        for label, stats in endpoints.items():
+            sample("errors_total", {"endpoint": label}, stats["errors"])
+
+        family("cache_lookups_total", "counter", "Cache lookups, by layer (memo, response) and result.")
+        for label, stats in endpoints.items():
+            for layer, counts in sorted(stats["cache"].items()):
+                sample("cache_lookups_total", {"endpoint": label, "layer": layer, "result": "hit"}, counts["hits"])
+                sample("cache_lookups_total", {"endpoint": label, "layer": layer, "result": "miss"}, counts["misses"])
+
+        family("operation_requests_total", "counter", "HTTP requests made inside a traced operation.")
+        for name, op in snapshot["operations"].items():
+            sample("operation_requests_total", {"operation": name}, op["requests"])
+        family("operation_request_seconds_total", "counter", "Time spent in HTTP requests inside a traced operation.")
+        for name, op in snapshot["operations"].items():
+            sample("operation_request_seconds_total", {"operation": name}, op["seconds"])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: Any) -> str:
+    if value is None:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
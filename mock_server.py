@@ -0,0 +1,705 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, deque
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import yaml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_docs.yaml")
+GLOBAL_ID_START = 100000
+# Same limit as the real instList endpoints
+MAX_INST_LIST = 50
+DEFAULT_KPI_COUNT = 10
+MAX_KPI_COUNT = {"year": 20, "r12": 40, "quarter": 40}
+CACHE_BYTES = 256 * 1024 * 1024
+
+SECTORS = ["Industri", "Finans & Fastighet", "Hälsovård", "Informationsteknik", "Sällanköpsvaror",
+           "Dagligvaror", "Material", "Energi", "Telekommunikation", "Kraftförsörjning"]
+COUNTRIES = ["Sverige", "Norge", "Finland", "Danmark"]
+# (name, countryId, exchangeName)
+MARKETS = [("Large Cap", 1, "Stockholmsbörsen"), ("Mid Cap", 1, "Stockholmsbörsen"),
+           ("Small Cap", 1, "Stockholmsbörsen"), ("First North", 1, "First North"),
+           ("Spotlight", 1, "Spotlight"), ("Oslo Børs", 2, "Oslo Børs"),
+           ("Helsinki", 3, "Nasdaq Helsinki"), ("Copenhagen", 4, "Nasdaq Copenhagen")]
+CURRENCIES = {1: "SEK", 2: "NOK", 3: "EUR", 4: "DKK"}
+KPI_METADATA = [(1, "Direktavkastning", "Dividend Yield", "%"), (2, "P/E", "P/E", "x"),
+                (3, "P/S", "P/S", "x"), (4, "P/B", "P/B", "x"), (28, "Bruttomarginal", "Gross Margin", "%"),
+                (29, "Rörelsemarginal", "Operating Margin", "%"), (30, "Vinstmarginal", "Profit Margin", "%"),
+                (33, "Avkastning på eget kapital", "Return on Equity", "%")]
+_NAME_PARTS = (["Nord", "Sval", "Berg", "Tek", "Fast", "Lind", "Sol", "Vind", "Gran", "Ek", "Stål", "Hav",
+                "Alv", "Fjäll", "Sjö", "Skog"],
+               ["tech", "bo", "ma", "kon", "gruppen", "invest", "medical", "energi", "data", "bygg"])
+_PATH_PARAM = re.compile(r"\{(\w+)\}")
+
+
+def _seed(*parts: Any) -> int:
+    return zlib.crc32(":".join(map(str, parts)).encode())
+
+
+def _dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def load_spec(path: str = DEFAULT_SPEC_PATH) -> Dict[str, Any]:
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, encoding="utf-8") as f:
+        return yaml.load(f, Loader=loader)
+
+
+def compile_routes(spec: Dict[str, Any]) -> List[Tuple[re.Pattern, Dict[str, Any]]]:
+    # One (pattern, operation) per GET path. Integer path parameters only match digits, and paths
+    # with fewer parameters are tried first, so /instruments/global/kpis/... never hits /{insid}/kpis/...
+    routes = []
+    for template, methods in spec["paths"].items():
+        operation = methods.get("get")
+        if operation is None:
+            continue
+        kinds = {p["name"]: p.get("schema", {}).get("type") for p in operation.get("parameters", [])
+                 if p.get("in") == "path"}
+
+        def group(match):
+            name = match.group(1)
+            return rf"(?P<{name}>-?\d+)" if kinds.get(name) == "integer" else rf"(?P<{name}>[^/]+)"
+
+        pattern = re.compile("^" + _PATH_PARAM.sub(group, template) + "$", re.IGNORECASE)
+        routes.append((len(kinds), pattern, operation))
+    routes.sort(key=lambda route: route[0])
+    return [(pattern, operation) for _, pattern, operation in routes]
+
+
+# Deterministic synthetic universe: the same seed always gives the same instruments, prices,
+# KPIs and reports, so benchmark runs are comparable. Prices are unadjusted, i.e. they jump
+# on the dates listed by the StockSplits endpoint.
+class SyntheticMarket:
+    def __init__(self, universe: int = 1000, global_universe: int = 0, history_years: int = 10,
+                 report_years: int = 10, split_rate: float = 0.02, seed: int = 0, as_of: Optional[date] = None):
+        self.universe = universe
+        self.global_universe = global_universe
+        self.history_years = history_years
+        self.report_years = report_years
+        self.split_rate = split_rate
+        self.seed = seed
+        self.as_of = as_of or date.today()
+        self.updated_at = datetime.combine(self.as_of, datetime.min.time())
+        self.kpis_updated_at = self.updated_at
+        self.version = 0
+        self._instrument_updates: Dict[int, datetime] = {}
+
+        self.instruments = [self._instrument(ins_id, False) for ins_id in range(1, universe + 1)]
+        self.global_instruments = [self._instrument(ins_id, True)
+                                   for ins_id in range(GLOBAL_ID_START + 1, GLOBAL_ID_START + global_universe + 1)]
+        self.by_id = {i["insId"]: i for i in self.instruments + self.global_instruments}
+        self.splits = self._splits()
+
+    def _instrument(self, ins_id: int, is_global: bool) -> Dict[str, Any]:
+        rng = random.Random(_seed(self.seed, "instrument", ins_id))
+        prefixes, suffixes = _NAME_PARTS
+        name = f"{rng.choice(prefixes)}{rng.choice(suffixes)}"
+        # Unique names and tickers by construction
+        name = f"{name} {ins_id}" if ins_id > len(prefixes) * len(suffixes) else name
+        ticker = f"{name[:4].upper().replace(' ', '')}{ins_id}"
+        market_id = rng.randrange(len(MARKETS)) + 1
+        country_id = MARKETS[market_id - 1][1]
+        sector_id = rng.randrange(len(SECTORS)) + 1
+        listed = self.as_of - timedelta(days=rng.randrange(365, 365 * 40))
+        currency = "USD" if is_global else CURRENCIES[country_id]
+        return {
+            "insId": ins_id,
+            "name": f"{name} {'Inc' if is_global else 'AB'}",
+            "urlName": f"{name.lower().replace(' ', '-')}",
+            "instrument": 0,
+            "isin": f"{'US' if is_global else 'SE'}{ins_id:010d}",
+            "ticker": ticker,
+            "yahoo": ticker if is_global else f"{ticker}.ST",
+            "sectorId": sector_id,
+            "marketId": market_id,
+            "branchId": sector_id * 10 + rng.randrange(3) + 1,
+            "countryId": None if is_global else country_id,
+            "listingDate": _timestamp(datetime.combine(listed, datetime.min.time())),
+            "stockPriceCurrency": currency,
+            "reportCurrency": currency,
+        }
+
+    def _splits(self) -> List[Dict[str, Any]]:
+        splits = []
+        for ins_id in self.by_id:
+            rng = random.Random(_seed(self.seed, "split", ins_id))
+            if rng.random() >= self.split_rate:
+                continue
+            split_date = np.busday_offset(np.datetime64(self.as_of), -rng.randrange(5, 250), roll="backward")
+            new, old = rng.choice([(2, 1), (3, 1), (4, 1), (1, 10)])
+            splits.append({"instrumentId": ins_id, "splitType": "Split" if new > old else "ReverseSplit",
+                           "ratio": f"{new}:{old}", "splitDate": f"{split_date}T00:00:00"})
+        return splits
+
+    def touch(self, ins_ids=None, kpis: bool = True):
+        # Simulates upstream changes for delta-sync tests: bumps updatedAt for the given instruments
+        # (all when None) and the KPI calculation timestamp
+        now = max(datetime.now(), self.updated_at + timedelta(seconds=1))
+        for ins_id in (self.by_id if ins_ids is None else ins_ids):
+            self._instrument_updates[ins_id] = now
+        if kpis:
+            self.kpis_updated_at = now
+        self.version += 1
+
+    def instrument_updated_at(self, ins_id: int) -> str:
+        return _timestamp(self._instrument_updates.get(ins_id, self.updated_at))
+
+    @lru_cache(maxsize=4096)
+    def price_history(self, ins_id: int) -> Tuple[np.ndarray, ...]:
+        # Business-day random walk: (dates, open, high, low, close, volume)
+        rng = np.random.default_rng(_seed(self.seed, "prices", ins_id))
+        end = np.datetime64(self.as_of, "D")
+        start = end - np.timedelta64(int(self.history_years * 365.25), "D")
+        days = np.arange(start, end + 1)
+        days = days[np.is_busday(days)]
+        n = len(days)
+
+        sigma = rng.uniform(0.01, 0.03)
+        close = rng.lognormal(np.log(80), 1.0) * np.exp(np.cumsum(rng.normal(0.0003, sigma, n)))
+        for split in self.splits:
+            if split["instrumentId"] == ins_id:
+                new, old = map(int, split["ratio"].split(":"))
+                close[days >= np.datetime64(split["splitDate"][:10])] *= old / new
+        open_ = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, sigma / 3, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma / 2, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma / 2, n)))
+        volume = rng.lognormal(np.log(200000), 1.0, n).astype(np.int64)
+        return days, open_.round(2), high.round(2), low.round(2), close.round(2), volume
+
+    @lru_cache(maxsize=4096)
+    def dividends(self, ins_id: int) -> List[Dict[str, Any]]:
+        # One dividend a year for about two thirds of the instruments, ex-date in May, paying a
+        # steady yield on the close before it. Prices are not marked down on the ex-date.
+        rng = random.Random(_seed(self.seed, "dividend", ins_id))
+        if rng.random() < 0.35:
+            return []
+        dividend_yield = rng.uniform(0.01, 0.06)
+        days, _, _, _, close, _ = self.price_history(ins_id)
+        currency = self.by_id[ins_id]["stockPriceCurrency"] if ins_id in self.by_id else "SEK"
+        values = []
+        for year in range(int(str(days[0])[:4]) + 1, self.as_of.year + 1):
+            ex_date = np.busday_offset(np.datetime64(f"{year}-05-{rng.randrange(2, 28):02d}"), 0, roll="forward")
+            row = int(np.searchsorted(days, ex_date))
+            if row == 0 or row >= len(days):
+                continue
+            values.append({"amountPaid": round(float(close[row - 1]) * dividend_yield, 2),
+                           "currencyShortName": currency, "distributionFrequency": 1,
+                           "excludingDate": f"{days[row]}T00:00:00", "dividendType": 0})
+        return values
+
+    def prices(self, ins_id: int, from_date: Optional[str] = None, to_date: Optional[str] = None,
+               with_id: bool = False) -> List[Dict[str, Any]]:
+        days, o, h, l, c, v = self.price_history(ins_id)
+        lo = 0 if not from_date else np.searchsorted(days, np.datetime64(from_date[:10]), side="left")
+        hi = len(days) if not to_date else np.searchsorted(days, np.datetime64(to_date[:10]), side="right")
+        rows = zip(days[lo:hi].astype(str).tolist(), o[lo:hi].tolist(), h[lo:hi].tolist(), l[lo:hi].tolist(),
+                   c[lo:hi].tolist(), v[lo:hi].tolist())
+        if with_id:
+            return [{"i": ins_id, "d": d, "o": o_, "h": h_, "l": l_, "c": c_, "v": v_}
+                    for d, o_, h_, l_, c_, v_ in rows]
+        return [{"d": d, "o": o_, "h": h_, "l": l_, "c": c_, "v": v_} for d, o_, h_, l_, c_, v_ in rows]
+
+    def price_on(self, ins_id: int, day: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # Row for a given date (the last row when day is None); None when not a trading day
+        days = self.price_history(ins_id)[0]
+        if day is None:
+            pos = len(days) - 1
+        else:
+            pos = int(np.searchsorted(days, np.datetime64(day[:10])))
+            if pos >= len(days) or days[pos] != np.datetime64(day[:10]):
+                return None
+        rows = self.prices(ins_id, str(days[pos]), str(days[pos]), with_id=True)
+        return rows[0] if rows else None
+
+    def _periods(self, report_type: str, count: int) -> List[Tuple[int, int]]:
+        # (year, period) newest first; year reports use period 5 like the real API
+        last_year = self.as_of.year - 1
+        if report_type == "year":
+            return [(last_year - k, 5) for k in range(count)]
+        quarter = (self.as_of.month - 1) // 3 or 4
+        year = self.as_of.year if quarter < 4 else last_year
+        periods = []
+        for _ in range(count):
+            periods.append((year, quarter))
+            quarter -= 1
+            if quarter == 0:
+                year, quarter = year - 1, 4
+        return periods
+
+    def kpi_history(self, ins_id: int, kpi_id: int, report_type: str, price_type: str,
+                    max_count: Optional[int] = None) -> List[Dict[str, Any]]:
+        limit = MAX_KPI_COUNT.get(report_type, 40)
+        depth = self.report_years * (1 if report_type == "year" else 4)
+        count = min(depth, limit, max_count or DEFAULT_KPI_COUNT)
+        rng = np.random.default_rng(_seed(self.seed, "kpi", ins_id, kpi_id, report_type, price_type))
+        if kpi_id in (28, 29, 30):
+            level = rng.uniform(10, 70) / (kpi_id - 27)
+            values = level + rng.normal(0, level * 0.08, count)
+        else:
+            level = rng.lognormal(np.log(15 if kpi_id == 2 else 5), 0.4)
+            values = level * np.exp(rng.normal(0, 0.2, count))
+        missing = rng.random(count) < 0.05
+        return [{"y": y, "p": p, "v": None if gone else round(float(value), 4)}
+                for (y, p), value, gone in zip(self._periods(report_type, count), values, missing)]
+
+    def kpi_current(self, ins_id: int, kpi_id: int) -> Optional[float]:
+        history = self.kpi_history(ins_id, kpi_id, "year", "mean", 1)
+        return history[0]["v"] if history else None
+
+    def reports(self, ins_id: int, report_type: str, count: int, fields: List[str]) -> List[Dict[str, Any]]:
+        rng = np.random.default_rng(_seed(self.seed, "reports", ins_id))
+        revenue = rng.lognormal(np.log(5000), 1.2)
+        growth = rng.normal(0.05, 0.06)
+        gross_margin = rng.uniform(0.15, 0.7)
+        operating_margin = gross_margin * rng.uniform(0.2, 0.6)
+        shares = float(rng.integers(10, 500))  # millions, like the other report figures
+        scale = 1 if report_type == "year" else 0.25
+        currency = self.by_id[ins_id]["reportCurrency"] if ins_id in self.by_id else "SEK"
+
+        reports = []
+        for k, (year, period) in enumerate(self._periods(report_type, count)):
+            noise = rng.normal(1, 0.03)
+            base = revenue / (1 + growth) ** (k * scale) * noise * (scale if report_type == "quarter" else 1)
+            gross = base * gross_margin
+            operating = base * operating_margin
+            profit_before_tax = operating * 0.95
+            profit = profit_before_tax * 0.79
+            total_assets = base * 1.4
+            equity = total_assets * 0.45
+            cash = total_assets * 0.1
+            eps = profit / shares
+            last_month = 12 if period == 5 else period * 3
+            end = date(year + last_month // 12, last_month % 12 + 1, 1) - timedelta(days=1)
+            report = dict.fromkeys(fields)
+            report.update({
+                "year": year, "period": period, "revenues": base, "net_Sales": base, "gross_Income": gross,
+                "operating_Income": operating, "profit_Before_Tax": profit_before_tax,
+                "profit_To_Equity_Holders": profit, "earnings_Per_Share": eps, "number_Of_Shares": shares,
+                "dividend": eps * 0.4 if period == 5 else 0.0, "intangible_Assets": total_assets * 0.2,
+                "tangible_Assets": total_assets * 0.3, "financial_Assets": total_assets * 0.1,
+                "non_Current_Assets": total_assets * 0.6, "cash_And_Equivalents": cash,
+                "current_Assets": total_assets * 0.4, "total_Assets": total_assets, "total_Equity": equity,
+                "non_Current_Liabilities": total_assets * 0.35, "current_Liabilities": total_assets * 0.2,
+                "total_Liabilities_And_Equity": total_assets, "net_Debt": total_assets * 0.25 - cash,
+                "cash_Flow_From_Operating_Activities": operating * 1.1,
+                "cash_Flow_From_Investing_Activities": -operating * 0.5,
+                "cash_Flow_From_Financing_Activities": -operating * 0.4, "cash_Flow_For_The_Year": operating * 0.2,
+                "free_Cash_Flow": operating * 0.6, "stock_Price_Average": eps * 15, "stock_Price_High": eps * 18,
+                "stock_Price_Low": eps * 12, "report_Start_Date": None, "report_End_Date": _timestamp(
+                    datetime.combine(end, datetime.min.time())),
+                "broken_Fiscal_Year": False, "currency": currency, "currency_Ratio": 1.0,
+                "report_Date": _timestamp(datetime.combine(end + timedelta(days=45), datetime.min.time())),
+            })
+            reports.append({key: round(value, 4) if isinstance(value, float) else value
+                            for key, value in report.items()})
+        return reports
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, title: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(title)
+        self.status = status
+        self.title = title
+        self.headers = headers or {}
+
+
+# Routes requests using the OpenAPI spec and answers them from a SyntheticMarket. Endpoints
+# without a dedicated handler get a payload generated from their response schema, so every
+# path in api_docs.yaml answers with the documented shape.
+class MockBorsdata:
+    def __init__(self, market: Optional[SyntheticMarket] = None, spec_path: str = DEFAULT_SPEC_PATH,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, retry_after: float = 1.0,
+                 max_calls: Optional[int] = None, period: float = 10.0, cache_bytes: int = CACHE_BYTES):
+        self.market = market or SyntheticMarket()
+        self.spec = load_spec(spec_path)
+        self.schemas = self.spec["components"]["schemas"]
+        self.routes = compile_routes(self.spec)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.max_calls = max_calls
+        self.period = period
+        self.cache_bytes = cache_bytes
+        self.stats: Counter = Counter()
+
+        self._calls: deque = deque()
+        self._cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(_seed(self.market.seed, "errors"))
+        self._handlers = {
+            "instrumentsv1": lambda q, p: {"instruments": self.market.instruments},
+            "instrumentsglobalv1": lambda q, p: {"instruments": self.market.global_instruments},
+            "instrumentsupdatedv1": self._instruments_updated,
+            "kpisupdatedv1": lambda q, p: {"kpisCalcUpdated": _timestamp(self.market.kpis_updated_at)},
+            "sectorsv1": lambda q, p: {"sectors": [{"id": i, "name": n} for i, n in enumerate(SECTORS, 1)]},
+            "countriesv1": lambda q, p: {"countries": [{"id": i, "name": n} for i, n in enumerate(COUNTRIES, 1)]},
+            "marketsv1": lambda q, p: {"markets": [
+                {"id": i, "name": n, "countryId": c, "isIndex": False, "exchangeName": e}
+                for i, (n, c, e) in enumerate(MARKETS, 1)]},
+            "branchesv1": lambda q, p: {"branches": [
+                {"id": s * 10 + k, "name": f"{SECTORS[s - 1]} {k}", "sectorId": s}
+                for s in range(1, len(SECTORS) + 1) for k in range(1, 4)]},
+            "kpimetadatav1": lambda q, p: {"kpiHistoryMetadatas": [
+                {"kpiId": i, "nameSv": sv, "nameEn": en, "format": f, "isString": False}
+                for i, sv, en, f in KPI_METADATA]},
+            "stockpricesv1": self._stock_prices,
+            "stockpricesarrayv1": self._stock_prices_array,
+            "stockpriceslastv1": lambda q, p: self._prices_for_all(self.market.instruments, None),
+            "stockpricesgloballastv1": lambda q, p: self._prices_for_all(self.market.global_instruments, None),
+            "stockpricesdatev1": lambda q, p: self._prices_for_all(self.market.instruments, q.get("date")),
+            "stockpricesglobaldatev1": lambda q, p: self._prices_for_all(self.market.global_instruments,
+                                                                        q.get("date")),
+            "StockSplitsv1": self._stock_splits,
+            "DividendCalendar": self._dividend_calendar,
+            "histkpisv1": self._kpi_history,
+            "histarraykpisv1": self._kpi_history_array,
+            "kpisv1": self._kpi_screener_instrument,
+            "kpislistv1": lambda q, p: self._kpi_screener(self.market.instruments, p),
+            "kpislistglobalv1": lambda q, p: self._kpi_screener(self.market.global_instruments, p),
+            "reportsv1": self._reports,
+            "reportscompoundv1": self._reports_compound,
+            "reportsarrayv1": self._reports_array,
+        }
+
+    # Request handling
+    def handle(self, path: str, query: Dict[str, str], accept_gzip: bool = False) -> Tuple[int, Dict[str, str], bytes]:
+        try:
+            self._throttle()
+            if not query.get("authKey"):
+                raise ApiError(401, "Unauthorized")
+            operation, params = self._match(path)
+            self.stats[operation["operationId"]] += 1
+            self._check_params(operation, query)
+            body = self._body(path, query, operation, params, accept_gzip)
+            headers = {"Content-Type": "application/json; charset=utf-8"}
+            if accept_gzip:
+                headers["Content-Encoding"] = "gzip"
+            return 200, headers, body
+        except ApiError as e:
+            self.stats[f"status_{e.status}"] += 1
+            body = _dumps({"type": None, "title": e.title, "status": e.status, "detail": None, "instance": path})
+            return e.status, dict(e.headers, **{"Content-Type": "application/problem+json"}), body
+
+    def _throttle(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise ApiError(429, "Too Many Requests", {"Retry-After": f"{self.retry_after:g}"})
+            if self.max_calls:
+                now = time.monotonic()
+                while self._calls and self._calls[0] <= now - self.period:
+                    self._calls.popleft()
+                if len(self._calls) >= self.max_calls:
+                    wait = math.ceil(self._calls[0] + self.period - now)
+                    raise ApiError(429, "Too Many Requests", {"Retry-After": str(max(wait, 1))})
+                self._calls.append(now)
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _match(self, path: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        for pattern, operation in self.routes:
+            match = pattern.match(path)
+            if match:
+                return operation, match.groupdict()
+        raise ApiError(404, "Not Found")
+
+    def _check_params(self, operation: Dict[str, Any], query: Dict[str, str]):
+        for param in operation.get("parameters", []):
+            if param.get("in") == "query" and param.get("required") and param["name"] not in query:
+                raise ApiError(400, f"Missing query parameter {param['name']}")
+        if len(self._inst_list(query)) > MAX_INST_LIST:
+            raise ApiError(400, f"instList takes at most {MAX_INST_LIST} instruments")
+
+    def _body(self, path: str, query: Dict[str, str], operation: Dict[str, Any], params: Dict[str, str],
+              compress: bool) -> bytes:
+        # Payloads only change on touch(), so encoded bodies are kept in a byte-bounded LRU
+        key = (path.lower(), tuple(sorted((k, v) for k, v in query.items() if k != "authKey")),
+               self.market.version, compress)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                return body
+
+        handler = self._handlers.get(operation["operationId"])
+        data = handler(query, params) if handler else self._from_schema(operation, query, params)
+        body = _dumps(data)
+        if compress:
+            body = gzip.compress(body, compresslevel=1)
+
+        with self._lock:
+            if len(body) <= self.cache_bytes and key not in self._cache:
+                self._cache[key] = body
+                self._cached_bytes += len(body)
+                while self._cached_bytes > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return body
+
+    # Endpoint handlers
+    @staticmethod
+    def _inst_list(query: Dict[str, str]) -> List[int]:
+        return [int(i) for i in query.get("instList", "").split(",") if i.strip().isdigit()]
+
+    def _instrument(self, ins_id: str) -> int:
+        ins_id = int(ins_id)
+        if ins_id not in self.market.by_id:
+            raise ApiError(404, "NOT_EXIST")
+        return ins_id
+
+    def _instruments_updated(self, query, params):
+        return {"instruments": [{"insId": ins_id, "updatedAt": self.market.instrument_updated_at(ins_id)}
+                                for ins_id in self.market.by_id]}
+
+    def _stock_prices(self, query, params):
+        ins_id = self._instrument(params["insid"])
+        return {"instrument": ins_id, "stockPricesList": self.market.prices(ins_id, query.get("from"), query.get("to"))}
+
+    def _stock_prices_array(self, query, params):
+        items = []
+        for ins_id in self._inst_list(query):
+            if ins_id in self.market.by_id:
+                items.append({"instrument": ins_id, "error": None,
+                              "stockPricesList": self.market.prices(ins_id, query.get("from"), query.get("to"))})
+            else:
+                items.append({"instrument": ins_id, "error": "NOT_EXIST", "stockPricesList": []})
+        return {"stockPricesArrayList": items}
+
+    def _prices_for_all(self, instruments, day):
+        rows = (self.market.price_on(i["insId"], day) for i in instruments)
+        return {"stockPricesList": [row for row in rows if row is not None]}
+
+    def _stock_splits(self, query, params):
+        since = query.get("from", "")[:10]
+        return {"stockSplitList": [s for s in self.market.splits if s["splitDate"][:10] >= since]}
+
+    def _dividend_calendar(self, query, params):
+        return {"list": [{"insId": ins_id, "values": self.market.dividends(ins_id), "error": None}
+                         if ins_id in self.market.by_id else {"insId": ins_id, "values": [], "error": "NOT_EXIST"}
+                         for ins_id in self._inst_list(query)]}
+
+    @staticmethod
+    def _max_count(query: Dict[str, str], key: str = "maxCount") -> Optional[int]:
+        value = query.get(key)
+        return int(value) if value and value.isdigit() else None
+
+    def _kpi_history(self, query, params):
+        ins_id = self._instrument(params["insid"])
+        kpi_id = int(params["kpiId"])
+        values = self.market.kpi_history(ins_id, kpi_id, params["reporttype"], params["pricetype"],
+                                         self._max_count(query))
+        return {"kpiId": kpi_id, "reportTime": params["reporttype"], "priceValue": params["pricetype"],
+                "values": values}
+
+    def _kpi_history_array(self, query, params):
+        kpi_id = int(params["kpiId"])
+        items = []
+        for ins_id in self._inst_list(query):
+            if ins_id not in self.market.by_id:
+                items.append({"instrument": ins_id, "values": [], "error": "NOT_EXIST"})
+                continue
+            values = self.market.kpi_history(ins_id, kpi_id, params["reporttype"], params["pricetype"],
+                                             self._max_count(query))
+            items.append({"instrument": ins_id, "values": values, "error": None})
+        return {"kpiId": kpi_id, "reportTime": params["reporttype"], "priceValue": params["pricetype"],
+                "kpisList": items}
+
+    def _kpi_screener_instrument(self, query, params):
+        ins_id = self._instrument(params["insid"])
+        kpi_id = int(params["kpiId"])
+        return {"kpiId": kpi_id, "group": params["calcGroup"], "calculation": params["calc"],
+                "value": {"i": ins_id, "n": self.market.kpi_current(ins_id, kpi_id), "s": None}}
+
+    def _kpi_screener(self, instruments, params):
+        kpi_id = int(params["kpiId"])
+        return {"kpiId": kpi_id, "group": params["calcGroup"], "calculation": params["calc"],
+                "values": [{"i": i["insId"], "n": self.market.kpi_current(i["insId"], kpi_id), "s": None}
+                           for i in instruments]}
+
+    def _report_fields(self) -> List[str]:
+        return list(self.schemas["ReportV1"]["properties"])
+
+    def _reports(self, query, params):
+        ins_id = self._instrument(params["id"])
+        count = min(self._max_count(query) or 10, MAX_KPI_COUNT.get(params["reporttype"], 40))
+        return {"instrument": ins_id,
+                "reports": self.market.reports(ins_id, params["reporttype"], count, self._report_fields())}
+
+    def _report_set(self, ins_id: int, query: Dict[str, str]) -> Dict[str, Any]:
+        years = min(self._max_count(query, "maxYearCount") or 10, 20)
+        quarters = min(self._max_count(query, "maxR12QCount") or 10, 40)
+        fields = self._report_fields()
+        return {"reportsYear": self.market.reports(ins_id, "year", years, fields),
+                "reportsQuarter": self.market.reports(ins_id, "quarter", quarters, fields),
+                "reportsR12": self.market.reports(ins_id, "r12", quarters, fields)}
+
+    def _reports_compound(self, query, params):
+        ins_id = self._instrument(params["id"])
+        return dict(instrument=ins_id, **self._report_set(ins_id, query))
+
+    def _reports_array(self, query, params):
+        items = []
+        for ins_id in self._inst_list(query):
+            if ins_id in self.market.by_id:
+                items.append(dict(instrument=ins_id, error=None, **self._report_set(ins_id, query)))
+            else:
+                items.append({"instrument": ins_id, "error": "NOT_EXIST", "reportsYear": [],
+                              "reportsQuarter": [], "reportsR12": []})
+        return {"reportList": items}
+
+    # Schema-driven fallback
+    def _from_schema(self, operation: Dict[str, Any], query: Dict[str, str], params: Dict[str, str]) -> Any:
+        schema = operation["responses"]["200"]["content"]["application/json"]["schema"]
+        ins_ids = self._inst_list(query) or None
+        ins_id = params.get("insid") or params.get("id")
+        query = sorted((k, v) for k, v in query.items() if k != "authKey")
+        rng = random.Random(_seed(self.market.seed, operation["operationId"], query, params))
+        return self._sample(schema, rng, {"ins_id": int(ins_id) if ins_id else None, "ins_ids": ins_ids})
+
+    def _resolve(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        ref = schema.get("$ref")
+        return self.schemas[ref.rsplit("/", 1)[-1]] if ref else schema
+
+    def _sample(self, schema: Dict[str, Any], rng: random.Random, context: Dict[str, Any], name: str = "") -> Any:
+        schema = self._resolve(schema)
+        kind = schema.get("type")
+        if kind == "object" or "properties" in schema:
+            return {prop: self._sample(sub, rng, context, prop) for prop, sub in schema.get("properties", {}).items()}
+        if kind == "array":
+            items = self._resolve(schema["items"])
+            keyed = set(items.get("properties", {})) & {"insId", "instrument", "instrumentId"}
+            if keyed and context["ins_ids"] is not None and context["ins_id"] is None:
+                # One element per requested instrument, like the instList endpoints
+                return [self._sample(items, rng, dict(context, ins_id=ins_id)) for ins_id in context["ins_ids"]]
+            return [self._sample(items, rng, context) for _ in range(3)]
+        if name in ("insId", "instrument", "instrumentId") and context["ins_id"] is not None:
+            return context["ins_id"]
+        if name == "error":
+            return None
+        if kind == "integer":
+            return rng.randrange(1000)
+        if kind == "number":
+            return round(rng.uniform(0, 100), 2)
+        if kind == "boolean":
+            return rng.random() < 0.5
+        if schema.get("format") == "date-time":
+            return _timestamp(datetime.combine(self.market.as_of - timedelta(days=rng.randrange(365)),
+                                               datetime.min.time()))
+        return f"{name} {rng.randrange(1000)}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        accept_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        status, headers, body = self.server.api.handle(url.path, dict(parse_qsl(url.query)), accept_gzip)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# HTTP front end on a background thread:
+#
+#     with MockServer(MockBorsdata(SyntheticMarket(universe=500))) as server:
+#         client = BorsdataClient(api_key="test", base_url=server.base_url)
+class MockServer:
+    def __init__(self, api: Optional[MockBorsdata] = None, host: str = "127.0.0.1", port: int = 0):
+        self.api = api or MockBorsdata()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.api = self.api
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Börsdata API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--universe", type=int, default=1000, help="number of Nordic instruments")
+    parser.add_argument("--global-universe", type=int, default=0, help="number of global instruments")
+    parser.add_argument("--history-years", type=int, default=10, help="years of daily prices")
+    parser.add_argument("--report-years", type=int, default=10, help="years of reports and KPI history")
+    parser.add_argument("--latency", type=float, default=0.0, help="added seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--max-calls", type=int, default=None, help="emulate the quota: calls per period")
+    parser.add_argument("--period", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spec", default=DEFAULT_SPEC_PATH)
+    args = parser.parse_args()
+
+    market = SyntheticMarket(args.universe, args.global_universe, args.history_years, args.report_years,
+                             seed=args.seed)
+    api = MockBorsdata(market, args.spec, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       max_calls=args.max_calls, period=args.period)
+    server = MockServer(api, args.host, args.port)
+    print(f"Serving {len(market.by_id)} instruments at {server.base_url}")
+    print(f"Point the client at it with BORSDATA_BASE_URL={server.base_url} BORSDATA_API_KEY=test")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,31 @@
-import numpy as np
-import matplotlib.pyplot as plt
+from typing import Optional
+
 from borsdata_client import BorsdataClient
+from instrument_index import get_instrument_index
+from kpi_engine import PE_KPI_ID, compare_kpi
+from metrics import traced
+from valuation import DEFAULT_DISCOUNT_RATE, curve_family, implied_growth
 
-def get_pe_ratio(client: BorsdataClient, inst_id: int) -> float:
-    kpi_id = 2  # P/E ratio KPI ID
-    data = client.get_kpi_history(inst_id, kpi_id, "year", "mean")
-    if data['values']:
-        return data['values'][0]['v']
-    return None
+def get_pe_ratio(client: BorsdataClient, inst_id: int) -> Optional[float]:
+    current_pe, = compare_kpi(client, inst_id, PE_KPI_ID, windows=())
+    return current_pe
 
-def get_pe_average(client: BorsdataClient, inst_id: int, years: int) -> float:
-    kpi_id = 2  # P/E ratio KPI ID
-    data = client.get_kpi_history(inst_id, kpi_id, "year", "mean")
-    values = [v['v'] for v in data['values'][:years] if v['v'] is not None]
-    return sum(values) / len(values) if values else None
+def get_pe_average(client: BorsdataClient, inst_id: int, years: int) -> Optional[float]:
+    _, average = compare_kpi(client, inst_id, PE_KPI_ID, windows=(years,))
+    return average
 
 def compare_pe_ratios(client: BorsdataClient, inst_id: int):
-    current_pe = get_pe_ratio(client, inst_id)
-    avg_3year = get_pe_average(client, inst_id, 3)
-    avg_5year = get_pe_average(client, inst_id, 5)
+    current_pe, avg_3year, avg_5year = compare_kpi(client, inst_id, PE_KPI_ID, windows=(3, 5))
     return current_pe, avg_3year, avg_5year
 
 def plot_pe_growth_relationship(current_pe: float, stock_name: str):
-    def calculate_y(X, r):
-        return (X**(1/r) - 1) / np.log(X)
+    import matplotlib.pyplot as plt  # Imported on first plot, it dominates startup time otherwise
 
-    x = np.linspace(0.8, 2, 1000)
-    growth_rates = [0.05, 0.07, 0.09, 0.11, 0.13, 0.15]
+    x, curves = curve_family()
     colors = ['r', 'g', 'b', 'c', 'm', 'y']
 
     plt.figure(figsize=(12, 8))
-    for r, color in zip(growth_rates, colors):
-        y = calculate_y(x, r)
+    for (r, y), color in zip(curves.items(), colors):
         plt.plot(x, y, color=color, label=f'Discount rate: {r:.2%}')
 
     plt.axhline(y=current_pe, color='k', linestyle='--', label=f'Current P/E: {current_pe:.2f}')
@@ -45,19 +39,21 @@ def plot_pe_growth_relationship(current_pe: float, stock_name: str):
     plt.ylim(0, 100)
 
     # Add text annotation for the current P/E
-    intersect_x = np.interp(current_pe, calculate_y(x, 0.09), x)
-    plt.annotate(f'Current P/E: {current_pe:.2f}\nImplied Growth: {(intersect_x-1):.2%}',
-                 xy=(intersect_x, current_pe), xytext=(0.85, current_pe+5),
+    growth = implied_growth(current_pe, DEFAULT_DISCOUNT_RATE)
+    plt.annotate(f'Current P/E: {current_pe:.2f}\nImplied Growth: {growth:.2%}',
+                 xy=(1 + growth, current_pe), xytext=(0.85, current_pe+5),
                  arrowprops=dict(facecolor='black', shrink=0.05))
 
     plt.show()
 
-def plot_pe_comparison(client, inst_id, ax):
-    # Fetch the data (you may need to adjust this based on your actual implementation)
-    pe_data = client.get_kpi_history(inst_id, kpi_id=2, report_type='year', price_type='mean')
-    
+def get_pe_history(client: BorsdataClient, inst_id: int):
+    pe_data = client.get_kpi_history(inst_id, kpi_id=PE_KPI_ID, report_type='year', price_type='mean')
     years = [item['y'] for item in pe_data['values']]
     pe_values = [item['v'] for item in pe_data['values']]
+    return years, pe_values
+
+def plot_pe_comparison(client, inst_id, ax):
+    years, pe_values = get_pe_history(client, inst_id)
     
     ax.plot(years, pe_values, marker='o')
     ax.set_title('P/E Ratio Over Time')
@@ -65,9 +61,11 @@ def plot_pe_comparison(client, inst_id, ax):
     ax.set_ylabel('P/E Ratio')
     ax.grid(True)
 
-def print_pe_comparison(client: BorsdataClient, inst_id: int):
+@traced
+def print_pe_comparison(client: BorsdataClient, inst_id: int, instrument_name: Optional[str] = None):
     current_pe, avg_3year, avg_5year = compare_pe_ratios(client, inst_id)
-    instrument_name = next((i['name'] for i in client.get_instruments().get('instruments', []) if i['insId'] == inst_id), "Unknown")
+    if instrument_name is None:
+        instrument_name = get_instrument_index(client).name(inst_id)
     
     print(f"\nP/E Ratio Comparison for {instrument_name} (ID: {inst_id}):")
     print(f"Current P/E: {current_pe:.2f}" if current_pe else "Current P/E: N/A")
@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_PRICE_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "borsdata", "prices")
+HISTORY_YEARS = 20
+# Rows from the one-day endpoints are only appended when they follow the stored history closely,
+# a longer gap means days were missed and update() has to backfill them
+MAX_DAILY_GAP_DAYS = 5
+
+COLUMNS = {
+    "d": np.dtype("datetime64[D]"),
+    "o": np.dtype("float64"),
+    "h": np.dtype("float64"),
+    "l": np.dtype("float64"),
+    "c": np.dtype("float64"),
+    "v": np.dtype("int64"),
+}
+
+
+def _to_day(value: str) -> np.datetime64:
+    return np.datetime64(value[:10], "D")
+
+
+def _rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    columns = {
+        "d": np.array([_to_day(r["d"]) for r in rows], dtype=COLUMNS["d"]),
+        "v": np.array([r.get("v") or 0 for r in rows], dtype=COLUMNS["v"]),
+    }
+    for name in ("o", "h", "l", "c"):
+        columns[name] = np.array([np.nan if r.get(name) is None else r[name] for r in rows], dtype=COLUMNS[name])
+    order = np.argsort(columns["d"], kind="stable")
+    return {name: col[order] for name, col in columns.items()}
+
+
+# OHLCV history per instrument, one append-only binary file per column under <root>/<insId>/.
+# meta.json holds the committed row count, so a crash half-way through an append leaves the
+# store readable and the next append overwrites the partial tail.
+class PriceStore:
+    def __init__(self, root: str = DEFAULT_PRICE_STORE_PATH):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._maps: Dict[int, Dict[str, np.memmap]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _dir(self, ins_id: int) -> str:
+        return os.path.join(self.root, str(ins_id))
+
+    def _lock(self, ins_id: int) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(ins_id, threading.Lock())
+
+    def instruments(self) -> List[int]:
+        return sorted(int(name) for name in os.listdir(self.root) if name.isdigit())
+
+    def length(self, ins_id: int) -> int:
+        if ins_id not in self._lengths:
+            try:
+                with open(os.path.join(self._dir(ins_id), "meta.json")) as f:
+                    self._lengths[ins_id] = json.load(f)["rows"]
+            except FileNotFoundError:
+                return 0
+        return self._lengths[ins_id]
+
+    def last_date(self, ins_id: int) -> Optional[np.datetime64]:
+        n = self.length(ins_id)
+        if n == 0:
+            return None
+        return self._columns(ins_id)["d"][n - 1]
+
+    def _columns(self, ins_id: int) -> Dict[str, np.memmap]:
+        n = self.length(ins_id)
+        maps = self._maps.get(ins_id)
+        if maps is None or len(maps["d"]) != n:
+            directory = self._dir(ins_id)
+            maps = {name: np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode="r", shape=(n,))
+                    for name, dtype in COLUMNS.items()}
+            self._maps[ins_id] = maps
+        return maps
+
+    def load(self, ins_id: int, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, np.ndarray]:
+        # Returns read-only views on the memory-mapped columns, nothing is copied
+        if self.length(ins_id) == 0:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        columns = self._columns(ins_id)
+        dates = columns["d"]
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        return {name: col[lo:hi] for name, col in columns.items()}
+
+    def reset(self, ins_id: int):
+        # Drops the stored history, e.g. when a split restated it upstream
+        with self._lock(ins_id):
+            self._maps.pop(ins_id, None)
+            self._lengths.pop(ins_id, None)
+            shutil.rmtree(self._dir(ins_id), ignore_errors=True)
+
+    def append(self, ins_id: int, rows: List[Dict[str, Any]]) -> int:
+        rows = [r for r in rows if r.get("d") and r.get("c") is not None]
+        if not rows:
+            return 0
+        new = _rows_to_columns(rows)
+
+        with self._lock(ins_id):
+            n = self.length(ins_id)
+            last = self.last_date(ins_id)
+            if last is not None:
+                keep = new["d"] > last
+                new = {name: col[keep] for name, col in new.items()}
+            # Drop duplicate days within the batch itself
+            if len(new["d"]):
+                keep = np.concatenate(([True], new["d"][1:] != new["d"][:-1]))
+                new = {name: col[keep] for name, col in new.items()}
+            added = len(new["d"])
+            if added == 0:
+                return 0
+
+            directory = self._dir(ins_id)
+            os.makedirs(directory, exist_ok=True)
+            for name, dtype in COLUMNS.items():
+                path = os.path.join(directory, f"{name}.bin")
+                with open(path, "ab") as f:
+                    f.truncate(n * dtype.itemsize)
+                    f.write(np.ascontiguousarray(new[name]).tobytes())
+
+            tmp = os.path.join(directory, "meta.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"rows": n + added}, f)
+            os.replace(tmp, os.path.join(directory, "meta.json"))
+            self._lengths[ins_id] = n + added
+            self._maps.pop(ins_id, None)
+        return added
+
+    def update(self, client, ins_ids: Iterable[int], to_date: Optional[str] = None) -> Dict[int, int]:
+        # Fetches only the days after each instrument's last stored day, batched over the instList endpoint
+        ins_ids = list(ins_ids)
+        history_start = (datetime.now() - timedelta(days=365 * HISTORY_YEARS)).strftime("%Y-%m-%d")
+        by_start: Dict[str, List[int]] = {}
+        for ins_id in ins_ids:
+            last = self.last_date(ins_id)
+            start = history_start if last is None else str(last + np.timedelta64(1, "D"))
+            by_start.setdefault(start, []).append(ins_id)
+
+        added = {}
+        for start, ids in by_start.items():
+            prices = client.get_stock_prices_batch(ids, from_date=start, to_date=to_date)
+            for ins_id in ids:
+                item = prices.get(ins_id) or {}
+                added[ins_id] = self.append(ins_id, item.get("stockPricesList") or [])
+        return added
+
+    def apply_daily(self, client, date: Optional[str] = None) -> Tuple[Dict[int, int], List[int]]:
+        # One call for the whole universe: stockprices/date for a given day, stockprices/last otherwise.
+        # Only instruments that already have a history and are at most a few days behind are touched;
+        # the ones further behind (e.g. back from a trading halt) are returned for a backfill with update.
+        if date is None:
+            rows = client.get_stock_prices_last().get("stockPricesList") or []
+        else:
+            rows = client.get_stock_prices_date(date).get("stockPricesList") or []
+
+        added, behind = {}, []
+        for row in rows:
+            ins_id = row.get("i")
+            last = self.last_date(ins_id) if ins_id is not None else None
+            if last is None or not row.get("d"):
+                continue
+            gap = (_to_day(row["d"]) - last).astype(int)
+            if 0 < gap <= MAX_DAILY_GAP_DAYS:
+                added[ins_id] = self.append(ins_id, [row])
+            elif gap > MAX_DAILY_GAP_DAYS:
+                behind.append(ins_id)
+        return added, behind
@@ -0,0 +1,45 @@
+import threading
+import time
+
+# Borsdata allows 100 calls per 10 seconds per API key
+DEFAULT_MAX_CALLS = 100
+DEFAULT_PERIOD = 10.0
+
+
+# Thread-safe token bucket: bursts up to max_calls, refilled at max_calls per period
+class RateLimiter:
+    def __init__(self, max_calls: int = DEFAULT_MAX_CALLS, period: float = DEFAULT_PERIOD):
+        if max_calls <= 0 or period <= 0:
+            raise ValueError("max_calls and period must be positive.")
+        self.capacity = float(max_calls)
+        self.rate = max_calls / period
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        # Takes a token and returns how long the caller has to wait before using it
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def block_for(self, seconds: float):
+        # Called when the server pushes back (429) so every caller backs off, not only the one that was rejected
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
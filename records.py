@@ -0,0 +1,143 @@
+import io
+import json
+import sys
+from dataclasses import dataclass, fields
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+# Optional faster / incremental JSON backends
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+PRICE_DTYPE = np.dtype([("d", "datetime64[D]"), ("o", "f8"), ("h", "f8"), ("l", "f8"), ("c", "f8"), ("v", "i8")])
+KPI_DTYPE = np.dtype([("y", "i4"), ("p", "i4"), ("v", "f8")])
+
+Source = Union[bytes, BinaryIO]
+
+
+def decode_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _as_file(source: Source) -> BinaryIO:
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def iter_items(source: Source, list_key: str) -> Iterator[Dict[str, Any]]:
+    # Yields the elements of the top-level list_key array. With ijson the payload is parsed
+    # incrementally from the stream, so the full document never exists as Python objects.
+    if ijson is not None:
+        yield from ijson.items(_as_file(source), f"{list_key}.item", use_float=True)
+        return
+    data = source if isinstance(source, (bytes, bytearray)) else source.read()
+    yield from decode_json(data).get(list_key) or []
+
+
+# Compact stand-ins for the API's instrument and KPI metadata dicts. They support item access
+# with the API's camelCase keys (inst['name'], inst.get('isin')), so code written against the
+# dicts keeps working.
+class _Record:
+    __slots__ = ()
+    _KEYS: Dict[str, str] = {}
+    # Low-cardinality string fields, interned so thousands of records share one string object
+    _INTERNED: tuple = ()
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]):
+        for key in cls._INTERNED:
+            if isinstance(data.get(key), str):
+                data[key] = sys.intern(data[key])
+        return cls(*(data.get(key) for key in cls._KEYS))
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, self._KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = self._KEYS.get(key)
+        return default if attr is None else getattr(self, attr)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {key: getattr(self, attr) for key, attr in self._KEYS.items()}
+
+
+def _keys(cls):
+    # API key for every dataclass field, in field order
+    cls._KEYS = dict(zip(cls._API_KEYS, (f.name for f in fields(cls))))
+    return cls
+
+
+@_keys
+@dataclass(slots=True)
+class Instrument(_Record):
+    _API_KEYS = ("insId", "name", "urlName", "instrument", "isin", "ticker", "yahoo", "sectorId", "marketId",
+                 "branchId", "countryId", "listingDate", "stockPriceCurrency", "reportCurrency")
+    _INTERNED = ("stockPriceCurrency", "reportCurrency")
+
+    ins_id: int
+    name: Optional[str]
+    url_name: Optional[str]
+    instrument: Optional[int]
+    isin: Optional[str]
+    ticker: Optional[str]
+    yahoo: Optional[str]
+    sector_id: Optional[int]
+    market_id: Optional[int]
+    branch_id: Optional[int]
+    country_id: Optional[int]
+    listing_date: Optional[str]
+    stock_price_currency: Optional[str]
+    report_currency: Optional[str]
+
+
+@_keys
+@dataclass(slots=True)
+class KpiMetadata(_Record):
+    _API_KEYS = ("kpiId", "nameSv", "nameEn", "format", "isString")
+
+    kpi_id: int
+    name_sv: Optional[str]
+    name_en: Optional[str]
+    format: Optional[str]
+    is_string: Optional[bool]
+
+
+def decode_instruments(source: Source) -> List[Instrument]:
+    return [Instrument.from_json(item) for item in iter_items(source, "instruments")]
+
+
+def decode_kpi_metadata(source: Source) -> List[KpiMetadata]:
+    return [KpiMetadata.from_json(item) for item in iter_items(source, "kpiHistoryMetadatas")]
+
+
+def _nan(value: Optional[float]) -> float:
+    return np.nan if value is None else value
+
+
+def prices_to_array(rows) -> np.ndarray:
+    return np.fromiter(((r["d"][:10], _nan(r.get("o")), _nan(r.get("h")), _nan(r.get("l")), _nan(r.get("c")),
+                         r.get("v") or 0) for r in rows), dtype=PRICE_DTYPE)
+
+
+def kpi_values_to_array(rows) -> np.ndarray:
+    return np.fromiter(((r.get("y") or 0, r.get("p") or 0, _nan(r.get("v"))) for r in rows), dtype=KPI_DTYPE)
+
+
+def decode_stock_prices(source: Source) -> np.ndarray:
+    return prices_to_array(iter_items(source, "stockPricesList"))
+
+
+def decode_kpi_history(source: Source) -> np.ndarray:
+    return kpi_values_to_array(iter_items(source, "values"))
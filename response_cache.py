@@ -0,0 +1,237 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "borsdata", "responses.sqlite")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# (pattern, ttl in seconds). First match wins, a ttl of 0 means "never cache".
+DEFAULT_TTLS: List[Tuple[str, int]] = [
+    (r"^instruments(/kpis)?/updated$", 0),
+    (r"^(branches|countries|markets|sectors|translationmetadata)$", 7 * DAY),
+    (r"^instruments/(kpis|reports)/metadata$", 7 * DAY),
+    (r"^instruments(/global)?$", DAY),
+    (r"^instruments/description$", 7 * DAY),
+    (r"^instruments/stockprices/(global/)?last$", 15 * 60),
+    (r"^instruments/(\d+/)?stockprices$", 6 * HOUR),
+    (r"^instruments/StockSplits$", 6 * HOUR),
+    (r"^instruments/dividend/calendar$", 6 * HOUR),
+    (r"kpis/", DAY),
+    (r"reports", DAY),
+]
+DEFAULT_TTL = HOUR
+
+# Endpoints whose payload depends on instrument data or reports, i.e. on instruments/updated
+_INSTRUMENT_ENDPOINT = re.compile(r"^instruments/(\d+)/(reports|kpis)")
+_INSTRUMENT_LIST_ENDPOINT = re.compile(r"^instruments(/global|/description|/reports)?$")
+
+
+def compile_ttls(ttls: Optional[List[Tuple[str, int]]] = None) -> List[Tuple[Pattern, int]]:
+    return [(re.compile(p), ttl) for p, ttl in (ttls if ttls is not None else DEFAULT_TTLS)]
+
+
+def lookup_ttl(endpoint: str, ttls: List[Tuple[Pattern, int]], default: int = DEFAULT_TTL) -> int:
+    for pattern, ttl in ttls:
+        if pattern.search(endpoint):
+            return ttl
+    return default
+
+
+def kpi_dependent(endpoint: str) -> bool:
+    # Payloads computed from the KPI calculation, stale once kpisCalcUpdated moves
+    return "kpis/" in endpoint and not endpoint.endswith("metadata")
+
+
+def make_key(endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+    params = {k: v for k, v in (params or {}).items() if k != "authKey" and v is not None}
+    if not params:
+        return endpoint
+    return endpoint + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+class ResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttls: Optional[List[Tuple[str, int]]] = None,
+                 default_ttl: int = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES, compress_level: int = 6):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttls = compile_ttls(ttls)
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                ins_id INTEGER,
+                kpi_dependent INTEGER NOT NULL,
+                instrument_dependent INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_ins_id ON entries(ins_id);
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+            CREATE TABLE IF NOT EXISTS watermarks (
+                ins_id INTEGER PRIMARY KEY,
+                updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                name TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def ttl_for(self, endpoint: str) -> int:
+        return lookup_ttl(endpoint, self.ttls, self.default_ttl)
+
+    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        key = make_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT payload, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            payload, expires_at = row
+            if expires_at <= now:
+                self._delete_keys([key])
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(zlib.decompress(payload))
+
+    def set(self, endpoint: str, params: Optional[Dict[str, Any]], data: Any, ttl: Optional[int] = None):
+        ttl = self.ttl_for(endpoint) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        key = make_key(endpoint, params)
+        payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), self.compress_level)
+        if len(payload) > self.max_bytes:
+            return
+
+        match = _INSTRUMENT_ENDPOINT.match(endpoint)
+        ins_id = int(match.group(1)) if match else None
+        instrument_dependent = ins_id is not None or bool(_INSTRUMENT_LIST_ENDPOINT.match(endpoint))
+
+        now = time.time()
+        with self._lock:
+            self._delete_keys([key])
+            self._conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, ins_id, int(kpi_dependent(endpoint)), int(instrument_dependent),
+                 now + ttl, now, len(payload), payload))
+            self._total_bytes += len(payload)
+            self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM watermarks")
+            self._conn.execute("DELETE FROM state")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def purge_expired(self):
+        with self._lock:
+            keys = [k for (k,) in self._conn.execute("SELECT key FROM entries WHERE expires_at <= ?", (time.time(),))]
+            self._delete_keys(keys)
+            self._conn.commit()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    # Change-driven invalidation
+    def get_state(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, name: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (name, value))
+            self._conn.commit()
+
+    def apply_instruments_updated(self, instruments_updated: Dict[str, Any]) -> int:
+        updates = [(i["insId"], i.get("updatedAt")) for i in instruments_updated.get("instruments") or []]
+        with self._lock:
+            known = dict(self._conn.execute("SELECT ins_id, updated_at FROM watermarks"))
+            changed = [ins_id for ins_id, updated_at in updates
+                       if ins_id in known and known[ins_id] != updated_at]
+            first_seen = [ins_id for ins_id, _ in updates if ins_id not in known]
+
+            removed = 0
+            if changed:
+                removed += self._delete_where("ins_id IN ({})", changed)
+            # A changed (or newly listed) instrument makes every list/array payload stale
+            if changed or (first_seen and known):
+                removed += self._delete_where("instrument_dependent = 1 AND ins_id IS NULL")
+
+            self._conn.executemany("INSERT OR REPLACE INTO watermarks VALUES (?, ?)", updates)
+            self._conn.commit()
+        return removed
+
+    def apply_kpis_updated(self, kpis_updated: Dict[str, Any]) -> int:
+        calc_updated = kpis_updated.get("kpisCalcUpdated")
+        previous = self.get_state("kpisCalcUpdated")
+        removed = 0
+        with self._lock:
+            if previous is not None and previous != calc_updated:
+                removed = self._delete_where("kpi_dependent = 1")
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", ("kpisCalcUpdated", calc_updated))
+            self._conn.commit()
+        return removed
+
+    # Internals, callers hold the lock
+    def _delete_keys(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+        self._delete_where("key IN ({})", keys)
+
+    def _delete_where(self, where: str, values: Optional[List[Any]] = None) -> int:
+        removed = 0
+        values = values or []
+        # Stay below SQLite's bound-parameter limit
+        chunks = [values[i:i + 500] for i in range(0, len(values), 500)] if values else [[]]
+        for chunk in chunks:
+            clause = where.format(",".join("?" * len(chunk)))
+            freed, count = self._conn.execute(
+                f"SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries WHERE {clause}", chunk).fetchone()
+            self._conn.execute(f"DELETE FROM entries WHERE {clause}", chunk)
+            self._total_bytes -= freed
+            removed += count
+        return removed
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back at 90% of the budget
+        target = self.max_bytes * 0.9
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if self._total_bytes <= target:
+                break
+            victims.append(key)
+            self._total_bytes -= size
+        for i in range(0, len(victims), 500):
+            chunk = victims[i:i + 500]
+            self._conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk)
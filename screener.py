@@ -0,0 +1,224 @@
+import ast
+import operator
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kpi_engine import GROSS_MARGIN_KPI_ID, PE_KPI_ID
+from valuation import DEFAULT_DISCOUNT_RATE, implied_growth
+
+# name -> (kpiId, calcGroup, calc) for the screener endpoints
+DEFAULT_KPIS: Dict[str, Tuple[int, str, str]] = {
+    "pe": (PE_KPI_ID, "last", "latest"),
+    "gross_margin": (GROSS_MARGIN_KPI_ID, "last", "latest"),
+}
+
+_COMPARE = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_ARITHMETIC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+# Evaluates expressions like "pe < 15 and gross_margin > 40 and sector == 'Industri'" over
+# whole columns at once. Only column names, literals, arithmetic, comparisons, in/not in
+# against a literal list and and/or/not are allowed.
+class _Evaluator:
+    def __init__(self, columns: Dict[str, np.ndarray], size: int):
+        self.columns = columns
+        self.size = size
+
+    def evaluate(self, expression: str) -> np.ndarray:
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid screen expression: {expression!r}") from e
+        result = self._eval(tree.body)
+        if np.ndim(result) == 0:
+            return np.full(self.size, bool(result))
+        return np.asarray(result, dtype=bool)
+
+    def _eval(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.BoolOp):
+            values = [self._eval(v) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            result = values[0]
+            for value in values[1:]:
+                result = combine(result, value)
+            return result
+        if isinstance(node, ast.UnaryOp):
+            operand = self._eval(node.operand)
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(operand)
+            if isinstance(node.op, ast.USub):
+                return -operand
+        if isinstance(node, ast.Compare):
+            result = None
+            left = self._eval(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    options = self._literal_list(comparator)
+                    current = np.isin(left, options)
+                    if isinstance(op, ast.NotIn):
+                        current = ~current
+                    right = None
+                elif type(op) in _COMPARE:
+                    right = self._eval(comparator)
+                    with np.errstate(invalid="ignore"):
+                        current = _COMPARE[type(op)](left, right)
+                else:
+                    raise ExpressionError(f"Unsupported comparison: {type(op).__name__}")
+                result = current if result is None else np.logical_and(result, current)
+                left = right
+            return result
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return _ARITHMETIC[type(node.op)](self._eval(node.left), self._eval(node.right))
+        if isinstance(node, ast.Name):
+            if node.id not in self.columns:
+                raise ExpressionError(f"Unknown column: {node.id}")
+            return self.columns[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+            return node.value
+        raise ExpressionError(f"Unsupported expression: {ast.dump(node)}")
+
+    def _literal_list(self, node: ast.AST) -> List[Any]:
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return [self._eval(e) for e in node.elts]
+        raise ExpressionError("'in' needs a literal list, e.g. sector in ('Industri', 'Finans')")
+
+
+# Columnar table of screener KPIs for the whole universe, one array per column aligned on insId.
+# KPI columns are pulled with one screener call each and refreshed only when instruments/kpis/updated moves.
+class Screener:
+    def __init__(self, client, kpis: Optional[Dict[str, Tuple[int, str, str]]] = None, include_global: bool = False):
+        self.client = client
+        self.kpis = dict(DEFAULT_KPIS if kpis is None else kpis)
+        self.include_global = include_global
+        self.ins_ids = np.empty(0, dtype=np.int64)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.derived: Dict[str, Callable[[Dict[str, np.ndarray]], np.ndarray]] = {}
+        self._kpis_updated: Optional[str] = None
+        self._loaded_kpis: Dict[str, Tuple[int, str, str]] = {}
+
+    def add_kpi(self, name: str, kpi_id: int, calc_group: str = "last", calc: str = "latest"):
+        if not name.isidentifier():
+            raise ValueError(f"Column name must be a valid identifier: {name!r}")
+        self.kpis[name] = (kpi_id, calc_group, calc)
+
+    def add_derived(self, name: str, func: Callable[[Dict[str, np.ndarray]], np.ndarray]):
+        # Column computed from other columns, e.g. implied growth from P/E; recomputed on every refresh
+        if not name.isidentifier():
+            raise ValueError(f"Column name must be a valid identifier: {name!r}")
+        self.derived[name] = func
+        if len(self.ins_ids):
+            self.columns[name] = func(self.columns)
+
+    def add_implied_growth(self, name: str = "implied_growth", pe_column: str = "pe",
+                           discount_rate: float = DEFAULT_DISCOUNT_RATE):
+        self.add_derived(name, lambda columns: implied_growth(columns[pe_column], discount_rate))
+
+    def _load_meta(self):
+        instruments = list(self.client.get_instruments().get("instruments") or [])
+        if self.include_global:
+            instruments += self.client.get_instruments_global().get("instruments") or []
+        instruments = list({i["insId"]: i for i in instruments}.values())
+        instruments.sort(key=lambda i: i["insId"])
+
+        sectors = {s["id"]: s["name"] for s in self.client.get_sectors().get("sectors") or []}
+        markets = {m["id"]: m["name"] for m in self.client.get_markets().get("markets") or []}
+        countries = {c["id"]: c["name"] for c in self.client.get_countries().get("countries") or []}
+
+        self.ins_ids = np.array([i["insId"] for i in instruments], dtype=np.int64)
+        self.columns = {
+            "insId": self.ins_ids,
+            "name": np.array([i.get("name") or "" for i in instruments], dtype=object),
+            "ticker": np.array([i.get("ticker") or "" for i in instruments], dtype=object),
+            "sector": np.array([sectors.get(i.get("sectorId"), "") for i in instruments], dtype=object),
+            "market": np.array([markets.get(i.get("marketId"), "") for i in instruments], dtype=object),
+            "country": np.array([countries.get(i.get("countryId"), "") for i in instruments], dtype=object),
+        }
+        self._loaded_kpis = {}
+
+    def _load_kpi(self, name: str):
+        kpi_id, calc_group, calc = self.kpis[name]
+        # The global endpoint only covers global instruments, the Nordic ones come from the regular one
+        values = list(self.client.get_kpi_screener(kpi_id, calc_group, calc).get("values") or [])
+        if self.include_global:
+            values += self.client.get_kpi_screener_global(kpi_id, calc_group, calc).get("values") or []
+
+        ids = np.array([v["i"] for v in values], dtype=np.int64)
+        numbers = np.array([np.nan if v.get("n") is None else v["n"] for v in values], dtype=np.float64)
+        column = np.full(len(self.ins_ids), np.nan)
+        if len(ids):
+            pos = np.searchsorted(self.ins_ids, ids)
+            pos = np.minimum(pos, len(self.ins_ids) - 1)
+            known = self.ins_ids[pos] == ids
+            column[pos[known]] = numbers[known]
+        self.columns[name] = column
+        self._loaded_kpis[name] = self.kpis[name]
+
+    def refresh(self, force: bool = False) -> bool:
+        response = self.client.get_kpis_updated()
+        kpis_updated = response.get("kpisCalcUpdated")
+        recalculated = self._kpis_updated is not None and kpis_updated != self._kpis_updated
+        if recalculated:
+            # The cached screener responses predate the recalculation
+            self.client.invalidate_kpis(response)
+        stale = force or kpis_updated != self._kpis_updated or not len(self.ins_ids)
+        if stale:
+            self._load_meta()
+            self._kpis_updated = kpis_updated
+        missing = [name for name, spec in self.kpis.items() if self._loaded_kpis.get(name) != spec]
+        for name in missing:
+            self._load_kpi(name)
+        if stale or missing:
+            for name, func in self.derived.items():
+                self.columns[name] = func(self.columns)
+        return stale or bool(missing)
+
+    def mask(self, expression: str) -> np.ndarray:
+        if not len(self.ins_ids):
+            self.refresh()
+        return _Evaluator(self.columns, len(self.ins_ids)).evaluate(expression)
+
+    def screen(self, expression: str, sort_by: Optional[str] = None, ascending: bool = True,
+               limit: Optional[int] = None, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        mask = self.mask(expression)
+        rows = np.flatnonzero(mask)
+        if sort_by is not None:
+            key = self.columns[sort_by][rows]
+            if key.dtype.kind == "f":
+                # Missing values always last
+                order = np.lexsort((key if ascending else -key, np.isnan(key)))
+            else:
+                order = np.argsort(key, kind="stable")
+                if not ascending:
+                    order = order[::-1]
+            rows = rows[order]
+        if limit is not None:
+            rows = rows[:limit]
+
+        names = columns or ["insId", "name", "ticker", "sector", "market"] + list(self.kpis) + list(self.derived)
+        return [{name: _to_python(self.columns[name][row]) for name in names} for row in rows]
+
+
+def _to_python(value: Any) -> Any:
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
@@ -0,0 +1,678 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from borsdata_client import BorsdataClient, MAX_BATCH_SIZE, MAX_SPLIT_LOOKBACK_DAYS
+from kpi_engine import GROSS_MARGIN_KPI_ID, PE_KPI_ID
+from memo_cache import MemoCache
+from price_store import MAX_DAILY_GAP_DAYS, PriceStore
+from records import Instrument
+
+DEFAULT_SYNC_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "borsdata", "sync")
+DEFAULT_KPIS = (PE_KPI_ID, GROSS_MARGIN_KPI_ID)
+REPORT_TYPES = ("year", "r12", "quarter")
+KPI_PRICE_TYPE = "mean"
+MAX_YEAR_REPORTS = 20
+MAX_R12Q_REPORTS = 40
+MAX_ATTEMPTS = 3
+# Each delta re-reads a few days of splits before its watermark so splits published late are
+# still picked up
+SPLIT_OVERLAP_DAYS = 7
+# A KPI recalculation mostly restates the newest periods (the price-based KPIs move with the price),
+# so a delta sync refetches this many of each history rather than all of them
+KPI_RECALC_PERIODS = 2
+REPORT_KEYS = {"year": "reportsYear", "r12": "reportsR12", "quarter": "reportsQuarter"}
+
+# kind -> (client method, list key, id key)
+META_TABLES = {
+    "sectors": ("get_sectors", "sectors", "id"),
+    "markets": ("get_markets", "markets", "id"),
+    "countries": ("get_countries", "countries", "id"),
+    "branches": ("get_branches", "branches", "id"),
+    "kpi_metadata": ("get_kpi_metadata", "kpiHistoryMetadatas", "kpiId"),
+    "report_metadata": ("get_reports_metadata", "reportMetadatas", "reportPropery"),
+}
+
+_INSTRUMENT_COLUMNS = list(Instrument._KEYS.values())
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS instruments (
+    {", ".join(f"{c} {'INTEGER PRIMARY KEY' if c == 'ins_id' else ''}" for c in _INSTRUMENT_COLUMNS)},
+    is_global INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS reports (
+    ins_id INTEGER NOT NULL,
+    report_type TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (ins_id, report_type, year, period)
+);
+CREATE TABLE IF NOT EXISTS kpi_history (
+    ins_id INTEGER NOT NULL,
+    kpi_id INTEGER NOT NULL,
+    report_type TEXT NOT NULL,
+    price_type TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (ins_id, kpi_id, report_type, price_type, year, period)
+);
+CREATE TABLE IF NOT EXISTS kpi_latest (
+    ins_id INTEGER NOT NULL,
+    kpi_id INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (ins_id, kpi_id)
+);
+CREATE TABLE IF NOT EXISTS splits (
+    ins_id INTEGER NOT NULL,
+    split_date TEXT NOT NULL,
+    split_type TEXT,
+    ratio TEXT,
+    PRIMARY KEY (ins_id, split_date)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def chunks(ids: Sequence[int], size: int = MAX_BATCH_SIZE) -> List[List[int]]:
+    return [list(ids[i:i + size]) for i in range(0, len(ids), size)]
+
+
+def _yesterday() -> str:
+    return str(date.today() - timedelta(days=1))
+
+
+class CallBudgetExhausted(Exception):
+    pass
+
+
+def fetch_kpi_latest(client: BorsdataClient, kpi_id: int, include_global: bool = False) -> List[Dict[str, Any]]:
+    # A new list: the memoized responses are shared and must not be extended in place
+    values = list(client.get_kpi_screener(kpi_id, "last", "latest").get("values") or [])
+    if include_global:
+        values += client.get_kpi_screener_global(kpi_id, "last", "latest").get("values") or []
+    return values
+
+
+def trading_days(after: str, through: str) -> List[str]:
+    # Weekdays after one date up to and including another; holidays just come back empty
+    day, end = date.fromisoformat(after[:10]) + timedelta(days=1), date.fromisoformat(through[:10])
+    days = []
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(str(day))
+        day += timedelta(days=1)
+    return days
+
+
+# Local mirror of the API: instruments, meta tables, reports and KPI histories in SQLite,
+# prices in the columnar PriceStore next to it. All writes are upserts, so replaying a
+# task that already ran (e.g. after a crash before its checkpoint) changes nothing.
+class SyncStore:
+    def __init__(self, root: str = DEFAULT_SYNC_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.prices = PriceStore(os.path.join(root, "prices"))
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn = sqlite3.connect(os.path.join(root, "borsdata.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def transaction(self):
+        # Nested blocks join the outermost one, which commits or rolls back everything
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self._conn
+            except BaseException:
+                if self._depth == 1:
+                    self._conn.rollback()
+                raise
+            else:
+                if self._depth == 1:
+                    self._conn.commit()
+            finally:
+                self._depth -= 1
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def get_state(self, key: str) -> Optional[str]:
+        rows = self.query("SELECT value FROM state WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def set_state(self, key: str, value: Optional[str]):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
+
+    # Data
+    def write_instruments(self, instruments: List[Dict[str, Any]], is_global: bool = False,
+                          replace: bool = True, updated_at: Optional[Dict[int, str]] = None):
+        # replace drops instruments of the same kind that are no longer listed
+        updated_at = updated_at or {}
+        columns = _INSTRUMENT_COLUMNS + ["is_global", "updated_at"]
+        rows = [[inst.get(key) for key in Instrument._KEYS] + [int(is_global), updated_at.get(inst["insId"])]
+                for inst in instruments]
+        with self.transaction() as conn:
+            if replace:
+                ids = {inst["insId"] for inst in instruments}
+                stale = [ins_id for (ins_id,) in conn.execute(
+                    "SELECT ins_id FROM instruments WHERE is_global = ?", (int(is_global),)) if ins_id not in ids]
+                conn.executemany("DELETE FROM instruments WHERE ins_id = ?", [(i,) for i in stale])
+            conn.executemany(
+                f"INSERT INTO instruments ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(ins_id) DO UPDATE SET "
+                + ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" if c == "updated_at" else f"{c} = excluded.{c}"
+                            for c in columns[1:]),
+                rows)
+
+    def instrument_ids(self, include_global: bool = False) -> List[int]:
+        where = "" if include_global else " WHERE is_global = 0"
+        return [ins_id for (ins_id,) in self.query(f"SELECT ins_id FROM instruments{where} ORDER BY ins_id")]
+
+    def instrument_updated_at(self) -> Dict[int, Optional[str]]:
+        return dict(self.query("SELECT ins_id, updated_at FROM instruments"))
+
+    def set_instrument_updated_at(self, updated_at: Dict[int, str]):
+        with self.transaction() as conn:
+            conn.executemany("UPDATE instruments SET updated_at = ? WHERE ins_id = ?",
+                             [(value, ins_id) for ins_id, value in updated_at.items()])
+
+    def write_meta(self, kind: str, rows: List[Dict[str, Any]], id_key: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM meta WHERE kind = ?", (kind,))
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)",
+                             [(kind, str(row.get(id_key)), json.dumps(row)) for row in rows])
+
+    def write_reports(self, ins_id: int, report_type: str, reports: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?)",
+                             [(ins_id, report_type, r.get("year"), r.get("period"), json.dumps(r)) for r in reports])
+
+    def write_kpi_history(self, ins_id: int, kpi_id: int, report_type: str, price_type: str,
+                          values: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO kpi_history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [(ins_id, kpi_id, report_type, price_type, v.get("y"), v.get("p"), v.get("v"))
+                              for v in values])
+
+    def write_kpi_latest(self, kpi_id: int, values: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO kpi_latest VALUES (?, ?, ?)",
+                             [(v["i"], kpi_id, v.get("n")) for v in values if v.get("i") is not None])
+
+    def new_splits(self, splits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        known = set(self.query("SELECT ins_id, split_date FROM splits"))
+        return [s for s in splits if (s["instrumentId"], s["splitDate"][:10]) not in known]
+
+    def write_splits(self, splits: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO splits VALUES (?, ?, ?, ?)",
+                             [(s["instrumentId"], s["splitDate"][:10], s.get("splitType"), s.get("ratio"))
+                              for s in splits])
+
+    # Checkpoints
+    def add_tasks(self, tasks: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO tasks (task_id, kind, payload) VALUES (?, ?, ?)",
+                             [(t["task_id"], t["kind"], json.dumps(t["payload"])) for t in tasks])
+
+    def clear_tasks(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM tasks")
+
+    def runnable_tasks(self, max_attempts: int = MAX_ATTEMPTS) -> List[Dict[str, Any]]:
+        rows = self.query("SELECT task_id, kind, payload FROM tasks WHERE status != 'done' AND attempts < ? "
+                          "ORDER BY rowid", (max_attempts,))
+        return [{"task_id": task_id, "kind": kind, "payload": json.loads(payload)} for task_id, kind, payload in rows]
+
+    def finish_task(self, task_id: str, error: Optional[BaseException] = None):
+        with self.transaction() as conn:
+            if error is None:
+                conn.execute("UPDATE tasks SET status = 'done', error = NULL, updated_at = ? WHERE task_id = ?",
+                             (time.time(), task_id))
+            else:
+                conn.execute("UPDATE tasks SET status = 'failed', attempts = attempts + 1, error = ?, updated_at = ? "
+                             "WHERE task_id = ?", (repr(error), time.time(), task_id))
+
+    def task_counts(self) -> Dict[str, int]:
+        return dict(self.query("SELECT status, COUNT(*) FROM tasks GROUP BY status"))
+
+
+# Full mirror of the universe, planned as one task per endpoint call (a meta table, or one
+# MAX_BATCH_SIZE chunk of instruments for reports, one KPI/report type, or prices). Tasks are
+# checkpointed in the store as they finish; running the job again after a crash, Ctrl-C or an
+# exhausted call budget continues with whatever is not done yet.
+class FullSync:
+    def __init__(self, client: BorsdataClient, store: SyncStore, kpi_ids: Optional[Sequence[int]] = DEFAULT_KPIS,
+                 report_types: Sequence[str] = REPORT_TYPES, include_global: bool = False, workers: int = 4,
+                 max_attempts: int = MAX_ATTEMPTS, call_budget: Optional[int] = None,
+                 progress: Optional[Callable[[str], None]] = print):
+        self.client = client
+        self.store = store
+        self.kpi_ids = kpi_ids
+        self.report_types = list(report_types)
+        self.include_global = include_global
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.call_budget = call_budget
+        self.progress = progress or (lambda message: None)
+        self._calls = 0
+        self._calls_lock = threading.Lock()
+
+    def _count_call(self, event: Dict[str, Any]):
+        if event["kind"] == "request":
+            with self._calls_lock:
+                self._calls += 1
+
+    def plan(self, restart: bool = False) -> int:
+        # Keeps an unfinished plan unless restart is set; a finished run starts a new one
+        if not restart and self.store.get_state("full_sync_status") == "running":
+            return len(self.store.runnable_tasks(self.max_attempts))
+
+        # Planning calls count against the budget too; the plan is only stored once complete, so
+        # running out here leaves nothing half planned and the next run plans again
+        self._check_budget(4 + int(self.include_global) + int(self.kpi_ids is None))
+        self.store.clear_tasks()
+        # Watermarks are taken before any data is fetched, so changes made upstream while the
+        # full sync runs are picked up by the next delta sync
+        through = _yesterday()
+        updated_at = {i["insId"]: i.get("updatedAt")
+                      for i in self.client.get_instruments_updated().get("instruments") or []}
+        kpis_updated = self.client.get_kpis_updated().get("kpisCalcUpdated")
+        splits_from = str(date.today() - timedelta(days=MAX_SPLIT_LOOKBACK_DAYS))
+        self.store.write_splits(self.client.get_stock_splits(splits_from).get("stockSplitList") or [])
+        self._sync_instruments(updated_at)
+        ins_ids = self.store.instrument_ids(self.include_global)
+        kpi_ids = self.kpi_ids
+        if kpi_ids is None:
+            kpi_ids = [k["kpiId"] for k in self.client.get_kpi_metadata().get("kpiHistoryMetadatas") or []]
+
+        tasks = [{"task_id": f"meta:{kind}", "kind": "meta", "payload": {"table": kind}} for kind in META_TABLES]
+        tasks += [{"task_id": f"kpi_latest:{kpi_id}", "kind": "kpi_latest", "payload": {"kpi_id": kpi_id}}
+                  for kpi_id in kpi_ids]
+        for i, ids in enumerate(chunks(ins_ids)):
+            tasks.append({"task_id": f"reports:{i}", "kind": "reports", "payload": {"ids": ids}})
+            for kpi_id in kpi_ids:
+                for report_type in self.report_types:
+                    tasks.append({"task_id": f"kpis:{kpi_id}:{report_type}:{i}", "kind": "kpis",
+                                  "payload": {"ids": ids, "kpi_id": kpi_id, "report_type": report_type}})
+            tasks.append({"task_id": f"prices:{i}", "kind": "prices", "payload": {"ids": ids, "through": through}})
+        self.store.add_tasks(tasks)
+        with self.store.transaction():
+            self.store.set_state("sync_config", json.dumps({"kpi_ids": list(kpi_ids), "report_types": self.report_types,
+                                                            "include_global": self.include_global}))
+            self.store.set_state("kpis_calc_updated", kpis_updated)
+            self.store.set_state("instruments_updated_through", max(filter(None, updated_at.values()), default=""))
+            self.store.set_state("splits_checked", str(date.today()))
+            self.store.set_state("prices_through", through)
+            self.store.set_state("full_sync_status", "running")
+            self.store.set_state("full_sync_started", str(time.time()))
+        return len(tasks)
+
+    def _sync_instruments(self, updated_at: Optional[Dict[int, str]] = None):
+        self.store.write_instruments(self.client.get_instruments().get("instruments") or [], updated_at=updated_at)
+        if self.include_global:
+            self.store.write_instruments(self.client.get_instruments_global().get("instruments") or [],
+                                         is_global=True, updated_at=updated_at)
+
+    def _execute(self, task: Dict[str, Any]):
+        # Fetches outside the store lock, then writes the data and the checkpoint in one transaction
+        kind, payload = task["kind"], task["payload"]
+        if kind == "meta":
+            method, list_key, id_key = META_TABLES[payload["table"]]
+            rows = getattr(self.client, method)().get(list_key) or []
+            with self.store.transaction():
+                self.store.write_meta(payload["table"], rows, id_key)
+                self.store.finish_task(task["task_id"])
+        elif kind == "reports":
+            reports = self.client.get_reports_batch(payload["ids"], MAX_YEAR_REPORTS, MAX_R12Q_REPORTS)
+            with self.store.transaction():
+                for ins_id, item in reports.items():
+                    for report_type, key in REPORT_KEYS.items():
+                        self.store.write_reports(ins_id, report_type, item.get(key) or [])
+                self.store.finish_task(task["task_id"])
+        elif kind == "kpi_latest":
+            values = fetch_kpi_latest(self.client, payload["kpi_id"], self.include_global)
+            with self.store.transaction():
+                self.store.write_kpi_latest(payload["kpi_id"], values)
+                self.store.finish_task(task["task_id"])
+        elif kind == "kpis":
+            max_count = MAX_YEAR_REPORTS if payload["report_type"] == "year" else MAX_R12Q_REPORTS
+            histories = self.client.get_kpi_history_batch(payload["ids"], payload["kpi_id"], payload["report_type"],
+                                                          KPI_PRICE_TYPE, max_count=max_count)
+            with self.store.transaction():
+                for ins_id, item in histories.items():
+                    self.store.write_kpi_history(ins_id, payload["kpi_id"], payload["report_type"], KPI_PRICE_TYPE,
+                                                 item.get("values") or [])
+                self.store.finish_task(task["task_id"])
+        elif kind == "prices":
+            # PriceStore.update only asks for days after what is stored, so a replay is cheap
+            self.store.prices.update(self.client, payload["ids"], to_date=payload.get("through"))
+            self.store.finish_task(task["task_id"])
+        else:
+            raise ValueError(f"Unknown sync task kind: {kind}")
+
+    def _fits(self, calls: int, reserved: int = 0) -> bool:
+        return self.call_budget is None or self._calls + reserved + calls <= self.call_budget
+
+    def _check_budget(self, calls: int):
+        if not self._fits(calls):
+            raise CallBudgetExhausted(f"Planning needs {calls} calls, {self.call_budget - self._calls} left")
+
+    def _task_calls(self, task: Dict[str, Any]) -> int:
+        # API calls a task makes when no call is retried
+        kind, payload = task["kind"], task["payload"]
+        if kind == "kpi_latest":
+            return 1 + int(self.include_global)
+        if kind == "prices":
+            # One batch call per distinct start day, see PriceStore.update
+            return len({self.store.prices.last_date(ins_id) for ins_id in payload["ids"]})
+        return 1
+
+    def run(self, restart: bool = False) -> Dict[str, Any]:
+        start = time.time()
+        self.client.metrics.add_callback(self._count_call)
+        try:
+            try:
+                self.plan(restart)
+            except CallBudgetExhausted as e:
+                self.progress(f"{e}; run the sync again with a larger budget.")
+                return {"tasks": 0, "done": 0, "failed": 0, "remaining": None, "calls": self._calls,
+                        "seconds": time.time() - start, "status": self.store.task_counts()}
+            tasks = self.store.runnable_tasks(self.max_attempts)
+            total = len(tasks)
+            done = failed = 0
+            pending = {}
+            # Calls reserved for tasks in flight, so concurrent tasks cannot overrun the budget together
+            reserved = {}
+            queue = iter(tasks)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                try:
+                    while True:
+                        # Keep at most one queued task per worker, so stopping leaves little in flight
+                        while len(pending) < self.workers:
+                            task = next(queue, None)
+                            if task is None:
+                                break
+                            calls = self._task_calls(task)
+                            if not self._fits(calls, sum(reserved.values())):
+                                # Out of budget: the remaining tasks stay pending for the next run
+                                queue = iter(())
+                                break
+                            future = executor.submit(self._execute, task)
+                            pending[future], reserved[future] = task, calls
+                        if not pending:
+                            break
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            task = pending.pop(future)
+                            reserved.pop(future)
+                            error = future.exception()
+                            if error is None:
+                                done += 1
+                            else:
+                                failed += 1
+                                self.store.finish_task(task["task_id"], error)
+                                self.progress(f"{task['task_id']} failed: {error!r}")
+                            if (done + failed) % 25 == 0 or (done + failed) == total:
+                                self.progress(f"[{done + failed}/{total}] {self._calls} calls, "
+                                              f"{time.time() - start:.0f}s")
+                except KeyboardInterrupt:
+                    for future in pending:
+                        future.cancel()
+                    self.progress("Interrupted; run the sync again to resume.")
+                    raise
+        finally:
+            self.client.metrics.remove_callback(self._count_call)
+
+        remaining = len(self.store.runnable_tasks(self.max_attempts))
+        counts = self.store.task_counts()
+        if remaining == 0:
+            self.store.set_state("full_sync_status", "complete")
+            self.store.set_state("full_sync_completed", str(time.time()))
+        return {"tasks": total, "done": done, "failed": failed, "remaining": remaining, "calls": self._calls,
+                "seconds": time.time() - start, "status": counts}
+
+
+# Daily refresh after a completed full sync. Only what changed since the stored watermarks is
+# fetched again:
+#   instruments/updated       -> instrument list, reports and KPI histories of changed instruments
+#   instruments/kpis/updated  -> latest KPI values, one screener call per KPI, and the newest
+#                                periods of every KPI history
+#   instruments/StockSplits   -> full price history of instruments with a new split
+#   instruments/stockprices/date -> one call per missed trading day for the whole universe
+# Each step moves its watermark in the same transaction as its writes, so an interrupted delta
+# is just run again.
+class DeltaSync:
+    def __init__(self, client: BorsdataClient, store: SyncStore, progress: Optional[Callable[[str], None]] = print):
+        self.client = client
+        self.store = store
+        self.progress = progress or (lambda message: None)
+        self._calls = 0
+        self._calls_lock = threading.Lock()
+
+    def _count_call(self, event: Dict[str, Any]):
+        # Batched calls report from the client's worker threads
+        if event["kind"] == "request":
+            with self._calls_lock:
+                self._calls += 1
+
+    def run(self, through: Optional[str] = None) -> Dict[str, Any]:
+        if self.store.get_state("full_sync_status") != "complete":
+            raise RuntimeError("Run a full sync to completion before a delta sync")
+        config = json.loads(self.store.get_state("sync_config"))
+        through = through or _yesterday()
+        start = time.time()
+        self.client.metrics.add_callback(self._count_call)
+        try:
+            changed = self._sync_instruments(config)
+            kpis = self._sync_kpis(config)
+            splits = self._sync_splits(through)
+            days = self._sync_prices(config, through)
+        finally:
+            self.client.metrics.remove_callback(self._count_call)
+        return {"changed_instruments": changed, "kpis_refreshed": kpis, "new_splits": splits, "price_days": days,
+                "calls": self._calls, "seconds": time.time() - start}
+
+    def _sync_instruments(self, config: Dict[str, Any]) -> int:
+        remote = {i["insId"]: i.get("updatedAt") for i in self.client.get_instruments_updated().get("instruments") or []}
+        local = self.store.instrument_updated_at()
+        # instruments/updated also lists instruments this sync leaves out (global ones in a Nordic
+        # sync), so an unknown id only counts as a new listing when it was updated since the last sync
+        through = self.store.get_state("instruments_updated_through") or ""
+        if all(local.get(ins_id) == updated_at for ins_id, updated_at in remote.items() if ins_id in local) \
+                and not any((updated_at or "") > through for ins_id, updated_at in remote.items()
+                            if ins_id not in local):
+            return 0
+
+        instruments = self.client.get_instruments().get("instruments") or []
+        global_instruments = []
+        if config["include_global"]:
+            global_instruments = self.client.get_instruments_global().get("instruments") or []
+        listed = {i["insId"] for i in instruments + global_instruments}
+        # New instruments count as changed whether or not instruments/updated lists them
+        changed = sorted(ins_id for ins_id in listed if ins_id not in local or
+                         (ins_id in remote and remote[ins_id] != local[ins_id]))
+
+        reports = self.client.get_reports_batch(changed, MAX_YEAR_REPORTS, MAX_R12Q_REPORTS) if changed else {}
+        histories = {}
+        for kpi_id in config["kpi_ids"] if changed else ():
+            for report_type in config["report_types"]:
+                max_count = MAX_YEAR_REPORTS if report_type == "year" else MAX_R12Q_REPORTS
+                histories[kpi_id, report_type] = self.client.get_kpi_history_batch(
+                    changed, kpi_id, report_type, KPI_PRICE_TYPE, max_count=max_count)
+
+        with self.store.transaction():
+            self.store.write_instruments(instruments)
+            if config["include_global"]:
+                self.store.write_instruments(global_instruments, is_global=True)
+            for ins_id, item in reports.items():
+                for report_type, key in REPORT_KEYS.items():
+                    self.store.write_reports(ins_id, report_type, item.get(key) or [])
+            for (kpi_id, report_type), items in histories.items():
+                for ins_id, item in items.items():
+                    self.store.write_kpi_history(ins_id, kpi_id, report_type, KPI_PRICE_TYPE, item.get("values") or [])
+            self.store.set_instrument_updated_at({ins_id: remote[ins_id] for ins_id in changed if ins_id in remote})
+            self.store.set_state("instruments_updated_through", max(filter(None, remote.values()), default=through))
+        self.progress(f"Instruments: {len(changed)} changed")
+        return len(changed)
+
+    def _sync_kpis(self, config: Dict[str, Any]) -> int:
+        response = self.client.get_kpis_updated()
+        calc_updated = response.get("kpisCalcUpdated")
+        if calc_updated == self.store.get_state("kpis_calc_updated"):
+            return 0
+        self.client.invalidate_kpis(response)
+        values = {kpi_id: fetch_kpi_latest(self.client, kpi_id, config["include_global"])
+                  for kpi_id in config["kpi_ids"]}
+        ins_ids = self.store.instrument_ids(config["include_global"])
+        histories = {(kpi_id, report_type): self.client.get_kpi_history_batch(
+                         ins_ids, kpi_id, report_type, KPI_PRICE_TYPE, max_count=KPI_RECALC_PERIODS)
+                     for kpi_id in config["kpi_ids"] for report_type in config["report_types"]}
+        with self.store.transaction():
+            for kpi_id, rows in values.items():
+                self.store.write_kpi_latest(kpi_id, rows)
+            # Upserts: the older periods stay as the full sync (or a changed instrument) left them
+            for (kpi_id, report_type), items in histories.items():
+                for ins_id, item in items.items():
+                    self.store.write_kpi_history(ins_id, kpi_id, report_type, KPI_PRICE_TYPE, item.get("values") or [])
+            self.store.set_state("kpis_calc_updated", calc_updated)
+        self.progress(f"KPIs: recalculated {calc_updated}, {len(values)} refreshed")
+        return len(values)
+
+    def _sync_splits(self, through: str) -> int:
+        checked = date.fromisoformat(self.store.get_state("splits_checked"))
+        since = max(checked - timedelta(days=SPLIT_OVERLAP_DAYS),
+                    date.today() - timedelta(days=MAX_SPLIT_LOOKBACK_DAYS))
+        splits = self.client.get_stock_splits(str(since)).get("stockSplitList") or []
+        new = self.store.new_splits(splits)
+        # A split restates the whole price history, so it is fetched again rather than patched.
+        # The split is recorded only afterwards: a crash in between repeats the refetch.
+        ins_ids = sorted({s["instrumentId"] for s in new if self.store.prices.length(s["instrumentId"])})
+        for ins_id in ins_ids:
+            self.store.prices.reset(ins_id)
+        if ins_ids:
+            self.store.prices.update(self.client, ins_ids, to_date=through)
+        with self.store.transaction():
+            self.store.write_splits(splits)
+            self.store.set_state("splits_checked", str(date.today()))
+        if new:
+            self.progress(f"Splits: {len(new)} new, {len(ins_ids)} price histories reloaded")
+        return len(new)
+
+    def _sync_prices(self, config: Dict[str, Any], through: str) -> int:
+        days = trading_days(self.store.get_state("prices_through"), through)
+        nordic = self.store.instrument_ids()
+        all_ids = self.store.instrument_ids(config["include_global"])
+        missing = [ins_id for ins_id in all_ids if self.store.prices.length(ins_id) == 0]
+        if missing:
+            self.store.prices.update(self.client, missing, to_date=through)
+        if len(days) > MAX_DAILY_GAP_DAYS:
+            # Too far behind for one-day snapshots, backfill over the batched history endpoint
+            self.store.prices.update(self.client, all_ids, to_date=through)
+        elif days:
+            behind = set()
+            for day in days:
+                behind.update(self.store.prices.apply_daily(self.client, day)[1])
+            # Global instruments are not in the daily snapshots, and instruments too far behind for
+            # them (e.g. after a trading halt) are backfilled over the batched history endpoint
+            backfill = sorted((set(all_ids) - set(nordic)) | (behind & set(all_ids)))
+            if backfill:
+                self.store.prices.update(self.client, backfill, to_date=through)
+        self.store.set_state("prices_through", through)
+        self.progress(f"Prices: {len(days)} days through {through}, {len(missing)} new instruments")
+        return len(days)
+
+
+def print_status(store: SyncStore):
+    print(f"Full sync: {store.get_state('full_sync_status') or 'never run'}")
+    for key in ("prices_through", "kpis_calc_updated", "splits_checked"):
+        print(f"  {key}: {store.get_state(key)}")
+    for status, count in sorted(store.task_counts().items()):
+        print(f"  {status}: {count} tasks")
+    for table in ("instruments", "reports", "kpi_history"):
+        print(f"  {table}: {store.query(f'SELECT COUNT(*) FROM {table}')[0][0]} rows")
+    print(f"  prices: {len(store.prices.instruments())} instruments")
+
+
+def parse_kpis(value: str) -> Optional[List[int]]:
+    return None if value == "all" else [int(k) for k in value.split(",") if k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mirror Börsdata into a local store")
+    parser.add_argument("--root", default=DEFAULT_SYNC_ROOT, help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    full = commands.add_parser("full", help="full sync of the universe, resuming an unfinished run")
+    full.add_argument("--workers", type=int, default=4)
+    full.add_argument("--kpis", default=",".join(map(str, DEFAULT_KPIS)), help="KPI ids, comma separated, or 'all'")
+    full.add_argument("--report-types", default=",".join(REPORT_TYPES))
+    full.add_argument("--global", dest="include_global", action="store_true", help="include global instruments")
+    full.add_argument("--restart", action="store_true", help="discard an unfinished run and plan a new one")
+    full.add_argument("--budget", type=int, default=None, help="stop after this many API calls")
+    delta = commands.add_parser("delta", help="fetch only what changed since the last sync")
+    delta.add_argument("--through", default=None, help="last price day to apply (default yesterday)")
+    commands.add_parser("status", help="show sync progress and store contents")
+    args = parser.parse_args()
+
+    store = SyncStore(args.root)
+    try:
+        if args.command == "status":
+            print_status(store)
+            return
+        # The sync reads every payload once, so the in-memory and on-disk response caches are bypassed
+        with BorsdataClient(memo=MemoCache(ttl=0)) as client:
+            if args.command == "delta":
+                result = DeltaSync(client, store).run(through=args.through)
+                print(f"Delta sync done in {result['seconds']:.1f}s with {result['calls']} calls.")
+                return
+            job = FullSync(client, store, kpi_ids=parse_kpis(args.kpis), report_types=args.report_types.split(","),
+                           include_global=args.include_global, workers=args.workers, call_budget=args.budget)
+            result = job.run(restart=args.restart)
+        print(f"Done {result['done']} tasks ({result['failed']} failed, {result['remaining']} remaining) "
+              f"in {result['seconds']:.0f}s with {result['calls']} calls.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TRADING_DAYS = 252
+CORRELATION_WINDOW = 250
+MIN_PERIODS = 60
+# Rolling windows need this share of days present, the panel has gaps where instruments did not trade
+MIN_COVERAGE = 0.8
+# Environment for the workers: one BLAS thread each, so processes rather than threads share the cores
+_SINGLE_THREAD_ENV = {name: "1" for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+
+
+# Closes (and volumes) of many instruments on a common date axis, (day x instrument), NaN where an
+# instrument did not trade or was not listed yet. Columns follow ins_ids.
+class PricePanel:
+    def __init__(self, dates: np.ndarray, ins_ids: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        self.dates = dates
+        self.ins_ids = ins_ids
+        self.close = close
+        self.volume = volume
+        self._columns = {int(ins_id): i for i, ins_id in enumerate(ins_ids)}
+
+    @classmethod
+    def from_columns(cls, series: Dict[int, Dict[str, np.ndarray]], start: Optional[str] = None) -> "PricePanel":
+        # series: ins_id -> {"d", "c", "v"} arrays sorted by date, e.g. PriceStore.load results
+        if start is not None:
+            first = np.datetime64(start, "D")
+            series = {ins_id: {k: v[np.searchsorted(s["d"], first):] for k, v in s.items()}
+                      for ins_id, s in series.items()}
+        ins_ids = np.array(sorted(series), dtype=np.int64)
+        dates = np.unique(np.concatenate([series[int(i)]["d"] for i in ins_ids] or [np.empty(0, "datetime64[D]")]))
+        close = np.full((len(dates), len(ins_ids)), np.nan)
+        volume = np.zeros((len(dates), len(ins_ids)), dtype=np.int64)
+        for col, ins_id in enumerate(ins_ids):
+            s = series[int(ins_id)]
+            rows = np.searchsorted(dates, s["d"])
+            close[rows, col] = s["c"]
+            volume[rows, col] = s["v"]
+        return cls(dates, ins_ids, close, volume)
+
+    @classmethod
+    def from_store(cls, store, ins_ids: Optional[Iterable[int]] = None, start: Optional[str] = None) -> "PricePanel":
+        ins_ids = store.instruments() if ins_ids is None else ins_ids
+        return cls.from_columns({ins_id: store.load(ins_id, start=start) for ins_id in ins_ids})
+
+    @classmethod
+    def from_client(cls, client, ins_ids: Iterable[int], from_date: Optional[str] = None,
+                    to_date: Optional[str] = None) -> "PricePanel":
+        series = {}
+        for ins_id, item in client.get_stock_prices_batch(ins_ids, from_date, to_date).items():
+            rows = [r for r in item.get("stockPricesList") or [] if r.get("d") and r.get("c") is not None]
+            rows.sort(key=lambda r: r["d"])
+            series[ins_id] = {"d": np.array([r["d"][:10] for r in rows], dtype="datetime64[D]"),
+                              "c": np.array([r["c"] for r in rows], dtype=np.float64),
+                              "v": np.array([r.get("v") or 0 for r in rows], dtype=np.int64)}
+        return cls.from_columns(series)
+
+    def __len__(self) -> int:
+        return len(self.ins_ids)
+
+    def column(self, ins_id: int) -> int:
+        return self._columns[ins_id]
+
+    def tail(self, days: int) -> "PricePanel":
+        return PricePanel(self.dates[-days:], self.ins_ids, self.close[-days:], self.volume[-days:])
+
+
+# Vectorized kernels, all column-wise over (day x instrument) arrays and NaN-aware
+def _min_count(window: int, min_periods: Optional[int]) -> int:
+    return max(2, min_periods or int(np.ceil(window * MIN_COVERAGE)))
+
+
+def _window_sum(cumulative: np.ndarray, window: int) -> np.ndarray:
+    result = cumulative.copy()
+    result[window:] -= cumulative[:-window]
+    return result
+
+
+def simple_returns(close: np.ndarray) -> np.ndarray:
+    result = np.full(close.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result[1:] = close[1:] / close[:-1] - 1
+    return result
+
+
+def rolling_mean(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    valid = ~np.isnan(values)
+    sums = _window_sum(np.cumsum(np.where(valid, values, 0.0), axis=0), window)
+    counts = _window_sum(np.cumsum(valid, axis=0), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts >= _min_count(window, min_periods), sums / counts, np.nan)
+
+
+def rolling_std(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    counts = _window_sum(np.cumsum(valid, axis=0), window)
+    sums = _window_sum(np.cumsum(filled, axis=0), window)
+    squares = _window_sum(np.cumsum(filled * filled, axis=0), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = (squares - sums * sums / counts) / (counts - 1)
+    return np.where(counts >= _min_count(window, min_periods), np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+
+def drawdown(close: np.ndarray) -> np.ndarray:
+    # Distance below the running peak, as a negative fraction
+    with np.errstate(invalid="ignore"):
+        return close / np.fmax.accumulate(close, axis=0) - 1
+
+
+def period_return(close: np.ndarray, days: int) -> np.ndarray:
+    # Return over the last `days` rows per instrument, from the last close at or before each end
+    last = _last_valid(close)
+    start = _last_valid(close[:-days]) if days < len(close) else np.full(close.shape[1], np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return last / start - 1
+
+
+def _last_valid(values: np.ndarray) -> np.ndarray:
+    if not len(values):
+        return np.full(values.shape[1], np.nan)
+    valid = ~np.isnan(values)
+    rows = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+    return np.where(valid.any(axis=0), values[rows, np.arange(values.shape[1])], np.nan)
+
+
+def pairwise_correlation(x: np.ndarray, y: np.ndarray, min_periods: int = MIN_PERIODS) -> np.ndarray:
+    # Pearson correlation of every column of x with every column of y over the days both have a
+    # value (pairwise complete), as five matrix products
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    fx, fy = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+    mx, my = mx.astype(np.float64), my.astype(np.float64)
+    n = mx.T @ my
+    sx, sy = fx.T @ my, mx.T @ fy
+    sxx, syy = (fx * fx).T @ my, mx.T @ (fy * fy)
+    sxy = fx.T @ fy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    return np.where(n >= min_periods, np.clip(corr, -1.0, 1.0), np.nan)
+
+
+def indicator_block(close: np.ndarray, ma_windows: Sequence[int], vol_window: int) -> Dict[str, np.ndarray]:
+    returns = simple_returns(close)
+    result = {"return": returns, "drawdown": drawdown(close),
+              f"volatility_{vol_window}": rolling_std(returns, vol_window) * np.sqrt(TRADING_DAYS)}
+    for window in ma_windows:
+        result[f"sma_{window}"] = rolling_mean(close, window)
+    return result
+
+
+# Shared memory. The parent copies the panel into named blocks once and workers map them by name,
+# so tasks only carry (name, shape, dtype) and column ranges, and results are written in place.
+Spec = Tuple[str, Tuple[int, ...], str]
+
+
+class SharedArray:
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple[int, ...], dtype: np.dtype, owner: bool):
+        self.shm = shm
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        self.owner = owner
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], dtype=np.float64, fill: Optional[float] = None) -> "SharedArray":
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        shared = cls(shared_memory.SharedMemory(create=True, size=size), shape, dtype, owner=True)
+        if fill is not None:
+            shared.array.fill(fill)
+        return shared
+
+    @classmethod
+    def copy_of(cls, values: np.ndarray) -> "SharedArray":
+        shared = cls.create(values.shape, values.dtype)
+        shared.array[...] = values
+        return shared
+
+    @property
+    def spec(self) -> Spec:
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_attached: Dict[str, SharedArray] = {}
+
+
+def _attach(spec: Spec) -> np.ndarray:
+    # Workers keep blocks mapped across tasks; a new panel means new names
+    name, shape, dtype = spec
+    shared = _attached.get(name)
+    if shared is None:
+        shared = _attached[name] = SharedArray(shared_memory.SharedMemory(name=name), shape, np.dtype(dtype), False)
+    return shared.array
+
+
+def _release_attached(keep: Iterable[str] = ()):
+    for name in [n for n in _attached if n not in keep]:
+        _attached.pop(name).close()
+
+
+def _indicator_task(close_spec: Spec, out_specs: Dict[str, Spec], lo: int, hi: int,
+                    ma_windows: Sequence[int], vol_window: int) -> int:
+    close = _attach(close_spec)
+    for name, values in indicator_block(close[:, lo:hi], ma_windows, vol_window).items():
+        _attach(out_specs[name])[:, lo:hi] = values
+    _release_attached(keep=[close_spec[0]])
+    return hi - lo
+
+
+def _correlation_task(returns_spec: Spec, out_spec: Spec, tiles: List[Tuple[int, int, int, int]],
+                      min_periods: int) -> int:
+    returns, out = _attach(returns_spec), _attach(out_spec)
+    for i0, i1, j0, j1 in tiles:
+        block = pairwise_correlation(returns[:, i0:i1], returns[:, j0:j1], min_periods)
+        out[i0:i1, j0:j1] = block
+        out[j0:j1, i0:i1] = block.T
+    del returns, out  # views must be gone before the blocks are unmapped
+    _release_attached()
+    return len(tiles)
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _splits(n: int, parts: int) -> List[Tuple[int, int]]:
+    bounds = np.linspace(0, n, max(1, min(parts, n)) + 1).astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+# Process pool for the analytics. Workers are spawned with single-threaded BLAS so each core runs
+# one kernel; without a pool the same kernels run in this process.
+class TechnicalPool:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        saved = {name: os.environ.get(name) for name in _SINGLE_THREAD_ENV}
+        os.environ.update(_SINGLE_THREAD_ENV)
+        try:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            # Start the workers now, while the environment is set for them
+            for future in [self.executor.submit(_worker_ready) for _ in range(self.workers)]:
+                future.result()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compute_indicators(panel: PricePanel, ma_windows: Sequence[int] = (50, 200), vol_window: int = 20,
+                       pool: Optional[TechnicalPool] = None) -> Dict[str, np.ndarray]:
+    # Daily returns, drawdown, annualized volatility and moving averages, each (day x instrument)
+    if pool is None:
+        return indicator_block(panel.close, ma_windows, vol_window)
+
+    names = ["return", "drawdown", f"volatility_{vol_window}"] + [f"sma_{w}" for w in ma_windows]
+    shape = panel.close.shape
+    with SharedArray.copy_of(panel.close) as close:
+        outputs = {name: SharedArray.create(shape, fill=np.nan) for name in names}
+        try:
+            specs = {name: out.spec for name, out in outputs.items()}
+            futures = [pool.executor.submit(_indicator_task, close.spec, specs, lo, hi, tuple(ma_windows), vol_window)
+                       for lo, hi in _splits(shape[1], pool.workers * 4)]
+            for future in futures:
+                future.result()
+            return {name: out.array.copy() for name, out in outputs.items()}
+        finally:
+            for out in outputs.values():
+                out.close()
+
+
+def correlation_matrix(panel: PricePanel, window: int = CORRELATION_WINDOW, min_periods: int = MIN_PERIODS,
+                       pool: Optional[TechnicalPool] = None) -> np.ndarray:
+    # Correlation of daily returns over the last `window` days, (instrument x instrument)
+    returns = simple_returns(panel.close[-(window + 1):])[1:]
+    if pool is None:
+        return pairwise_correlation(returns, returns, min_periods)
+
+    # Upper-triangle tiles of equal size, dealt round-robin so every worker gets the same amount of work
+    blocks = _splits(returns.shape[1], pool.workers * 2)
+    tiles = [(i0, i1, j0, j1) for a, (i0, i1) in enumerate(blocks) for (j0, j1) in blocks[a:]]
+    n = returns.shape[1]
+    with SharedArray.copy_of(np.ascontiguousarray(returns)) as shared, \
+            SharedArray.create((n, n), fill=np.nan) as out:
+        futures = [pool.executor.submit(_correlation_task, shared.spec, out.spec, tiles[k::pool.workers], min_periods)
+                   for k in range(pool.workers)]
+        for future in futures:
+            future.result()
+        return out.array.copy()
+
+
+def summary(panel: PricePanel, indicators: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    # Latest value of every indicator per instrument, plus max drawdown and 1m/3m/1y returns
+    result: Dict[str, Any] = {"insId": panel.ins_ids, "close": _last_valid(panel.close)}
+    for name, values in indicators.items():
+        if name != "return":
+            result[name] = _last_valid(values)
+    deepest = np.fmin.reduce(indicators["drawdown"], axis=0, initial=np.inf)
+    result["max_drawdown"] = np.where(np.isinf(deepest), np.nan, deepest)
+    for label, days in (("return_1m", 21), ("return_3m", 63), ("return_1y", TRADING_DAYS)):
+        result[label] = period_return(panel.close, days)
+    return result
@@ -0,0 +1,36 @@
+import pytest
+
+from borsdata_client import BorsdataClient
+from memo_cache import MemoCache
+from mock_server import MockBorsdata, MockServer, SyntheticMarket
+
+
+@pytest.fixture
+def market():
+    return SyntheticMarket(universe=40, global_universe=10, history_years=2, split_rate=0.1)
+
+
+@pytest.fixture
+def api(market):
+    return MockBorsdata(market)
+
+
+@pytest.fixture
+def server(api):
+    with MockServer(api) as server:
+        yield server
+
+
+@pytest.fixture
+def make_client(server):
+    # Clients against the mock server; the memo is bypassed unless a test asks for it
+    def make(memo=None, **kwargs):
+        options = dict({"max_calls": 10 ** 6, "max_retries": 0}, **kwargs)
+        return BorsdataClient(api_key="test", base_url=server.base_url, memo=memo or MemoCache(ttl=0), **options)
+    return make
+
+
+@pytest.fixture
+def client(make_client):
+    with make_client() as client:
+        yield client
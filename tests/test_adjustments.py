@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+from adjustments import AdjustedPrices, CorporateActions, adjust_columns, adjust_panel, adjustment_factors, \
+    split_factor
+from price_store import PriceStore
+from technical import PricePanel
+
+DATES = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-07"))
+
+
+def actions(splits=(), dividends=()) -> CorporateActions:
+    # splits: (ins_id, date, "new:old"), dividends: (ins_id, ex-date, amount)
+    return CorporateActions.from_responses(
+        [{"instrumentId": i, "splitDate": d, "ratio": r} for i, d, r in splits],
+        {i: {"insId": i, "values": [{"excludingDate": d, "amountPaid": a} for j, d, a in dividends if j == i]}
+         for i in {i for i, _, _ in dividends}})
+
+
+def panel(close, volume=None) -> PricePanel:
+    close = np.array(close, dtype=np.float64).reshape(len(DATES), -1)
+    volume = np.full(close.shape, 1000, dtype=np.int64) if volume is None else \
+        np.array(volume, dtype=np.int64).reshape(close.shape)
+    return PricePanel(DATES, np.arange(1, close.shape[1] + 1), close, volume)
+
+
+@pytest.mark.parametrize("ratio, factor", [("2:1", 0.5), ("3:1", 1 / 3), ("1:10", 10.0), ("3:2", 2 / 3)])
+def test_split_factor(ratio, factor):
+    assert split_factor(ratio) == pytest.approx(factor)
+
+
+def test_forward_split():
+    raw = panel([100, 100, 100, 50, 50, 50], [10, 10, 10, 20, 20, 20])
+    adjusted = adjust_panel(raw, actions(splits=[(1, "2024-01-04", "2:1")]))
+    np.testing.assert_allclose(adjusted.close[:, 0], 50)
+    np.testing.assert_array_equal(adjusted.volume[:, 0], 20)
+
+
+def test_reverse_split():
+    raw = panel([1, 1, 10, 10, 10, 10], [500, 500, 50, 50, 50, 50])
+    adjusted = adjust_panel(raw, actions(splits=[(1, "2024-01-03T00:00:00", "1:10")]))
+    np.testing.assert_allclose(adjusted.close[:, 0], 10)
+    np.testing.assert_array_equal(adjusted.volume[:, 0], 50)
+
+
+def test_dividend_marks_earlier_prices_down():
+    # A 2 dividend on a 100 close before the ex-date: earlier prices scale by 0.98, volumes stay
+    raw = panel([100, 100, 98, 98, 98, 98])
+    adjusted = adjust_panel(raw, actions(dividends=[(1, "2024-01-03", 2.0)]))
+    np.testing.assert_allclose(adjusted.close[:, 0], 98)
+    np.testing.assert_array_equal(adjusted.volume, raw.volume)
+    unadjusted = adjust_panel(raw, actions(dividends=[(1, "2024-01-03", 2.0)]), dividends=False)
+    np.testing.assert_allclose(unadjusted.close, raw.close)
+
+
+def test_factors_compound_across_events():
+    # 2:1 split on day 3, then a dividend of 10% of the close before the ex-date on day 5
+    price, split_cols, volume = adjustment_factors(
+        DATES, np.array([1]), np.array([[200], [200], [100], [100], [90], [90]], dtype=np.float64),
+        actions(splits=[(1, "2024-01-03", "2:1")], dividends=[(1, "2024-01-05", 10.0)]))
+    np.testing.assert_allclose(price[:, 0], [0.45, 0.45, 0.9, 0.9, 1, 1])
+    assert split_cols.tolist() == [0]
+    np.testing.assert_allclose(volume[:, 0], [2, 2, 1, 1, 1, 1])
+
+
+def test_columns_are_adjusted_independently():
+    raw = panel([[100, 10, 5], [100, 10, 5], [50, 10, 5], [50, 100, 5], [50, 100, 5], [50, 100, 5]])
+    adjusted = adjust_panel(raw, actions(splits=[(1, "2024-01-03", "2:1"), (2, "2024-01-04", "1:10")]))
+    np.testing.assert_allclose(adjusted.close[:, 0], 50)
+    np.testing.assert_allclose(adjusted.close[:, 1], 100)
+    np.testing.assert_allclose(adjusted.close[:, 2], 5)
+    np.testing.assert_array_equal(adjusted.volume[:, 2], 1000)
+
+
+def test_duplicate_events_count_once():
+    # The same split from the endpoint and from a sync store's table
+    raw = panel([400, 400, 100, 100, 100, 100])
+    adjusted = adjust_panel(raw, actions(splits=[(1, "2024-01-03", "2:1"), (1, "2024-01-03T00:00:00", "2:1")]))
+    np.testing.assert_allclose(adjusted.close[:, 0], [200, 200, 100, 100, 100, 100])
+
+
+def test_events_outside_the_window_or_universe_change_nothing():
+    raw = panel([100, 100, 100, 100, 100, 100])
+    events = actions(splits=[(1, "2023-06-01", "2:1"), (1, "2024-02-01", "2:1"), (7, "2024-01-03", "2:1")],
+                     dividends=[(1, "2024-03-01", 5.0)])
+    np.testing.assert_allclose(adjust_panel(raw, events).close, raw.close)
+
+
+def test_dividend_uses_last_close_when_the_day_before_is_missing():
+    raw = panel([100, np.nan, 95, 95, 95, 95])
+    adjusted = adjust_panel(raw, actions(dividends=[(1, "2024-01-03", 5.0)]))
+    np.testing.assert_allclose(adjusted.close[[0, 2, 3], 0], [95, 95, 95])
+    assert np.isnan(adjusted.close[1, 0])
+
+
+def test_implausible_dividends_are_skipped():
+    raw = panel([10, 10, 10, 10, 10, 10])
+    adjusted = adjust_panel(raw, actions(dividends=[(1, "2024-01-03", 12.0)]))
+    np.testing.assert_allclose(adjusted.close, raw.close)
+
+
+def test_adjust_columns_matches_the_panel():
+    columns = {"d": DATES, "o": np.full(6, 101.0), "h": np.full(6, 102.0), "l": np.full(6, 99.0),
+               "c": np.array([100, 100, 100, 50, 50, 50], dtype=np.float64), "v": np.full(6, 10, dtype=np.int64)}
+    events = actions(splits=[(3, "2024-01-04", "2:1")])
+    adjusted = adjust_columns(3, columns, events)
+    np.testing.assert_allclose(adjusted["o"], [50.5, 50.5, 50.5, 101, 101, 101])
+    np.testing.assert_allclose(adjusted["c"], 50)
+    np.testing.assert_array_equal(adjusted["v"], [20, 20, 20, 10, 10, 10])
+
+
+def _rows(days, close):
+    return [{"d": str(d), "o": c, "h": c, "l": c, "c": c, "v": 100} for d, c in zip(days, close)]
+
+
+def test_adjusted_prices_recompute_only_for_new_events(tmp_path):
+    store = PriceStore(str(tmp_path / "prices"))
+    store.append(1, _rows(DATES[:4], [100, 100, 50, 50]))
+    split = actions(splits=[(1, "2024-01-03", "2:1")])
+
+    prices = AdjustedPrices(store, split, str(tmp_path / "adjusted"))
+    np.testing.assert_allclose(prices.load(1)["c"], 50)
+    assert prices.recomputed == 1
+
+    # New days after the applied events are appended as they are
+    store.append(1, _rows(DATES[4:], [50, 50]))
+    np.testing.assert_allclose(prices.load(1)["c"], 50)
+    assert prices.recomputed == 1
+
+    # The cache survives a restart
+    reopened = AdjustedPrices(store, split, str(tmp_path / "adjusted"))
+    np.testing.assert_allclose(reopened.load(1)["c"], 50)
+    assert reopened.recomputed == 0
+
+    # A new event restates the history
+    with_dividend = actions(splits=[(1, "2024-01-03", "2:1")], dividends=[(1, "2024-01-06", 5.0)])
+    restated = AdjustedPrices(store, with_dividend, str(tmp_path / "adjusted"))
+    np.testing.assert_allclose(restated.load(1)["c"], [45, 45, 45, 45, 45, 50])
+    assert restated.recomputed == 1
+
+
+def test_load_removes_split_jumps_from_mock_prices(client, market):
+    ins_ids = [i["insId"] for i in market.instruments]
+    events = CorporateActions.load(client, ins_ids)
+    assert len(events.splits[0]) == len(market.splits)
+    assert set(events.dividends[0]) <= set(ins_ids) and len(events.dividends[0])
+
+    raw = PricePanel.from_client(client, ins_ids)
+    adjusted = adjust_panel(raw, events, dividends=False)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        raw_moves = np.abs(np.log(raw.close[1:] / raw.close[:-1]))
+        adjusted_moves = np.abs(np.log(adjusted.close[1:] / adjusted.close[:-1]))
+    assert np.nanmax(raw_moves) > np.log(1.5)
+    assert np.nanmax(adjusted_moves) < 0.2
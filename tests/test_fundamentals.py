@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import gross_margin_analysis
+import pe_analysis
+from fundamentals import Fundamentals, ReportMatrix, compare_ratio
+from kpi_engine import PE_KPI_ID, compare_kpi
+
+
+def report(year, period=0, **fields):
+    return dict({"year": year, "period": period}, **fields)
+
+
+def quarters(*pairs, **fields):
+    # Newest first, like the API
+    return [report(y, p, **{k: v[i] for k, v in fields.items()}) for i, (y, p) in enumerate(pairs)]
+
+
+def test_year_growth_against_the_previous_year():
+    matrix = ReportMatrix.from_reports("year", {
+        1: [report(2023, revenues=120), report(2022, revenues=100), report(2021, revenues=80)],
+        2: [report(2023, revenues=50)],
+    })
+    growth = matrix.growth("revenues")
+    np.testing.assert_allclose(growth[0], [20, 25, np.nan])
+    assert np.isnan(growth[1]).all()
+
+
+def test_quarter_lag_finds_the_year_earlier_report_across_gaps():
+    # 2023 Q2 has no report, so 2024 Q2 has no year-earlier value, while 2024 Q1 still has 2023 Q1
+    pairs = [(2024, 2), (2024, 1), (2023, 4), (2023, 3), (2023, 1), (2022, 4)]
+    matrix = ReportMatrix.from_reports("quarter", {1: quarters(*pairs, revenues=[110, 105, 100, 95, 84, 80])})
+    lagged = matrix.lagged(matrix["revenues"], 4)
+    np.testing.assert_allclose(lagged[0], [np.nan, 84, 80, np.nan, np.nan, np.nan])
+    growth = matrix.growth("revenues")
+    assert np.isnan(growth[0, 0])
+    assert growth[0, 1] == pytest.approx(25)
+
+
+def test_r12_compares_with_four_periods_earlier():
+    pairs = [(2024, 1), (2023, 4), (2023, 3), (2023, 2), (2023, 1)]
+    matrix = ReportMatrix.from_reports("r12", {7: quarters(*pairs, earnings_Per_Share=[3, 2.8, 2.6, 2.4, 2])})
+    growth = matrix.ratio("eps_growth")
+    assert growth[0, 0] == pytest.approx(50)
+    assert np.isnan(growth[0, 1:]).all()
+
+
+def test_growth_needs_a_positive_base():
+    matrix = ReportMatrix.from_reports("year", {1: [report(2023, revenues=10), report(2022, revenues=-5),
+                                                    report(2021, revenues=0), report(2020, revenues=4)]})
+    growth = matrix.growth("revenues")
+    assert np.isnan(growth[0, :2]).all()
+    assert growth[0, 2] == pytest.approx(-100)
+
+
+def test_ratios():
+    matrix = ReportMatrix.from_reports("year", {1: [
+        report(2023, revenues=200, gross_Income=80, earnings_Per_Share=2, stock_Price_Average=30,
+               number_Of_Shares=10, total_Equity=100),
+        report(2022, revenues=0, gross_Income=10, earnings_Per_Share=-1, stock_Price_Average=20),
+    ]})
+    np.testing.assert_allclose(matrix.ratio("gross_margin")[0], [40, np.nan])
+    np.testing.assert_allclose(matrix.ratio("pe")[0], [15, np.nan])
+    assert matrix.ratio("pb")[0, 0] == pytest.approx(3)
+    with pytest.raises(KeyError):
+        matrix.ratio("nonsense")
+
+
+def test_fundamentals_from_the_mock_reports(client, market):
+    ins_ids = [i["insId"] for i in market.instruments[:5]]
+    fundamentals = Fundamentals.load(client, ins_ids + [999999])
+    year = fundamentals["year"]
+    assert year.ins_ids.tolist() == ins_ids
+    margins = fundamentals.ratio("gross_margin", "year")
+    row = year.row(ins_ids[0])
+    reports = client.get_reports(ins_ids[0], "year")["reports"]
+    expected = reports[0]["gross_Income"] / reports[0]["revenues"] * 100
+    assert margins.current()[row] == pytest.approx(expected)
+    summary = fundamentals.summary(["gross_margin", "revenue_growth"])
+    assert summary["insId"].tolist() == ins_ids and len(summary["revenue_growth"]) == len(ins_ids)
+
+
+def test_compare_ratio_and_the_getters_agree(client, market):
+    ins_id = market.instruments[0]["insId"]
+    current, avg_3, avg_5 = compare_ratio(client, ins_id, "gross_margin")
+    assert gross_margin_analysis.get_gross_margin(client, ins_id) == current
+    assert gross_margin_analysis.get_gross_margin_average(client, ins_id, 3) == avg_3
+    assert gross_margin_analysis.compare_gross_margins(client, ins_id) == (current, avg_3, avg_5)
+
+    current_pe, avg_pe = compare_kpi(client, ins_id, PE_KPI_ID, windows=(5,))
+    assert pe_analysis.get_pe_ratio(client, ins_id) == current_pe
+    assert pe_analysis.get_pe_average(client, ins_id, 5) == avg_pe
+
+
+def test_compare_ratio_without_reports(client):
+    assert compare_ratio(client, 999999, "gross_margin") == (None, None, None)
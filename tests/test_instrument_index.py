@@ -0,0 +1,109 @@
+import pytest
+
+from instrument_index import InstrumentIndex, get_instrument_index, load_snapshot, refresh_index, save_snapshot
+
+
+class Holder:
+    # Stands in for a client in the snapshot tests, which never reach the API
+    pass
+
+
+def linear_search(instruments, term):
+    # The scan main.py and the GUI ran before the index
+    term = term.lower()
+    matches = []
+    for inst in instruments:
+        name_match = term in inst['name'].lower()
+        ticker_match = term in inst['ticker'].lower()
+        if name_match or ticker_match:
+            score = 0
+            if name_match:
+                score += len(term) / len(inst['name'])
+            if ticker_match:
+                score += len(term) / len(inst['ticker'])
+            matches.append((score, inst))
+    matches.sort(reverse=True, key=lambda m: m[0])
+    return [m[1] for m in matches]
+
+
+@pytest.fixture
+def instruments(market):
+    return market.instruments + market.global_instruments
+
+
+def _terms(instruments):
+    terms = {"", "a", "ab", "AB", "x", "zzz", "fjällma"}
+    for inst in instruments[::3]:
+        terms |= {inst["name"][:1], inst["name"][1:3], inst["name"][2:6], inst["ticker"], inst["name"].lower()}
+    return sorted(terms)
+
+
+def test_search_ranks_like_the_linear_scan(instruments):
+    index = InstrumentIndex(instruments)
+    for term in _terms(instruments):
+        expected = linear_search(instruments, term)
+        for limit in (None, 10, 20):
+            results, total = index.search_with_total(term, limit)
+            assert [i["insId"] for i in results] == [i["insId"] for i in expected[:limit]], term
+            assert total == len(expected)
+
+
+def test_cached_short_terms_rank_the_same(instruments):
+    index = InstrumentIndex(instruments)
+    first = index.search("a", 5)
+    assert "a" in index._short_rankings
+    assert index.search("a", 5) == first
+    assert index.search("a") == linear_search(instruments, "a")
+
+
+def test_lookups(instruments):
+    index = InstrumentIndex(instruments + instruments[:2])
+    inst = instruments[5]
+    assert len(index) == len(instruments)
+    assert index.get(inst["insId"]) is inst
+    assert index.get_by_isin(f" {inst['isin'].lower()} ") is inst
+    assert index.get_by_ticker(inst["ticker"].lower()) is inst
+    assert index.resolve(str(inst["insId"])) is index.resolve(inst["isin"]) is index.resolve(inst["ticker"]) is inst
+    assert index.resolve("nothing") is None
+    assert index.name(inst["insId"]) == inst["name"]
+    assert index.name(-1) == "Unknown"
+
+
+def test_client_index_is_built_once_and_widened_on_demand(client, market, api):
+    nordic = get_instrument_index(client)
+    assert get_instrument_index(client) is nordic and len(nordic) == len(market.instruments)
+    wide = get_instrument_index(client, include_global=True)
+    assert len(wide) == len(market.instruments) + len(market.global_instruments)
+    assert get_instrument_index(client) is wide
+    assert api.stats["instrumentsv1"] == 2
+
+
+def test_snapshot_round_trip(instruments, tmp_path):
+    path = str(tmp_path / "cache" / "instruments.json")
+    save_snapshot(InstrumentIndex(instruments), include_global=True, path=path)
+    holder = Holder()
+    index = load_snapshot(holder, path)
+    assert [i["insId"] for i in index.instruments] == [i["insId"] for i in instruments]
+    assert index.search("ab", 10) == InstrumentIndex(instruments).search("ab", 10)
+    assert holder._instrument_index is index and holder._instrument_index_global
+    # A live index is never replaced by the snapshot
+    assert load_snapshot(holder, path) is index
+
+
+@pytest.mark.parametrize("content", [None, b"{not json"])
+def test_missing_or_broken_snapshots_load_nothing(tmp_path, content):
+    path = tmp_path / "instruments.json"
+    if content is not None:
+        path.write_bytes(content)
+    holder = Holder()
+    assert load_snapshot(holder, str(path)) is None
+    assert getattr(holder, "_instrument_index", None) is None
+
+
+def test_refresh_replaces_the_snapshot_index(client, market, tmp_path):
+    path = str(tmp_path / "instruments.json")
+    save_snapshot(InstrumentIndex(market.instruments[:5]), path=path)
+    assert len(load_snapshot(client, path)) == 5
+    index = refresh_index(client, path=path)
+    assert get_instrument_index(client) is index and len(index) == len(market.instruments)
+    assert len(load_snapshot(Holder(), path)) == len(market.instruments)
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import memo_cache
+from memo_cache import MemoCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memo_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_hits_until_the_ttl_runs_out(clock):
+    memo = MemoCache(ttl=60)
+    calls = []
+    fetch = lambda: calls.append(1) or {"n": len(calls)}
+    assert memo.get_or_fetch("sectors", fetch) == {"n": 1}
+    clock[0] += 59
+    assert memo.get_or_fetch("sectors", fetch) == {"n": 1}
+    clock[0] += 1
+    assert memo.get_or_fetch("sectors", fetch) == {"n": 2}
+    assert (memo.hits, memo.misses) == (1, 2)
+
+
+def test_per_endpoint_ttls_cap_the_default():
+    memo = MemoCache(ttl=300)
+    assert memo.ttl_for("instruments/kpis/updated") == 0
+    assert memo.ttl_for("instruments/stockprices/last") == 300
+    assert MemoCache(ttl=60).ttl_for("sectors") == 60
+
+
+def test_ttl_zero_always_fetches():
+    memo = MemoCache(ttl=0)
+    calls = []
+    for _ in range(3):
+        memo.get_or_fetch("sectors", lambda: calls.append(1))
+    assert len(calls) == 3 and memo.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    memo = MemoCache(max_bytes=3 * memo_cache.estimate_size({"v": "x" * 100}) + 10)
+    for key in "abc":
+        memo.get_or_fetch(key, lambda: {"v": "x" * 100})
+    memo.get_or_fetch("a", lambda: None)
+    memo.get_or_fetch("d", lambda: {"v": "x" * 100})
+    assert memo.evictions == 1
+    calls = []
+    memo.get_or_fetch("b", lambda: calls.append(1))
+    memo.get_or_fetch("a", lambda: calls.append(1))
+    assert calls == [1]
+    assert memo.total_bytes <= memo.max_bytes
+
+
+def test_failed_fetches_are_not_cached():
+    memo = MemoCache()
+    with pytest.raises(RuntimeError):
+        memo.get_or_fetch("sectors", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    assert memo.get_or_fetch("sectors", lambda: {"ok": True}) == {"ok": True}
+
+
+def test_discard_drops_matching_entries():
+    memo = MemoCache()
+    for key in ("instruments/kpis/2/last/latest", "sectors"):
+        memo.get_or_fetch(key, lambda: {"v": 1})
+    assert memo.discard(lambda key: "kpis/" in key) == 1
+    assert memo.stats()["entries"] == 1
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    memo = MemoCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"v": 1}
+
+    with ThreadPoolExecutor(8) as executor:
+        first = executor.submit(memo.get_or_fetch, "sectors", fetch)
+        started.wait(5)
+        waiting = [executor.submit(memo.get_or_fetch, "sectors", fetch) for _ in range(7)]
+        while memo.coalesced < 7:
+            pass
+        release.set()
+        results = [first.result()] + [f.result() for f in waiting]
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_waiters_see_the_owners_error():
+    memo = MemoCache()
+    started, release = threading.Event(), threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("down")
+
+    with ThreadPoolExecutor(2) as executor:
+        first = executor.submit(memo.get_or_fetch, "sectors", fetch)
+        started.wait(5)
+        second = executor.submit(memo.get_or_fetch, "sectors", fetch)
+        while not memo.coalesced:
+            pass
+        release.set()
+        for future in (first, second):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+
+def test_async_requests_are_coalesced():
+    memo = MemoCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"v": 1}
+
+    async def run():
+        return await asyncio.gather(*(memo.get_or_fetch_async("sectors", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"v": 1}] * 5
+    assert len(calls) == 1 and memo.coalesced == 4
+
+
+def test_client_calls_share_one_request(make_client, api):
+    with make_client(memo=MemoCache()) as client:
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: client.get_sectors(), range(16)))
+        client.get_sectors()
+    assert api.stats["sectorsv1"] == 1
+    assert all(r is results[0] for r in results)
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import pytest
+
+from price_store import MAX_DAILY_GAP_DAYS, PriceStore
+
+
+@pytest.fixture
+def prices(tmp_path):
+    return PriceStore(str(tmp_path / "prices"))
+
+
+def row(day, close=10.0, volume=100):
+    return {"d": day, "o": close, "h": close, "l": close, "c": close, "v": volume}
+
+
+class DailyClient:
+    # Serves one stockprices/date response
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_stock_prices_date(self, date):
+        return {"stockPricesList": [dict(r, d=date) for r in self.rows]}
+
+
+def test_append_sorts_and_drops_duplicate_and_incomplete_rows(prices):
+    added = prices.append(1, [row("2024-01-03", 3), row("2024-01-01", 1), row("2024-01-02", 2),
+                              row("2024-01-02", 2), {"d": "2024-01-04", "c": None}, {"c": 5.0}])
+    assert added == 3
+    columns = prices.load(1)
+    assert columns["d"].tolist() == np.array(["2024-01-01", "2024-01-02", "2024-01-03"],
+                                             dtype="datetime64[D]").tolist()
+    np.testing.assert_array_equal(columns["c"], [1, 2, 3])
+    assert columns["v"].dtype == np.int64
+
+
+def test_append_only_adds_days_after_the_last_one(prices):
+    prices.append(1, [row("2024-01-01"), row("2024-01-02")])
+    assert prices.append(1, [row("2024-01-02T00:00:00", 99), row("2024-01-01", 99)]) == 0
+    assert prices.append(1, [row("2024-01-02", 99), row("2024-01-03", 3)]) == 1
+    np.testing.assert_array_equal(prices.load(1)["c"], [10, 10, 3])
+    assert str(prices.last_date(1)) == "2024-01-03"
+
+
+def test_load_slices_by_date(prices):
+    prices.append(1, [row(f"2024-01-0{d}", d) for d in range(1, 8)])
+    np.testing.assert_array_equal(prices.load(1, start="2024-01-03", end="2024-01-05")["c"], [3, 4, 5])
+    assert len(prices.load(2)["d"]) == 0 and prices.last_date(2) is None
+
+
+def test_history_survives_a_restart(prices):
+    prices.append(1, [row("2024-01-01"), row("2024-01-02")])
+    prices.append(7, [row("2024-01-01")])
+    reopened = PriceStore(prices.root)
+    assert reopened.instruments() == [1, 7]
+    assert reopened.length(1) == 2
+
+
+def test_a_torn_append_is_invisible_and_overwritten(prices):
+    prices.append(1, [row("2024-01-01", 1), row("2024-01-02", 2)])
+    # A crash after writing some column bytes but before meta.json was replaced
+    directory = os.path.join(prices.root, "1")
+    for name in ("d", "c"):
+        with open(os.path.join(directory, f"{name}.bin"), "ab") as f:
+            f.write(b"\xff" * 12)
+    with open(os.path.join(directory, "meta.json.tmp"), "w") as f:
+        f.write('{"rows": 3')
+
+    reopened = PriceStore(prices.root)
+    assert reopened.length(1) == 2
+    np.testing.assert_array_equal(reopened.load(1)["c"], [1, 2])
+    assert reopened.append(1, [row("2024-01-03", 3)]) == 1
+    assert os.path.getsize(os.path.join(directory, "c.bin")) == 3 * 8
+    np.testing.assert_array_equal(PriceStore(prices.root).load(1)["c"], [1, 2, 3])
+
+
+def test_reset_drops_the_history(prices):
+    prices.append(1, [row("2024-01-01")])
+    prices.load(1)
+    prices.reset(1)
+    assert prices.length(1) == 0 and prices.instruments() == []
+    assert prices.append(1, [row("2023-06-01")]) == 1
+
+
+def test_daily_rows_follow_the_gap_rules(prices):
+    prices.append(1, [row("2024-01-05")])
+    prices.append(2, [row("2024-01-05"), row("2024-01-08")])
+    prices.append(3, [row("2023-12-01")])
+    client = DailyClient([row(None) | {"i": i} for i in (1, 2, 3, 4)] + [{"i": None}])
+
+    day = str(np.datetime64("2024-01-05") + MAX_DAILY_GAP_DAYS)
+    added, behind = prices.apply_daily(client, day)
+    # 1 is within the gap, 2 too, 3 is too far behind, 4 has no history to extend
+    assert added == {1: 1, 2: 1}
+    assert behind == [3]
+    assert prices.length(4) == 0
+    # The same day again is not appended twice
+    assert prices.apply_daily(client, day)[0] == {}
+
+
+def test_update_fetches_only_missing_days(client, market, prices):
+    ins_ids = [i["insId"] for i in market.instruments[:3]]
+    days, *_ = market.price_history(ins_ids[0])
+    cutoff = str(days[-10])
+    prices.update(client, ins_ids, to_date=cutoff)
+    assert str(prices.last_date(ins_ids[0])) == cutoff
+
+    added = prices.update(client, ins_ids)
+    assert added[ins_ids[0]] == 9
+    stored = prices.load(ins_ids[0])
+    np.testing.assert_array_equal(stored["d"], days)
+    np.testing.assert_allclose(stored["c"], market.price_history(ins_ids[0])[4])
+    assert prices.update(client, ins_ids) == {i: 0 for i in ins_ids}
@@ -0,0 +1,93 @@
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+import rate_limiter
+from borsdata_client import BorsdataClient, parse_retry_after
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bursts_up_to_capacity_then_paces(clock):
+    limiter = RateLimiter(5, 1.0)
+    assert [limiter.reserve() for _ in range(5)] == [0.0] * 5
+    assert limiter.reserve() == pytest.approx(0.2)
+    assert limiter.reserve() == pytest.approx(0.4)
+
+
+def test_tokens_refill_over_time(clock):
+    limiter = RateLimiter(5, 1.0)
+    for _ in range(5):
+        limiter.reserve()
+    clock[0] += 0.5
+    assert [limiter.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert limiter.reserve() > 0
+    # Never more than a full bucket, however long it was idle
+    clock[0] += 60
+    assert [limiter.reserve() for _ in range(5)] == [0.0] * 5
+    assert limiter.reserve() > 0
+
+
+def test_block_for_holds_back_every_caller(clock):
+    limiter = RateLimiter(5, 1.0)
+    limiter.block_for(2.0)
+    assert limiter.reserve() == pytest.approx(2.0)
+    clock[0] += 2.0
+    assert limiter.reserve() == pytest.approx(0.0, abs=0.3)
+
+
+@pytest.mark.parametrize("max_calls, period", [(0, 1.0), (5, 0)])
+def test_invalid_limits(max_calls, period):
+    with pytest.raises(ValueError):
+        RateLimiter(max_calls, period)
+
+
+@pytest.mark.parametrize("value, expected", [(None, None), ("", None), ("3", 3.0), ("1.5", 1.5), ("-2", 0.0),
+                                             ("soon", None)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    assert parse_retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_429_is_retried_after_retry_after(make_client, api):
+    # The mock allows two calls per second and answers the third with Retry-After: 1
+    api.max_calls, api.period = 2, 1.0
+    with make_client(max_retries=3) as client:
+        start = time.monotonic()
+        results = [client.get_sectors(), client.get_markets(), client.get_countries()]
+        elapsed = time.monotonic() - start
+    assert all(results)
+    assert api.stats["status_429"] >= 1
+    assert elapsed >= 0.9
+
+
+def test_429_is_raised_once_retries_run_out(make_client, api):
+    api.max_calls, api.period = 1, 10.0
+    with make_client() as client:
+        client.get_sectors()
+        with pytest.raises(requests.HTTPError) as error:
+            client.get_markets()
+    assert error.value.response.status_code == 429
+    assert client.metrics.snapshot()["endpoints"]["markets"]["errors"] == 1
+
+
+def test_connection_errors_are_retried():
+    attempts = []
+    client = BorsdataClient(api_key="test", base_url="http://127.0.0.1:1", max_retries=2, backoff_factor=0.01,
+                            timeout=1)
+    client.metrics.add_callback(lambda event: attempts.append(event) if event["kind"] == "request" else None)
+    with client, pytest.raises(requests.ConnectionError):
+        client.get_sectors()
+    assert len(attempts) == 3
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from async_borsdata_client import AsyncBorsdataClient
+from memo_cache import MemoCache
+from response_cache import DAY, DEFAULT_TTL, HOUR, ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite"))
+
+
+@pytest.fixture
+def cached_client(make_client, cache):
+    with make_client(cache=cache) as client:
+        yield client
+
+
+@pytest.mark.parametrize("endpoint, ttl", [
+    ("instruments/updated", 0),
+    ("instruments/kpis/updated", 0),
+    ("sectors", 7 * DAY),
+    ("instruments", DAY),
+    ("instruments/3/reports/year", DAY),
+    ("instruments/kpis/2/last/latest", DAY),
+    ("instruments/stockprices/last", 15 * 60),
+    ("instruments/3/stockprices", 6 * HOUR),
+    ("insiders", DEFAULT_TTL),
+])
+def test_ttls(cache, endpoint, ttl):
+    assert cache.ttl_for(endpoint) == ttl
+
+
+def test_watermark_endpoints_are_never_cached(cached_client, cache, api):
+    cache.set("instruments/updated", None, {"instruments": []})
+    assert cache.get("instruments/updated") is None
+    for _ in range(2):
+        cached_client.get_kpis_updated()
+    assert api.stats["kpisupdatedv1"] == 2
+
+
+def test_entries_survive_a_restart(cache):
+    cache.set("sectors", None, {"sectors": [{"id": 1, "name": "Energi"}]})
+    reopened = ResponseCache(cache.path)
+    assert reopened.get("sectors") == {"sectors": [{"id": 1, "name": "Energi"}]}
+    assert reopened.get("sectors", {"x": 1}) is None
+
+
+def test_expired_entries_are_dropped(cache):
+    cache.set("sectors", None, {"sectors": []}, ttl=1)
+    with cache._lock:
+        cache._conn.execute("UPDATE entries SET expires_at = 0")
+    assert cache.get("sectors") is None
+    assert cache.total_bytes == 0
+
+
+def test_a_changed_instrument_invalidates_its_entries_and_the_lists(cached_client, market, api):
+    changed, other = market.instruments[0]["insId"], market.instruments[1]["insId"]
+    for ins_id in (changed, other):
+        cached_client.get_reports(ins_id, "year")
+    cached_client.get_instruments()
+    cached_client.get_sectors()
+    assert (api.stats["reportsv1"], api.stats["instrumentsv1"]) == (2, 1)
+
+    market.touch([changed], kpis=False)
+    cached_client._refresh_cache_watermarks(force=True)
+    for ins_id in (changed, other):
+        cached_client.get_reports(ins_id, "year")
+    cached_client.get_instruments()
+    cached_client.get_sectors()
+    # Only the changed instrument's reports and the instrument list are fetched again
+    assert (api.stats["reportsv1"], api.stats["instrumentsv1"], api.stats["sectorsv1"]) == (3, 2, 1)
+
+
+def test_a_kpi_recalculation_invalidates_kpi_entries_only(cached_client, market, api):
+    ins_id = market.instruments[0]["insId"]
+    cached_client.get_kpi_screener(2, "last", "latest")
+    cached_client.get_reports(ins_id, "year")
+    cached_client.get_kpi_metadata()
+
+    market.touch([], kpis=True)
+    cached_client._refresh_cache_watermarks(force=True)
+    cached_client.get_kpi_screener(2, "last", "latest")
+    cached_client.get_reports(ins_id, "year")
+    cached_client.get_kpi_metadata()
+    assert (api.stats["kpislistv1"], api.stats["reportsv1"], api.stats["kpimetadatav1"]) == (2, 1, 1)
+
+
+def test_watermarks_are_checked_once_per_interval(make_client, cache, api):
+    with make_client(cache=cache, invalidation_interval=3600) as client:
+        client.get_sectors()
+        client.get_markets()
+    # A restarted client finds the check time in the cache
+    with make_client(cache=cache, invalidation_interval=3600) as client:
+        client.get_countries()
+    assert api.stats["instrumentsupdatedv1"] == api.stats["kpisupdatedv1"] == 1
+
+
+def test_watermarks_are_fetched_outside_the_invalidation_lock(make_client, cache, monkeypatch):
+    client = make_client(cache=cache)
+    fetched = []
+    fetch = client._fetch
+
+    def watched(endpoint, params):
+        if endpoint.endswith("updated"):
+            fetched.append((endpoint, client._invalidation_lock.locked()))
+        return fetch(endpoint, params)
+
+    monkeypatch.setattr(client, "_fetch", watched)
+    client.get_sectors()
+    assert fetched == [("instruments/updated", False), ("instruments/kpis/updated", False)]
+    assert cache.get_state("watermarks_checked_at") is not None and not client._refreshing_watermarks
+    client.close()
+
+
+def test_async_watermarks_are_fetched_outside_the_invalidation_lock(server, cache, monkeypatch):
+    async def run():
+        client = AsyncBorsdataClient(api_key="test", base_url=server.base_url, cache=cache, memo=MemoCache(ttl=0),
+                                     max_retries=0)
+        fetched = []
+        fetch = client._fetch
+
+        async def watched(endpoint, params):
+            if endpoint.endswith("updated"):
+                fetched.append((endpoint, client._invalidation_lock.locked()))
+            return await fetch(endpoint, params)
+
+        monkeypatch.setattr(client, "_fetch", watched)
+        async with client:
+            await client.get_sectors()
+        return fetched
+
+    assert sorted(asyncio.run(run())) == [("instruments/kpis/updated", False), ("instruments/updated", False)]
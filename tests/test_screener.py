@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from memo_cache import MemoCache
+from mock_server import GLOBAL_ID_START
+from response_cache import ResponseCache
+from screener import ExpressionError, Screener
+
+
+@pytest.fixture
+def table():
+    screener = Screener(client=None)
+    screener.ins_ids = np.array([1, 2, 3, 4, 5])
+    screener.columns = {
+        "insId": screener.ins_ids,
+        "name": np.array(["A", "B", "C", "D", "E"], dtype=object),
+        "sector": np.array(["Industri", "Finans", "Industri", "Energi", "Finans"], dtype=object),
+        "pe": np.array([10.0, 25.0, np.nan, 8.0, 14.0]),
+        "gross_margin": np.array([45.0, 30.0, 60.0, np.nan, 50.0]),
+    }
+    return screener
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("pe < 15", [1, 4, 5]),
+    ("pe < 15 and gross_margin > 40", [1, 5]),
+    ("pe > 20 or gross_margin >= 60", [2, 3]),
+    ("not pe < 15", [2, 3]),
+    ("sector == 'Industri'", [1, 3]),
+    ("sector in ('Finans', 'Energi')", [2, 4, 5]),
+    ("sector not in ['Finans']", [1, 3, 4]),
+    ("5 < pe <= 14", [1, 4, 5]),
+    ("gross_margin / pe > 3", [1, 5]),
+    ("pe * 2 - 1 == 19", [1]),
+    ("-pe < -20", [2]),
+    ("True", [1, 2, 3, 4, 5]),
+])
+def test_expressions_select_rows(table, expression, expected):
+    assert table.ins_ids[table.mask(expression)].tolist() == expected
+
+
+def test_missing_values_never_match(table):
+    # NaN fails every comparison, including the negated one
+    assert not table.mask("pe < 100")[2]
+    assert not table.mask("pe >= 100")[2]
+
+
+@pytest.mark.parametrize("expression", [
+    "unknown > 1",
+    "__import__('os').system('true')",
+    "pe.real > 1",
+    "pe in pe",
+    "pe < ",
+    "lambda: 1",
+    "pe ** 2 > 1",
+])
+def test_rejected_expressions(table, expression):
+    with pytest.raises(ExpressionError):
+        table.mask(expression)
+
+
+def test_screen_sorts_with_missing_values_last(table):
+    rows = table.screen("True", sort_by="pe", columns=["insId", "pe"])
+    assert [r["insId"] for r in rows] == [4, 1, 5, 2, 3]
+    assert rows[-1]["pe"] is None
+    rows = table.screen("True", sort_by="pe", ascending=False, limit=2, columns=["insId"])
+    assert [r["insId"] for r in rows] == [2, 5]
+
+
+def test_derived_columns(table):
+    table.add_derived("earnings_yield", lambda columns: 100 / columns["pe"])
+    assert table.ins_ids[table.mask("earnings_yield > 9")].tolist() == [1, 4]
+
+
+def test_refresh_loads_kpis_from_the_screener(client, market):
+    screener = Screener(client)
+    assert screener.refresh()
+    assert len(screener.ins_ids) == len(market.instruments)
+    assert np.isfinite(screener.columns["pe"]).sum() > 0.5 * len(market.instruments)
+    # Nothing moved upstream, so a second refresh does nothing
+    assert not screener.refresh()
+
+
+def test_global_mode_keeps_nordic_kpis(client, market):
+    screener = Screener(client, include_global=True)
+    screener.refresh()
+    nordic = screener.ins_ids < GLOBAL_ID_START
+    assert nordic.sum() == len(market.instruments)
+    assert (~nordic).sum() == len(market.global_instruments)
+    pe = screener.columns["pe"]
+    assert np.isfinite(pe[nordic]).sum() > 0.5 * nordic.sum()
+    assert np.isfinite(pe[~nordic]).sum() > 0.5 * (~nordic).sum()
+
+
+def test_refresh_refetches_kpis_cached_before_a_recalculation(make_client, market, api, tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    with make_client(memo=MemoCache(), cache=cache) as client:
+        screener = Screener(client, include_global=True)
+        screener.refresh()
+        assert (api.stats["kpislistv1"], api.stats["kpislistglobalv1"]) == (2, 2)
+        assert not screener.refresh()
+
+        market.touch([], kpis=True)
+        assert screener.refresh()
+        assert (api.stats["kpislistv1"], api.stats["kpislistglobalv1"]) == (4, 4)
+        # The instrument lists did not change and are still served from the caches
+        assert api.stats["instrumentsv1"] == 1
@@ -0,0 +1,160 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import sync
+from memo_cache import MemoCache
+from sync import DeltaSync, FullSync, SyncStore, fetch_kpi_latest
+
+KPIS = [2]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SyncStore(str(tmp_path / "sync"))
+    yield store
+    store.close()
+
+
+def full_sync(client, store, **kwargs) -> dict:
+    return FullSync(client, store, kpi_ids=KPIS, report_types=["year"], progress=None, **kwargs).run()
+
+
+def _days_ago(days: int) -> str:
+    return str(np.busday_offset(np.datetime64(date.today()) - days, 0, roll="backward"))
+
+
+def test_fetch_kpi_latest_leaves_the_memoized_response_alone(make_client, market):
+    with make_client(memo=MemoCache()) as client:
+        nordic = len(client.get_kpi_screener(2, "last", "latest")["values"])
+        sizes = [len(fetch_kpi_latest(client, 2, include_global=True)) for _ in range(3)]
+        assert sizes == [len(market.instruments) + len(market.global_instruments)] * 3
+        assert len(client.get_kpi_screener(2, "last", "latest")["values"]) == nordic
+        assert len(fetch_kpi_latest(client, 2)) == nordic
+
+
+def test_full_sync_mirrors_the_universe(client, store, market):
+    result = full_sync(client, store)
+    assert result["remaining"] == 0 and result["failed"] == 0
+    assert store.get_state("full_sync_status") == "complete"
+    assert store.instrument_ids() == [i["insId"] for i in market.instruments]
+    assert store.query("SELECT COUNT(*) FROM kpi_latest")[0][0] > 0
+    assert store.query("SELECT COUNT(DISTINCT ins_id) FROM reports")[0][0] == len(market.instruments)
+    assert all(store.prices.length(i["insId"]) for i in market.instruments)
+
+
+@pytest.mark.parametrize("budget", [3, 5, 7, 10])
+def test_full_sync_stays_within_its_call_budget(client, store, api, budget):
+    result = full_sync(client, store, call_budget=budget)
+    assert api.stats["requests"] <= budget
+    assert result["calls"] == api.stats["requests"]
+
+
+def test_full_sync_resumes_after_the_budget_runs_out(client, store, api):
+    rounds = 0
+    while store.get_state("full_sync_status") != "complete":
+        full_sync(client, store, call_budget=6)
+        rounds += 1
+        assert rounds < 20
+    assert rounds > 1
+    assert store.task_counts().get("done") == len(store.query("SELECT task_id FROM tasks"))
+
+
+def test_delta_sync_on_a_quiet_day_makes_three_calls(client, store):
+    full_sync(client, store)
+    result = DeltaSync(client, store, progress=None).run(through=store.get_state("prices_through"))
+    assert result["calls"] == 3
+    assert (result["changed_instruments"], result["kpis_refreshed"], result["new_splits"],
+            result["price_days"]) == (0, 0, 0, 0)
+
+
+def test_delta_sync_refetches_changed_instruments_and_kpis(client, store, market):
+    full_sync(client, store)
+    market.touch([market.instruments[0]["insId"], market.instruments[1]["insId"]])
+    result = DeltaSync(client, store, progress=None).run(through=store.get_state("prices_through"))
+    assert result["changed_instruments"] == 2
+    assert result["kpis_refreshed"] == len(KPIS)
+    # Applied watermarks: running again finds nothing new
+    result = DeltaSync(client, store, progress=None).run(through=store.get_state("prices_through"))
+    assert result["changed_instruments"] == result["kpis_refreshed"] == 0
+
+
+def test_delta_sync_refreshes_the_newest_kpi_periods_after_a_recalculation(client, store, market, api):
+    full_sync(client, store)
+    ins_id = market.instruments[0]["insId"]
+    latest = "SELECT MAX(year) FROM kpi_history WHERE ins_id = ? AND kpi_id = ?"
+    year = store.query(latest, (ins_id, KPIS[0]))[0][0]
+    rows = store.query("SELECT COUNT(*) FROM kpi_history")[0][0]
+    with store.transaction() as conn:
+        conn.execute("UPDATE kpi_history SET value = -1 WHERE ins_id = ? AND year = ?", (ins_id, year))
+
+    market.touch([], kpis=True)
+    calls = api.stats["histarraykpisv1"]
+    result = DeltaSync(client, store, progress=None).run(through=store.get_state("prices_through"))
+    assert result["changed_instruments"] == 0 and result["kpis_refreshed"] == len(KPIS)
+    assert api.stats["histarraykpisv1"] - calls == len(KPIS) * -(-len(market.instruments) // sync.MAX_BATCH_SIZE)
+    assert store.query("SELECT value FROM kpi_history WHERE ins_id = ? AND year = ?", (ins_id, year))[0][0] != -1
+    assert store.query("SELECT COUNT(*) FROM kpi_history")[0][0] == rows
+
+
+def test_delta_sync_picks_up_new_listings(client, store, market):
+    full_sync(client, store)
+    listing = market._instrument(len(market.instruments) + 1, False)
+    market.instruments.append(listing)
+    market.by_id[listing["insId"]] = listing
+    market.touch([listing["insId"]], kpis=False)
+    result = DeltaSync(client, store, progress=None).run(through=store.get_state("prices_through"))
+    assert result["changed_instruments"] == 1
+    assert listing["insId"] in store.instrument_ids()
+    assert store.query("SELECT COUNT(*) FROM reports WHERE ins_id = ?", (listing["insId"],))[0][0] > 0
+
+
+def test_delta_sync_catches_up_missed_price_days(client, store, market, monkeypatch):
+    behind = _days_ago(7)
+    monkeypatch.setattr(sync, "_yesterday", lambda: behind)
+    full_sync(client, store)
+    through = _days_ago(1)
+    result = DeltaSync(client, store, progress=None).run(through=through)
+    assert result["price_days"] == len(sync.trading_days(behind, through))
+    assert store.get_state("prices_through") == through
+    for inst in market.instruments:
+        assert str(store.prices.last_date(inst["insId"])) == through
+
+
+def test_delta_sync_backfills_instruments_back_from_a_trading_halt(client, store, market, monkeypatch):
+    monkeypatch.setattr(sync, "_yesterday", lambda: _days_ago(4))
+    full_sync(client, store)
+    # Halted for two weeks: the store stops well before the others
+    halted = market.instruments[3]["insId"]
+    store.prices.reset(halted)
+    store.prices.update(client, [halted], to_date=_days_ago(14))
+
+    through = _days_ago(1)
+    result = DeltaSync(client, store, progress=None).run(through=through)
+    assert 0 < result["price_days"] <= sync.MAX_DAILY_GAP_DAYS
+    for inst in market.instruments:
+        assert str(store.prices.last_date(inst["insId"])) == through
+    days, *_ = market.price_history(halted)
+    assert store.prices.length(halted) == np.searchsorted(days, np.datetime64(through), side="right")
+
+
+def test_delta_sync_reloads_price_history_after_a_new_split(client, store, market):
+    full_sync(client, store)
+    split_ids = {s["instrumentId"] for s in market.splits}
+    ins_id = next(i["insId"] for i in market.instruments if i["insId"] not in split_ids)
+    split_date = _days_ago(2)
+    before = np.array(store.prices.load(ins_id, end=split_date)["c"])
+
+    market.splits.append({"instrumentId": ins_id, "splitType": "Split", "ratio": "2:1",
+                          "splitDate": f"{split_date}T00:00:00"})
+    market.price_history.cache_clear()
+    market.touch([], kpis=False)
+    result = DeltaSync(client, store, progress=None).run(through=store.get_state("prices_through"))
+
+    assert result["new_splits"] == 1
+    after = store.prices.load(ins_id, end=str(np.datetime64(split_date) - 1))["c"]
+    np.testing.assert_allclose(after, before[:len(after)], atol=0.01)
+    assert store.prices.load(ins_id, start=split_date, end=split_date)["c"][0] == pytest.approx(before[-1] / 2,
+                                                                                                  abs=0.01)
+    assert store.new_splits(market.splits) == []
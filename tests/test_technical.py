@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from technical import PricePanel, TechnicalPool, compute_indicators, correlation_matrix, drawdown, \
+    pairwise_correlation, period_return, rolling_mean, rolling_std, summary
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with TechnicalPool(workers=2) as pool:
+        yield pool
+
+
+def random_panel(days=400, instruments=23, seed=1) -> PricePanel:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, instruments)), axis=0))
+    # Late listings and scattered missing days
+    close[:rng.integers(0, days // 2), instruments // 2] = np.nan
+    close[rng.random(close.shape) < 0.03] = np.nan
+    dates = np.datetime64("2022-01-03") + np.arange(days)
+    return PricePanel(dates, np.arange(1, instruments + 1), close, np.ones(close.shape, dtype=np.int64))
+
+
+def test_indicators_from_the_pool_match_the_serial_ones(pool):
+    panel = random_panel()
+    serial = compute_indicators(panel, ma_windows=(5, 50), vol_window=20)
+    parallel = compute_indicators(panel, ma_windows=(5, 50), vol_window=20, pool=pool)
+    assert set(parallel) == set(serial) == {"return", "drawdown", "volatility_20", "sma_5", "sma_50"}
+    for name in serial:
+        np.testing.assert_allclose(parallel[name], serial[name], rtol=1e-12, equal_nan=True)
+
+
+def test_correlations_from_the_pool_match_the_serial_ones(pool):
+    panel = random_panel()
+    serial = correlation_matrix(panel, window=250, min_periods=60)
+    parallel = correlation_matrix(panel, window=250, min_periods=60, pool=pool)
+    np.testing.assert_allclose(parallel, serial, rtol=1e-9, atol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(parallel, parallel.T, equal_nan=True)
+
+
+def test_the_pool_handles_fewer_instruments_than_workers(pool):
+    panel = random_panel(days=120, instruments=1)
+    np.testing.assert_allclose(compute_indicators(panel, pool=pool)["drawdown"],
+                               compute_indicators(panel)["drawdown"], equal_nan=True)
+    assert correlation_matrix(panel, pool=pool)[0, 0] == pytest.approx(1)
+
+
+def test_correlation_matches_numpy_on_complete_data():
+    rng = np.random.default_rng(2)
+    returns = rng.normal(size=(200, 5))
+    np.testing.assert_allclose(pairwise_correlation(returns, returns), np.corrcoef(returns.T), atol=1e-12)
+
+
+def test_correlation_uses_the_days_both_traded():
+    rng = np.random.default_rng(3)
+    x = rng.normal(size=(100, 1))
+    y = x + rng.normal(scale=0.5, size=(100, 1))
+    y[:30] = np.nan
+    expected = np.corrcoef(x[30:, 0], y[30:, 0])[0, 1]
+    assert pairwise_correlation(x, y)[0, 0] == pytest.approx(expected)
+    assert np.isnan(pairwise_correlation(x, y, min_periods=71)[0, 0])
+
+
+def test_rolling_windows_match_a_loop():
+    values = random_panel(days=60, instruments=3).close
+    window = 10
+    mean, std = rolling_mean(values, window), rolling_std(values, window)
+    for t in range(len(values)):
+        chunk = values[max(0, t - window + 1):t + 1]
+        for col in range(values.shape[1]):
+            present = chunk[:, col][~np.isnan(chunk[:, col])]
+            if len(present) >= 8:
+                assert mean[t, col] == pytest.approx(present.mean())
+                assert std[t, col] == pytest.approx(present.std(ddof=1))
+            else:
+                assert np.isnan(mean[t, col]) and np.isnan(std[t, col])
+
+
+def test_drawdown_and_period_return():
+    close = np.array([[10.0], [12.0], [9.0], [np.nan], [15.0]])
+    np.testing.assert_allclose(drawdown(close)[:, 0], [0, 0, -0.25, np.nan, 0])
+    # Measured from the last close at least two rows back, here 9
+    assert period_return(close, 2)[0] == pytest.approx(15 / 9 - 1)
+    assert np.isnan(period_return(close, 5)[0])
+
+
+def test_summary_takes_the_latest_values():
+    panel = random_panel(days=300, instruments=4)
+    result = summary(panel, compute_indicators(panel))
+    assert result["insId"].tolist() == [1, 2, 3, 4]
+    for col in range(4):
+        closes = panel.close[:, col]
+        assert result["close"][col] == closes[~np.isnan(closes)][-1]
+    assert (result["max_drawdown"] <= 0).all()
+    assert "return" not in result and "sma_200" in result
+
+
+def test_panel_from_columns_aligns_dates():
+    day = np.datetime64("2024-01-01")
+    panel = PricePanel.from_columns({
+        2: {"d": day + np.array([0, 2]), "c": np.array([1.0, 3.0]), "v": np.array([5, 7])},
+        1: {"d": day + np.array([1, 2]), "c": np.array([2.0, 4.0]), "v": np.array([6, 8])},
+    })
+    assert panel.ins_ids.tolist() == [1, 2] and len(panel.dates) == 3
+    np.testing.assert_allclose(panel.close, [[np.nan, 1], [2, np.nan], [4, 3]])
+    assert panel.column(2) == 1
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from valuation import DISCOUNT_RATES, curve_family, implied_growth, implied_growth_table, pe_multiple
+
+
+def calculate_y(X, r):
+    # The P/E curve pe_analysis plotted before valuation.py
+    return (X**(1/r) - 1) / np.log(X)
+
+
+@pytest.mark.parametrize("r", DISCOUNT_RATES)
+def test_pe_multiple_matches_the_original_curve(r):
+    x = np.concatenate([np.linspace(0.8, 0.99, 50), np.linspace(1.01, 2.0, 100)])
+    np.testing.assert_allclose(pe_multiple(x, r), calculate_y(x, r), rtol=1e-9)
+
+
+def test_pe_multiple_is_continuous_at_zero_growth():
+    # calculate_y is 0/0 at X = 1; the limit is 1/r
+    assert pe_multiple(1.0, 0.1) == pytest.approx(10)
+    assert pe_multiple(1 + 1e-12, 0.1) == pytest.approx(10)
+
+
+@pytest.mark.parametrize("r", DISCOUNT_RATES)
+def test_implied_growth_inverts_the_original_curve(r):
+    growth = np.array([-0.19, -0.05, 0.01, 0.1, 0.3, 0.6, 0.99])
+    pe = calculate_y(1 + growth, r)
+    np.testing.assert_allclose(implied_growth(pe, r), growth, atol=1e-9)
+
+
+def test_implied_growth_matches_the_old_interpolation():
+    # pe_analysis used to read the growth off the plotted curve with np.interp
+    x = np.linspace(0.8, 2, 1000)
+    for pe in (5.0, 11.1, 15.0, 30.0, 80.0):
+        expected = np.interp(pe, calculate_y(x, 0.09), x) - 1
+        assert implied_growth(pe, 0.09) == pytest.approx(expected, abs=1e-4)
+
+
+def test_implied_growth_outside_the_plotted_range():
+    # Far beyond the bracket the search starts from
+    assert implied_growth(calculate_y(5.0, 0.05), 0.05) == pytest.approx(4.0)
+    assert implied_growth(0.5, 0.09) < -0.5
+
+
+def test_implied_growth_is_nan_for_missing_or_negative_pe():
+    result = implied_growth(np.array([np.nan, -3.0, 0.0, np.inf, 12.0]))
+    assert np.isnan(result[:4]).all() and np.isfinite(result[4])
+    assert np.isnan(implied_growth(np.nan))
+
+
+def test_scalars_stay_scalars():
+    assert isinstance(implied_growth(15.0), float)
+
+
+def test_table_broadcasts_over_the_rates():
+    pe = np.array([8.0, 15.0, np.nan])
+    table = implied_growth_table(pe)
+    assert table.shape == (3, len(DISCOUNT_RATES))
+    for j, r in enumerate(DISCOUNT_RATES):
+        np.testing.assert_allclose(table[:, j], implied_growth(pe, r), equal_nan=True)
+    # Higher discount rates need more growth for the same P/E
+    assert (np.diff(table[:2], axis=1) > 0).all()
+
+
+def test_curve_family_is_computed_once_and_read_only():
+    x, curves = curve_family()
+    assert curve_family() is curve_family()
+    assert set(curves) == set(DISCOUNT_RATES)
+    np.testing.assert_allclose(curves[0.09], pe_multiple(x, 0.09))
+    with pytest.raises(ValueError):
+        x[0] = 0
@@ -0,0 +1,74 @@
+from functools import lru_cache
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+DISCOUNT_RATES = (0.05, 0.07, 0.09, 0.11, 0.13, 0.15)
+DEFAULT_DISCOUNT_RATE = 0.09
+GROWTH_RANGE = (0.8, 2.0)
+CURVE_POINTS = 1000
+_BISECTION_STEPS = 64
+
+
+def pe_multiple(growth_factor, discount_rate):
+    # P/E implied by a growth factor X (1 + growth) at discount rate r: (X^(1/r) - 1) / ln X.
+    # Written in u = ln X with expm1 so it stays accurate around X = 1, where the limit is 1/r.
+    k = 1 / np.asarray(discount_rate, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        u = np.log(np.asarray(growth_factor, dtype=float))
+        value = np.expm1(k * u) / u
+    return np.where(u == 0, k, value)
+
+
+@lru_cache(maxsize=8)
+def curve_family(discount_rates: Tuple[float, ...] = DISCOUNT_RATES, start: float = GROWTH_RANGE[0],
+                 stop: float = GROWTH_RANGE[1], points: int = CURVE_POINTS) -> Tuple[np.ndarray, Dict[float, np.ndarray]]:
+    # The P/E vs growth curves are the same for every stock, so they are computed once per set of rates
+    x = np.linspace(start, stop, points)
+    curves = {r: pe_multiple(x, r) for r in discount_rates}
+    x.flags.writeable = False
+    for y in curves.values():
+        y.flags.writeable = False
+    return x, curves
+
+
+def implied_growth(pe, discount_rate=DEFAULT_DISCOUNT_RATE) -> np.ndarray:
+    # Solves pe_multiple(1 + g, r) == pe for g. Accepts scalars or arrays (broadcast against
+    # each other), so implied growth for a whole universe is one call. NaN where P/E <= 0 or missing.
+    pe = np.asarray(pe, dtype=float)
+    k = 1 / np.asarray(discount_rate, dtype=float)
+    pe, k = np.broadcast_arrays(pe, k)
+    valid = np.isfinite(pe) & (pe > 0)
+    target = np.where(valid, pe, 1.0)
+
+    # f(u) = expm1(k*u) / u is increasing in u = ln(1 + g) and sweeps (0, inf)
+    def f(u):
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            value = np.expm1(k * u) / u
+        return np.where(u == 0, k, value)
+
+    lo = np.full(target.shape, -1.0)
+    hi = np.full(target.shape, 1.0)
+    for _ in range(60):
+        low_enough = f(lo) <= target
+        high_enough = f(hi) >= target
+        if low_enough.all() and high_enough.all():
+            break
+        lo = np.where(low_enough, lo, lo * 2)
+        hi = np.where(high_enough, hi, hi * 2)
+
+    for _ in range(_BISECTION_STEPS):
+        mid = (lo + hi) / 2
+        above = f(mid) >= target
+        hi = np.where(above, mid, hi)
+        lo = np.where(above, lo, mid)
+
+    growth = np.expm1((lo + hi) / 2)
+    result = np.where(valid, growth, np.nan)
+    return result if result.ndim else result[()]
+
+
+def implied_growth_table(pe, discount_rates: Sequence[float] = DISCOUNT_RATES) -> np.ndarray:
+    # (instrument x discount rate) table of implied growth
+    pe = np.asarray(pe, dtype=float)
+    return implied_growth(pe[..., None], np.asarray(discount_rates, dtype=float))